@@ -0,0 +1,243 @@
+import os
+import math
+import time
+import asyncio
+
+import metrics
+from sessions import SessionStore
+
+# Token buckets: sustained messages per second and burst size, per conversation and per client IP
+CONVERSATION_RATE = float(os.getenv("CONVERSATION_RATE", "1"))
+CONVERSATION_BURST = float(os.getenv("CONVERSATION_BURST", "10"))
+IP_RATE = float(os.getenv("IP_RATE", "5"))
+IP_BURST = float(os.getenv("IP_BURST", "30"))
+LIMITER_MAX_KEYS = int(os.getenv("LIMITER_MAX_KEYS", "50000"))
+
+# Global admission: chat requests handled at once, how many more may wait for a
+# slot, and for how long (seconds) before they are shed with a 503
+MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", "64"))
+MAX_QUEUE = int(os.getenv("MAX_QUEUE", "64"))
+QUEUE_TIMEOUT = float(os.getenv("QUEUE_TIMEOUT", "1"))
+
+# Reverse proxies in front of the app (Render has one); each appends to X-Forwarded-For
+FORWARDED_HOPS = int(os.getenv("FORWARDED_HOPS", "1"))
+
+
+class Rejected(Exception):
+    """Request turned away: status 429 (rate limited) or 503 (overloaded)"""
+
+    def __init__(self, status, reason, retry_after):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens, updated):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class RateLimiter:
+    """Keyed token buckets. An idle bucket refills completely after burst/rate
+    seconds, so that is also its TTL in the bounded key store."""
+
+    def __init__(self, rate, burst, max_keys=LIMITER_MAX_KEYS, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.buckets = SessionStore(max_entries=max_keys, ttl=burst / rate if rate > 0 else math.inf, clock=clock)
+
+    def acquire(self, key):
+        """Take a token: 0 if allowed, else seconds until one is available"""
+        if self.rate <= 0:
+            return 0.0
+        now = self.clock()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = _Bucket(self.burst, now)
+            self.buckets[key] = bucket
+        else:
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            return 0.0
+        return (1 - bucket.tokens) / self.rate
+
+
+class Ticket:
+    """One admitted request's slot; release() is idempotent"""
+    __slots__ = ("gate", "released")
+
+    def __init__(self, gate):
+        self.gate = gate
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.gate._release()
+
+
+class AdmissionGate:
+    """Bounded in-flight work with a bounded wait queue.
+
+    Up to max_in_flight requests run at once; up to max_queue more wait at
+    most queue_timeout for a slot. Anything beyond that is rejected at once,
+    so an overloaded worker answers quickly with 503 instead of letting every
+    request's latency grow until clients time out.
+    """
+
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT, max_queue=MAX_QUEUE, queue_timeout=QUEUE_TIMEOUT):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self._waiters = []
+
+    async def acquire(self):
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            return Ticket(self)
+        if self.waiting >= self.max_queue:
+            metrics.ADMISSIONS.inc("shed_queue_full")
+            raise Rejected(503, "Server busy", self.queue_timeout)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                return Ticket(self)  # slot handed over just as the wait expired
+            metrics.ADMISSIONS.inc("shed_timeout")
+            raise Rejected(503, "Server busy", self.queue_timeout)
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release()  # pass on the slot we were given
+            raise
+        finally:
+            self.waiting -= 1
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+                waiter.cancel()
+        return Ticket(self)
+
+    def _release(self):
+        # Hand the slot straight to the oldest waiter, FIFO
+        while self._waiters:
+            waiter = self._waiters.pop(0)
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def stats(self):
+        return {"in_flight": self.in_flight, "waiting": self.waiting,
+                "max_in_flight": self.max_in_flight, "max_queue": self.max_queue}
+
+
+class Coalescer:
+    """Identical in-flight requests (same client, conversation and message) share one answer.
+
+    The first request leads and does the work; duplicates that arrive before
+    it finishes wait for its result instead of calling the backend again.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.coalesced = 0
+
+    def join(self, key):
+        """The leader's pending result for key, or None if nothing is in flight"""
+        future = self._inflight.get(key)
+        if future is None:
+            return None
+        self.coalesced += 1
+        metrics.ADMISSIONS.inc("coalesced")
+        return asyncio.shield(future)
+
+    def lead(self, key):
+        """Register the caller as leader for key; pass the returned future to finish()"""
+        future = asyncio.get_running_loop().create_future()
+        # Nobody may be waiting: mark errors retrieved so they are not logged as lost
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        return future
+
+    def finish(self, key, future, result=None, error=None):
+        """Resolve a leader's future. Only the leader that owns the slot frees it:
+        a late call from an earlier leader must not drop a newer one's future."""
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    async def run(self, key, factory):
+        """await factory() once for any number of concurrent callers with the same key"""
+        pending = self.join(key)
+        if pending is not None:
+            return await pending
+        future = self.lead(key)
+        try:
+            result = await factory()
+        except BaseException as e:
+            self.finish(key, future, error=e if isinstance(e, Exception) else RuntimeError("Request cancelled"))
+            raise
+        self.finish(key, future, result)
+        return result
+
+    def stats(self):
+        return {"in_flight": len(self._inflight), "coalesced": self.coalesced}
+
+
+def client_ip(headers, peer, hops=FORWARDED_HOPS):
+    """Client address as seen by the outermost trusted proxy, else the socket peer"""
+    forwarded = headers.get("x-forwarded-for")
+    if hops and forwarded:
+        chain = [part.strip() for part in forwarded.split(",") if part.strip()]
+        if chain:
+            return chain[-hops] if len(chain) >= hops else chain[0]
+    return peer or "unknown"
+
+
+class AdmissionControl:
+    """Rate limits, load shedding and duplicate coalescing for the chat endpoints"""
+
+    def __init__(self):
+        self.conversations = RateLimiter(CONVERSATION_RATE, CONVERSATION_BURST)
+        self.ips = RateLimiter(IP_RATE, IP_BURST)
+        self.gate = AdmissionGate()
+        self.coalescer = Coalescer()
+
+    def check_rate(self, cid, ip):
+        """Raise Rejected(429) if this conversation or client is over its rate.
+        Conversations are keyed together with the client address, because
+        clients that send no id (or a fixed one) share the same cid."""
+        for scope, limiter, key in (("conversation", self.conversations, (ip, cid)), ("ip", self.ips, ip)):
+            wait = limiter.acquire(key)
+            if wait:
+                metrics.ADMISSIONS.inc(f"rate_limited_{scope}")
+                raise Rejected(429, "Too many messages, please slow down", wait)
+
+    async def admit(self):
+        ticket = await self.gate.acquire()
+        metrics.ADMISSIONS.inc("admitted")
+        return ticket
+
+    def stats(self):
+        return {
+            **self.gate.stats(),
+            "coalescing": self.coalescer.stats(),
+            "rate_limited_keys": {"conversation": len(self.conversations.buckets), "ip": len(self.ips.buckets)},
+        }
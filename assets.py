@@ -0,0 +1,216 @@
+import os
+import re
+import gzip
+import json
+import hashlib
+import logging
+import mimetypes
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+ASSETS_DIR = os.getenv("ASSETS_DIR", "forntend")
+# Cache lifetime for the plain (unhashed) names, which third-party pages embed directly
+ASSET_MAX_AGE = int(os.getenv("ASSET_MAX_AGE", "300"))
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+CONTENT_TYPES = {
+    ".js": "application/javascript; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+    ".html": "text/html; charset=utf-8",
+}
+COMPRESSIBLE = {".js", ".css", ".html", ".json", ".svg", ".txt"}
+
+CSS_TOKEN_RE = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|(/\*.*?\*/)', re.S)
+CSS_PUNCT_RE = re.compile(r'\s*([{};:,>])\s*')
+ENCODING_RE = re.compile(r'\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*')
+
+
+def minify_css(text):
+    """Drop comments and collapse whitespace, leaving string literals untouched"""
+    out = []
+    code = []
+
+    def flush():
+        out.append(CSS_PUNCT_RE.sub(r'\1', re.sub(r'\s+', " ", "".join(code))))
+        code.clear()
+
+    pos = 0
+    for match in CSS_TOKEN_RE.finditer(text):
+        code.append(text[pos:match.start()])
+        string, comment = match.groups()
+        if string:
+            flush()
+            out.append(string)
+        elif comment.startswith("/*!"):
+            flush()
+            out.append(comment + "\n")
+        else:
+            code.append(" ")
+        pos = match.end()
+    code.append(text[pos:])
+    flush()
+    return "".join(out).replace(";}", "}").strip() + "\n"
+
+
+def minify_js(text):
+    """Conservative, line-based: strips indentation, blank lines and whole-line
+    comments, keeping line breaks (so automatic semicolons still apply) and
+    leaving multi-line template literals exactly as written"""
+    lines = []
+    in_template = False
+    in_comment = False
+    for line in text.splitlines():
+        if in_template:
+            lines.append(line)
+        else:
+            stripped = line.strip()
+            if in_comment:
+                in_comment = "*/" not in stripped
+                continue
+            if stripped.startswith("/*") and not stripped.startswith("/*!"):
+                in_comment = "*/" not in stripped
+                continue
+            if not stripped or stripped.startswith("//"):
+                continue
+            lines.append(stripped)
+        # Backticks inside quotes or regexes would confuse this; the widget has none
+        if (line.count("`") - line.count("\\`")) % 2:
+            in_template = not in_template
+    return "\n".join(lines) + "\n"
+
+
+MINIFIERS = {".js": minify_js, ".css": minify_css}
+
+
+class Asset:
+    """One file, minified and pre-compressed: bodies keyed by content-coding"""
+
+    def __init__(self, name, data):
+        stem, ext = os.path.splitext(name)
+        minify = MINIFIERS.get(ext)
+        if minify:
+            data = minify(data.decode("utf-8")).encode("utf-8")
+        self.name = name
+        self.digest = hashlib.sha256(data).hexdigest()[:12]
+        self.hashed_name = f"{stem}.{self.digest}{ext}" if minify else None
+        self.content_type = CONTENT_TYPES.get(ext) or mimetypes.guess_type(name)[0] or "application/octet-stream"
+        self.bodies = {"identity": data}
+        if ext in COMPRESSIBLE:
+            compressed = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                compressed["br"] = brotli.compress(data, quality=11)
+            # Only keep variants that actually save bytes
+            self.bodies.update((k, v) for k, v in compressed.items() if len(v) < len(data))
+        self.etags = {f'"{self.digest}"', *(f'"{self.digest}-{coding}"' for coding in self.bodies)}
+
+    def etag(self, coding):
+        return f'"{self.digest}"' if coding == "identity" else f'"{self.digest}-{coding}"'
+
+
+def accepted_codings(header):
+    """Content-codings the client accepts, from an Accept-Encoding header"""
+    accepted = {"identity"}
+    for part in (header or "").split(","):
+        match = ENCODING_RE.fullmatch(part)
+        if not match or not match.group(1):
+            continue
+        coding, q = match.group(1).lower(), match.group(2)
+        try:
+            weight = float(q) if q is not None else 1.0
+        except ValueError:
+            continue
+        if weight > 0:
+            accepted.add(coding)
+        elif coding == "identity":
+            accepted.discard("identity")
+    if "*" in accepted:
+        accepted.update(("br", "gzip"))
+    return accepted
+
+
+class AssetStore:
+    """Frontend files held in memory, minified, content-hashed and pre-compressed.
+
+    Everything is built once when the store is created; a request only picks
+    the smallest variant the client accepts and answers conditional requests
+    from the ETag, without touching the filesystem. Scripts and stylesheets
+    are also served under a content-hashed name (always-visible-widget.<hash>.js)
+    that never changes meaning and can be cached for a year; the plain names,
+    which pages already embed, get a short max-age and revalidate by ETag.
+    """
+
+    def __init__(self, directory=ASSETS_DIR, max_age=ASSET_MAX_AGE):
+        self.directory = directory
+        self.max_age = max_age
+        self.assets = {}
+        self.hashed = {}
+        if not os.path.isdir(directory):
+            logging.error(f"Asset directory {directory} not found")
+            return
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if not os.path.isfile(path):
+                continue
+            with open(path, "rb") as f:
+                asset = Asset(name, f.read())
+            self.assets[name] = asset
+            if asset.hashed_name:
+                self.hashed[asset.hashed_name] = asset
+
+    def url(self, name, prefix="/static/"):
+        """Long-cacheable URL for a file, falling back to its plain name"""
+        asset = self.assets.get(name)
+        return prefix + (asset.hashed_name or name if asset else name)
+
+    def manifest(self):
+        """Plain name -> content-hashed name, for pages that want immutable URLs"""
+        return {name: asset.hashed_name for name, asset in self.assets.items() if asset.hashed_name}
+
+    def lookup(self, name):
+        """(asset, Cache-Control) for a request path, or (None, None)"""
+        asset = self.hashed.get(name)
+        if asset is not None:
+            return asset, IMMUTABLE
+        asset = self.assets.get(name)
+        if asset is None:
+            return None, None
+        if asset.content_type.startswith("text/html"):
+            return asset, "no-cache"
+        return asset, f"public, max-age={self.max_age}"
+
+    def select(self, name, accept_encoding=None, if_none_match=None):
+        """(status, body, headers) for GET name, or None if there is no such asset"""
+        asset, cache_control = self.lookup(name)
+        if asset is None:
+            return None
+        accepted = accepted_codings(accept_encoding)
+        coding = next((c for c in ("br", "gzip", "identity") if c in accepted and c in asset.bodies), "identity")
+        headers = {
+            "Cache-Control": cache_control,
+            "ETag": asset.etag(coding),
+            "Vary": "Accept-Encoding",
+            "Content-Type": asset.content_type,
+        }
+        if coding != "identity":
+            headers["Content-Encoding"] = coding
+        if if_none_match:
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            if "*" in tags or tags & asset.etags:
+                del headers["Content-Type"]
+                headers.pop("Content-Encoding", None)
+                return 304, b"", headers
+        return 200, asset.bodies[coding], headers
+
+    def stats(self):
+        return {
+            name: {"hashed_name": asset.hashed_name, **{k: len(v) for k, v in asset.bodies.items()}}
+            for name, asset in self.assets.items()
+        }
+
+
+if __name__ == "__main__":
+    store = AssetStore()
+    print(json.dumps(store.stats(), indent=2))
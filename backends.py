@@ -0,0 +1,235 @@
+import os
+import math
+import time
+import random
+import asyncio
+import hashlib
+import threading
+import contextlib
+
+import numpy as np
+
+# "gemini" (default) or "fake" for offline benchmarks and load tests
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+
+GEMINI_EMBEDDING_MODEL = "models/text-embedding-004"
+# Generation models in fallback order
+GEMINI_MODELS = os.getenv("GEMINI_MODELS", "gemini-2.0-flash,gemini-2.5-flash")
+
+# Fake backend knobs: latencies are "median_ms,p95_ms" of a log-normal distribution
+FAKE_EMBED_LATENCY = os.getenv("FAKE_EMBED_LATENCY", "20,60")
+FAKE_GENERATE_LATENCY = os.getenv("FAKE_GENERATE_LATENCY", "400,1200")
+FAKE_CHUNK_LATENCY = os.getenv("FAKE_CHUNK_LATENCY", "30,80")
+# Extra time to first token per 1000 prompt tokens (ms), as input processing costs
+FAKE_PREFILL_MS_PER_KTOK = float(os.getenv("FAKE_PREFILL_MS_PER_KTOK", "0"))
+FAKE_ERROR_RATE = float(os.getenv("FAKE_ERROR_RATE", "0"))
+# Generations the fake serves at once (0 = unlimited); the rest wait their turn, like a saturated API
+FAKE_CAPACITY = int(os.getenv("FAKE_CAPACITY", "0"))
+FAKE_EMBED_DIM = int(os.getenv("FAKE_EMBED_DIM", "64"))
+FAKE_ANSWER_WORDS = int(os.getenv("FAKE_ANSWER_WORDS", "60"))
+FAKE_SEED = int(os.getenv("FAKE_SEED", "0"))
+FAKE_MODELS = os.getenv("FAKE_MODELS", "fake-primary,fake-fallback")
+
+
+class GeminiBackend:
+    """Google Gemini embeddings and generation (the production backend)"""
+
+    embedding_model = GEMINI_EMBEDDING_MODEL
+
+    def __init__(self, api_key=None):
+        import google.generativeai as genai
+
+        self.genai = genai
+        api_key = api_key or os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY not set")
+
+        genai.configure(api_key=api_key)
+
+        # Building a model object never fails; falling back happens per call (GenerationClient)
+        self.models = [(name, genai.GenerativeModel(name)) for name in GEMINI_MODELS.split(",") if name]
+        self.model = self.models[0][1]
+
+    def embed(self, texts, task_type):
+        """Embed a list of texts in one Google embeddings API call"""
+        resp = self.genai.embed_content(
+            model=self.embedding_model,
+            content=texts,
+            task_type=task_type
+        )
+
+        raw_embedding = resp.get('embedding', [])
+
+        if isinstance(raw_embedding, list):
+            if len(raw_embedding) > 0 and isinstance(raw_embedding[0], (int, float)):
+                return [raw_embedding]
+            return raw_embedding
+        raise ValueError(f"Unexpected embedding format: {type(raw_embedding)}")
+
+    def generation_config(self, temperature, max_output_tokens):
+        return self.genai.types.GenerationConfig(
+            temperature=temperature,
+            max_output_tokens=max_output_tokens
+        )
+
+
+class FakeBackendError(RuntimeError):
+    pass
+
+
+class LatencyModel:
+    """Log-normal latency given its median and p95, in milliseconds"""
+
+    def __init__(self, median_ms, p95_ms, rng):
+        self.mu = math.log(max(median_ms, 1e-3))
+        self.sigma = max(0.0, (math.log(max(p95_ms, median_ms, 1e-3)) - self.mu) / 1.645)
+        self.rng = rng
+
+    @classmethod
+    def parse(cls, spec, rng):
+        median, _, p95 = spec.partition(",")
+        return cls(float(median), float(p95 or median), rng)
+
+    def sample(self):
+        """Seconds"""
+        return math.exp(self.rng.normalvariate(self.mu, self.sigma)) / 1000
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeStream:
+    def __init__(self, backend, words):
+        self.backend = backend
+        self.words = words
+
+    async def __aiter__(self):
+        step = max(1, len(self.words) // 8)
+        for start in range(0, len(self.words), step):
+            await asyncio.sleep(self.backend.chunk_latency.sample())
+            self.backend.maybe_fail("stream")
+            yield FakeResponse(" ".join(self.words[start:start + step]) + " ")
+
+
+class FakeModel:
+    """Stand-in for genai.GenerativeModel: same call shapes, canned answers"""
+
+    def __init__(self, backend, name="fake"):
+        self.backend = backend
+        self.name = name
+
+    def generate_content(self, prompt, generation_config=None):
+        with self.backend.slot():
+            time.sleep(self.backend.generate_latency.sample() + self.backend.prefill(prompt))
+        self.backend.maybe_fail("generate")
+        return FakeResponse(" ".join(self.backend.answer_words(prompt)))
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False):
+        if stream:
+            async with self.backend.aslot():
+                await asyncio.sleep(self.backend.chunk_latency.sample() + self.backend.prefill(prompt))
+            self.backend.maybe_fail("generate")
+            return FakeStream(self.backend, self.backend.answer_words(prompt))
+        async with self.backend.aslot():
+            await asyncio.sleep(self.backend.generate_latency.sample() + self.backend.prefill(prompt))
+        self.backend.maybe_fail("generate")
+        return FakeResponse(" ".join(self.backend.answer_words(prompt)))
+
+
+class FakeBackend:
+    """Deterministic, offline backend for load tests and benchmarks.
+
+    Embeddings are bag-of-words vectors (each word hashed to a fixed random
+    direction), so paraphrases land close together and retrieval and the
+    semantic cache behave realistically. `vectors` pins exact vectors for
+    chosen texts. Latencies are log-normal, plus prefill_ms_per_ktok per
+    1000 prompt tokens, and every call fails with probability error_rate;
+    with the same seed, runs draw the same sequence. With a capacity, at
+    most that many generations (time to first chunk, when streaming) run
+    at once and the rest queue, so overload shows up as latency.
+    """
+
+    embedding_model = "fake-embedding"
+
+    def __init__(self, embed_latency=FAKE_EMBED_LATENCY, generate_latency=FAKE_GENERATE_LATENCY,
+                 chunk_latency=FAKE_CHUNK_LATENCY, error_rate=FAKE_ERROR_RATE, dim=FAKE_EMBED_DIM,
+                 answer_words=FAKE_ANSWER_WORDS, vectors=None, seed=FAKE_SEED, models=FAKE_MODELS,
+                 prefill_ms_per_ktok=FAKE_PREFILL_MS_PER_KTOK, capacity=FAKE_CAPACITY):
+        self.rng = random.Random(seed)
+        self.embed_latency = LatencyModel.parse(embed_latency, self.rng)
+        self.generate_latency = LatencyModel.parse(generate_latency, self.rng)
+        self.chunk_latency = LatencyModel.parse(chunk_latency, self.rng)
+        self.error_rate = error_rate
+        self.prefill_ms_per_ktok = prefill_ms_per_ktok
+        self._sync_slots = threading.BoundedSemaphore(capacity) if capacity else None
+        self._async_slots = asyncio.Semaphore(capacity) if capacity else None
+        self.dim = dim
+        self.n_answer_words = answer_words
+        self.vectors = dict(vectors or {})
+        self.models = [(name, FakeModel(self, name)) for name in models.split(",") if name]
+        self.model = self.models[0][1]
+        self._words = {}
+        self._lock = threading.Lock()
+        self.calls = {"embed": 0, "generate": 0, "errors": 0}
+
+    def maybe_fail(self, kind):
+        with self._lock:
+            self.calls[kind] = self.calls.get(kind, 0) + 1
+            failed = self.error_rate and self.rng.random() < self.error_rate
+            if failed:
+                self.calls["errors"] += 1
+        if failed:
+            raise FakeBackendError(f"Injected {kind} failure")
+
+    def slot(self):
+        return self._sync_slots or contextlib.nullcontext()
+
+    def aslot(self):
+        return self._async_slots or contextlib.nullcontext()
+
+    def prefill(self, prompt):
+        """Seconds of input processing for a prompt (~4 characters per token)"""
+        return len(prompt) / 4 / 1000 * self.prefill_ms_per_ktok / 1000
+
+    def word_vector(self, word):
+        vec = self._words.get(word)
+        if vec is None:
+            seed = int.from_bytes(hashlib.sha1(word.encode("utf-8")).digest()[:8], "big")
+            vec = self._words[word] = np.random.default_rng(seed).standard_normal(self.dim)
+        return vec
+
+    def vector(self, text):
+        if text in self.vectors:
+            return list(self.vectors[text])
+        total = np.zeros(self.dim)
+        for word in text.lower().split():
+            total += self.word_vector(word.strip(".,:;!?'\"()"))
+        norm = np.linalg.norm(total)
+        return (total / norm if norm else total).tolist()
+
+    def embed(self, texts, task_type):
+        time.sleep(self.embed_latency.sample())
+        self.maybe_fail("embed")
+        return [self.vector(text) for text in texts]
+
+    def generation_config(self, temperature, max_output_tokens):
+        return {"temperature": temperature, "max_output_tokens": max_output_tokens}
+
+    def answer_words(self, prompt):
+        """Canned answer of n_answer_words words, fixed for a given question"""
+        question = prompt.rsplit("Question:", 1)[-1].split("Answer:", 1)[0].strip()
+        words = ["GharFix", "can", "help", "with:"] + question.split()[:12]
+        filler = "Our trained professionals serve your area and you can type book now to schedule a visit".split()
+        while len(words) < self.n_answer_words:
+            words.extend(filler)
+        return words[:self.n_answer_words]
+
+
+def create_backend():
+    if LLM_BACKEND == "fake":
+        return FakeBackend()
+    if LLM_BACKEND != "gemini":
+        raise ValueError(f"Unknown LLM_BACKEND: {LLM_BACKEND}")
+    return GeminiBackend()
@@ -0,0 +1,134 @@
+"""Replay first-turn questions with and without the answer cache.
+
+Replays --requests first-turn questions, each from a new conversation, through
+RAGChatbot.achat_with_rag with the fake backend: once with the answer cache
+as configured (ANSWER_CACHE_SIZE) and once with it disabled, and counts the
+generate calls the model received in each run. The replay is either --log (one
+message per line) or synthetic traffic: popular FAQ questions drawn with a
+Zipf-like skew, asked as written, with different case and punctuation (exact
+hits) or lightly reworded (semantic hits), mixed with --unique-share one-off
+questions no cache can answer. Reports exact and semantic hit rates and the
+reduction in LLM calls:
+
+    python bench_answer_cache.py --requests 2000 --out bench_answer_cache.json
+    python bench_answer_cache.py --log questions.txt
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+
+from loadtest import offline_environment, summarize
+
+# Questions the fast path leaves to the LLM, each with light rewordings
+FAQ = [
+    ("do you repair ceiling fans", ["can you repair ceiling fans", "do you repair ceiling fans at home"]),
+    ("my kitchen tap is leaking what should i do", ["kitchen tap is leaking what should i do", "my kitchen tap is leaking, what do i do"]),
+    ("how long does ac servicing take", ["how long does ac servicing usually take", "how long does an ac servicing take"]),
+    ("do you clean water tanks on weekends", ["do you clean water tanks on the weekend", "do you clean water tanks weekends too"]),
+    ("can you install a geyser in my bathroom", ["can you install a geyser in the bathroom", "can you install a new geyser in my bathroom"]),
+    ("is pest control safe for kids", ["is pest control safe for small kids", "is your pest control safe for kids"]),
+    ("do you fix washing machines", ["do you fix washing machines at home", "can you fix washing machines"]),
+    ("my switchboard sparks when i plug in", ["my switchboard sparks when i plug something in", "switchboard sparks when i plug in"]),
+    ("do you do deep cleaning of kitchens", ["do you do deep cleaning of a kitchen", "do you also do deep cleaning of kitchens"]),
+    ("can you paint one room", ["can you paint just one room", "can you paint a single room"]),
+    ("do your electricians bring their own tools", ["do your electricians bring their tools", "do electricians bring their own tools"]),
+    ("what happens if the repair does not work", ["what happens if the repair doesn't work", "what if the repair does not work"]),
+]
+ITEMS = ["ceiling fan", "geyser", "kitchen sink", "washing machine", "inverter", "ro filter", "shower", "chimney"]
+
+
+def synthetic_traffic(n, unique_share, seed):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(FAQ))]
+    messages = []
+    for i in range(n):
+        if rng.random() < unique_share:
+            messages.append(f"my {rng.choice(ITEMS)} in flat {i} stopped working after {rng.randint(2, 90)} days")
+            continue
+        question, rewordings = rng.choices(FAQ, weights)[0]
+        style = rng.random()
+        if style < 0.5:
+            messages.append(question)
+        elif style < 0.75:
+            messages.append(question.capitalize() + rng.choice(["?", "??", " ?", "!"]))
+        else:
+            messages.append(rng.choice(rewordings))
+    return messages
+
+
+async def replay(bot, messages, cached):
+    from caching import ResponseCache
+
+    bot.answer_cache = ResponseCache() if cached else ResponseCache(max_entries=0)
+    bot.answer_cache.set_version(bot.kb_version)
+    generate_before = bot.backend.calls["generate"]
+    latencies = []
+    started = time.perf_counter()
+    for n, message in enumerate(messages):
+        begun = time.perf_counter()
+        await bot.achat_with_rag(message, f"replay-{int(cached)}-{n}")
+        latencies.append(time.perf_counter() - begun)
+    stats = bot.answer_cache.stats()
+    return {
+        "requests": len(messages),
+        "generate_calls": bot.backend.calls["generate"] - generate_before,
+        "exact_hits": stats["exact_hits"],
+        "semantic_hits": stats["semantic_hits"],
+        "exact_hit_rate": round(stats["exact_hits"] / len(messages), 4),
+        "semantic_hit_rate": round(stats["semantic_hits"] / len(messages), 4),
+        "latency_ms": summarize(latencies),
+        "seconds": round(time.perf_counter() - started, 1),
+    }
+
+
+async def main(args):
+    os.environ.setdefault("RETRIEVER", "numpy")
+    os.environ.setdefault("FAKE_GENERATE_LATENCY", "20,60")
+    os.environ.setdefault("FAKE_EMBED_LATENCY", "2,5")
+    offline_environment(args.seed)
+    from final import RAGChatbot
+
+    if args.log:
+        with open(args.log, encoding="utf-8") as f:
+            messages = [line.strip() for line in f if line.strip()][:args.requests]
+    else:
+        messages = synthetic_traffic(args.requests, args.unique_share, args.seed)
+
+    bot = RAGChatbot()
+    results = {}
+    for setup, cached in (("no_cache", False), ("cache", True)):
+        results[setup] = await replay(bot, messages, cached)
+        r = results[setup]
+        print(f"{setup:9} {r['requests']} requests  generate calls {r['generate_calls']}  "
+              f"exact hits {r['exact_hits']} ({r['exact_hit_rate']:.1%})  "
+              f"semantic hits {r['semantic_hits']} ({r['semantic_hit_rate']:.1%})  "
+              f"p50 {r['latency_ms'].get('p50')} ms")
+    bot.close()
+    without, with_cache = results["no_cache"]["generate_calls"], results["cache"]["generate_calls"]
+    results["llm_call_reduction"] = round(1 - with_cache / without, 4) if without else 0.0
+    print(f"LLM calls: {without} -> {with_cache} ({results['llm_call_reduction']:.1%} fewer)")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--log", help="replay these messages (one per line) instead of synthetic traffic")
+    parser.add_argument("--unique-share", type=float, default=0.3, help="share of one-off questions")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench_answer_cache.json")
+    args = parser.parse_args()
+    args.out = os.path.abspath(args.out)
+    if args.log:
+        args.log = os.path.abspath(args.log)
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+
+    result = asyncio.run(main(args))
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Wrote {args.out}")
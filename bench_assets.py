@@ -0,0 +1,107 @@
+"""Compare frontend asset serving before and after the in-memory asset store.
+
+"before" is the previous setup (StaticFiles on forntend/ and a FileResponse
+for /), "after" is final2.app. Both are driven in-process, so numbers show
+bytes on the wire and server-side requests/sec without network noise:
+
+- first visit: /, the widget JS and CSS with a browser's Accept-Encoding
+- revisit: the same requests with If-None-Match from the first visit
+- rps: concurrent GETs of the widget JS for --duration seconds
+
+    python bench_assets.py --duration 5 --out bench_assets.json
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+from loadtest import asgi_request, offline_environment
+
+BROWSER = (("accept-encoding", "gzip, deflate, br"),)
+PAGE_VIEW = ["/", "/static/always-visible-widget.js", "/static/always-visible-widget.css"]
+
+
+def before_app():
+    """The serving setup final2.py had before AssetStore"""
+    from fastapi import FastAPI
+    from fastapi.staticfiles import StaticFiles
+    from fastapi.responses import FileResponse
+
+    app = FastAPI()
+    app.mount("/static", StaticFiles(directory="forntend"), name="static")
+
+    @app.get("/")
+    async def root():
+        index_path = os.path.join("forntend", "index.html")
+        if os.path.exists(index_path):
+            return FileResponse(index_path)
+        return {"detail": "Frontend index.html not found"}
+
+    return app
+
+
+async def page_view(app):
+    """(bytes on first visit, bytes on revisit, statuses on revisit)"""
+    first = 0
+    tags = {}
+    for path in PAGE_VIEW:
+        headers = {}
+        _, body, _ = await asgi_request(app, "GET", path, headers=BROWSER, response_headers=headers)
+        first += len(body)
+        tags[path] = headers.get("etag")
+    again = 0
+    statuses = []
+    for path in PAGE_VIEW:
+        extra = BROWSER + ((("if-none-match", tags[path]),) if tags[path] else ())
+        status, body, _ = await asgi_request(app, "GET", path, headers=extra)
+        again += len(body)
+        statuses.append(status)
+    return first, again, statuses
+
+
+async def requests_per_second(app, path, concurrency, duration):
+    done = 0
+    deadline = time.perf_counter() + duration
+
+    async def client():
+        nonlocal done
+        while time.perf_counter() < deadline:
+            await asgi_request(app, "GET", path, headers=BROWSER)
+            done += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return round(done / (time.perf_counter() - started), 1)
+
+
+async def main(args):
+    offline_environment()
+    import final2
+
+    results = {}
+    for label, app in (("before", before_app()), ("after", final2.app)):
+        first, again, statuses = await page_view(app)
+        rps = await requests_per_second(app, PAGE_VIEW[1], args.concurrency, args.duration)
+        results[label] = {"first_visit_bytes": first, "revisit_bytes": again,
+                          "revisit_statuses": statuses, "widget_js_rps": rps}
+        print(label, "  ".join(f"{k} {v}" for k, v in results[label].items()))
+    results["assets"] = final2.assets.stats()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=5, help="seconds of load per setup")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--out", default="bench_assets.json")
+    args = parser.parse_args()
+    args.out = os.path.abspath(args.out)
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+
+    result = asyncio.run(main(args))
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Wrote {args.out}")
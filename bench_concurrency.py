@@ -0,0 +1,102 @@
+"""Throughput vs concurrency for the chat pipeline, against the fake model.
+
+Runs RAGChatbot with the fake backend (LLM_BACKEND=fake, log-normal embed
+and generate latencies) and keeps --levels concurrent conversations busy
+for --duration seconds each, in two modes:
+
+- blocking: chat_with_rag called on the event loop, as /chat did before the
+  async path
+- async: achat_with_rag, as /chat does now
+
+Every question is new and every conversation already has a turn of history,
+so neither the fast path nor the answer cache can answer it. A probe
+coroutine sleeps 10 ms in a loop the whole time; its worst overshoot is how
+long the event loop (and so /health) was stalled:
+
+    python bench_concurrency.py --levels 1,8,32,128 --duration 5 --out bench_concurrency.json
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+from loadtest import offline_environment, summarize
+
+ITEMS = ["ceiling fan", "geyser", "kitchen sink", "washing machine", "inverter", "switchboard", "ro filter", "shower"]
+
+
+async def run_level(bot, mode, concurrency, duration):
+    deadline = time.perf_counter() + duration
+    latencies = []
+    stalls = []
+
+    async def probe():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            stalls.append(time.perf_counter() - started - 0.01)
+
+    async def conversation(uid):
+        n = 0
+        cid = f"{mode}-{concurrency}-{uid}"
+        bot.add_to_memory(cid, "hello", "Hi! How can I help?")
+        while time.perf_counter() < deadline:
+            n += 1
+            question = f"my {ITEMS[(uid + n) % len(ITEMS)]} in flat {uid * 1000 + n} stopped working, what should I do"
+            started = time.perf_counter()
+            if mode == "blocking":
+                bot.chat_with_rag(question, cid)
+            else:
+                await bot.achat_with_rag(question, cid)
+            latencies.append(time.perf_counter() - started)
+            # Let the probe run between blocking calls, as the server would between requests
+            await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    await asyncio.gather(probe(), *(conversation(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 2),
+        "latency_ms": summarize(latencies),
+        "max_loop_stall_ms": round(max(stalls, default=0) * 1000, 1),
+    }
+
+
+async def main(args):
+    os.environ.setdefault("RETRIEVER", "numpy")
+    offline_environment()
+    from final import RAGChatbot
+
+    bot = RAGChatbot()
+    results = []
+    for mode in ("blocking", "async"):
+        for concurrency in args.levels:
+            result = await run_level(bot, mode, concurrency, args.duration)
+            results.append(result)
+            print(f"{mode:9} c={concurrency:<5} {result['requests']:6} req  {result['rps']:8} rps  "
+                  f"p50 {result['latency_ms'].get('p50')} ms  p99 {result['latency_ms'].get('p99')} ms  "
+                  f"loop stall {result['max_loop_stall_ms']} ms")
+    bot.close()
+    return {"levels": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", default="1,8,32,128", help="comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=5, help="seconds per level and mode")
+    parser.add_argument("--out", default="bench_concurrency.json")
+    args = parser.parse_args()
+    args.levels = [int(level) for level in args.levels.split(",")]
+    args.out = os.path.abspath(args.out)
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+
+    result = asyncio.run(main(args))
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Wrote {args.out}")
@@ -0,0 +1,139 @@
+"""Generation tail latency with and without hedging, on slow/faulty stub models.
+
+The primary stub model answers in --fast-ms most of the time, takes
+--slow-ms for a --slow-share of calls and fails a --error-rate of them; the
+fallback stub is steady. --calls generations run --concurrency at a time
+through GenerationClient in three setups:
+
+- primary only: one model, no fallback, no hedging (what __init__ built before)
+- fallback: the fallback model is tried after a failure
+- hedged: also fire the fallback once the primary passes its recent p95
+
+and the p50/p95/p99 latency and failed calls of each are compared:
+
+    python bench_hedging.py --calls 2000 --out bench_hedging.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+
+from loadtest import summarize
+
+
+class StubError(RuntimeError):
+    pass
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    """genai.GenerativeModel stand-in with a latency mix and injected failures"""
+
+    def __init__(self, name, fast_ms, slow_ms=(0, 0), slow_share=0.0, error_rate=0.0, seed=0):
+        self.name = name
+        self.fast_ms = fast_ms
+        self.slow_ms = slow_ms
+        self.slow_share = slow_share
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.calls = 0
+
+    def draw(self):
+        self.calls += 1
+        low, high = self.slow_ms if self.rng.random() < self.slow_share else self.fast_ms
+        return self.rng.uniform(low, high) / 1000, self.rng.random() < self.error_rate
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False):
+        seconds, fail = self.draw()
+        await asyncio.sleep(seconds)
+        if fail:
+            raise StubError(f"{self.name}: injected failure")
+        return StubResponse(f"{self.name} answer")
+
+    def generate_content(self, prompt, generation_config=None):
+        seconds, fail = self.draw()
+        time.sleep(seconds)
+        if fail:
+            raise StubError(f"{self.name}: injected failure")
+        return StubResponse(f"{self.name} answer")
+
+
+def models(args):
+    primary = StubModel("stub-primary", (args.fast_ms * 0.6, args.fast_ms * 1.4), (args.slow_ms * 0.7, args.slow_ms * 1.3),
+                        args.slow_share, args.error_rate, seed=args.seed)
+    fallback = StubModel("stub-fallback", (args.fast_ms * 0.8, args.fast_ms * 1.6), seed=args.seed + 1)
+    return primary, fallback
+
+
+async def run(client, calls, concurrency):
+    latencies = []
+    failures = 0
+    queue = iter(range(calls))
+
+    async def caller():
+        nonlocal failures
+        for _ in queue:
+            started = time.perf_counter()
+            try:
+                await client.agenerate("Question: is a plumber available today?\nAnswer:", {})
+            except Exception:
+                failures += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(caller() for _ in range(concurrency)))
+    return latencies, failures
+
+
+async def main(args):
+    from generation import GenerationClient
+
+    results = {}
+    for setup in ("primary_only", "fallback", "hedged"):
+        primary, fallback = models(args)
+        chain = [(primary.name, primary)] if setup == "primary_only" else [(primary.name, primary), (fallback.name, fallback)]
+        client = GenerationClient(chain, hedge=setup == "hedged")
+        started = time.perf_counter()
+        latencies, failures = await run(client, args.calls, args.concurrency)
+        stats = client.stats()
+        results[setup] = {
+            "latency_ms": summarize(latencies),
+            "failed_calls": failures,
+            "hedges": stats["hedges"],
+            "fallbacks": stats["fallbacks"],
+            "model_calls": primary.calls + (fallback.calls if setup != "primary_only" else 0),
+            "seconds": round(time.perf_counter() - started, 1),
+        }
+        lat = results[setup]["latency_ms"]
+        print(f"{setup:13} p50 {lat.get('p50')} ms  p95 {lat.get('p95')} ms  p99 {lat.get('p99')} ms  "
+              f"failed {failures}  hedges {stats['hedges']}  fallbacks {stats['fallbacks']}  "
+              f"model calls {results[setup]['model_calls']}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--fast-ms", type=float, default=150, help="typical primary latency")
+    parser.add_argument("--slow-ms", type=float, default=3000, help="primary latency on a slow call")
+    parser.add_argument("--slow-share", type=float, default=0.04, help="share of slow primary calls")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="share of failing primary calls")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench_hedging.json")
+    args = parser.parse_args()
+    args.out = os.path.abspath(args.out)
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+
+    result = asyncio.run(main(args))
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Wrote {args.out}")
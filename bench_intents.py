@@ -0,0 +1,123 @@
+"""Check the local fast path (intents.py) against a labelled corpus.
+
+Each message is labelled with the intent it should get, or None when it
+must fall through to the LLM. Prints the misclassified messages, accuracy,
+the share answered locally and per-message classification time, and exits
+non-zero on any mismatch:
+
+    python bench_intents.py --out bench_intents.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+from loadtest import offline_environment
+
+CORPUS = [
+    # list_services
+    ("List all the services", "list_services"),
+    ("what services do you offer?", "list_services"),
+    ("What are your services", "list_services"),
+    ("show me all services please", "list_services"),
+    ("services list", "list_services"),
+    # coverage
+    ("Do you serve Andheri?", "coverage"),
+    ("does gharfix operate in Bengaluru", "coverage"),
+    ("are you available in Chennai", "coverage"),
+    ("services available in hyderabad", "coverage"),
+    ("do you serve Pune", None),
+    # coverage_areas
+    ("which cities do you serve", "coverage_areas"),
+    ("where do you operate?", "coverage_areas"),
+    ("service areas", "coverage_areas"),
+    # pricing
+    ("What are your rates?", "pricing"),
+    ("how much does it cost", "pricing"),
+    ("how much do you charge", "pricing"),
+    ("what is the price for plumbing", "pricing"),
+    ("how much for tank cleaning", "pricing"),
+    ("can i get a quote", "pricing"),
+    ("pricing", "pricing"),
+    ("rates please", "pricing"),
+    # contact
+    ("contact number please", "contact"),
+    ("what is your whatsapp number", "contact"),
+    ("how can I contact you", "contact"),
+    ("can i get your phone number", "contact"),
+    ("helpline", "contact"),
+    # hours
+    ("what are your timings", "hours"),
+    ("What are your working hours?", "hours"),
+    ("are you open 24/7", "hours"),
+    ("when do you open", "hours"),
+    ("do you work on sundays", "hours"),
+    # Keywords in messages that are about something else: the LLM answers these
+    ("do you repair phone screens", None),
+    ("my door won't open, can you fix the lock", None),
+    ("can you fix a tap that costs too much water", None),
+    ("my whatsapp is not working", None),
+    ("the rate of water flow in my shower is very low", None),
+    ("my fridge door stays open and the light is off", None),
+    ("is there an extra charge for cleaning the balcony as well", None),
+    ("my phone charger socket sparks", None),
+    ("what are the opening hours of the nearest branch and the prices for deep cleaning", None),
+    # General questions
+    ("my kitchen tap is leaking, can someone fix it today", None),
+    ("do you also repair bathroom pipes", None),
+    ("is your massage service available at home", None),
+    ("I need a cook for a family dinner this weekend", None),
+    ("can you clean the water tank on my building roof", None),
+    ("hello", None),
+]
+ROUNDS = 200
+
+
+def main(args):
+    os.environ.setdefault("RETRIEVER", "numpy")
+    offline_environment()
+    from final import RAGChatbot
+
+    bot = RAGChatbot()
+    classifier = bot.intents
+
+    wrong = []
+    local = 0
+    for message, expected in CORPUS:
+        result = classifier.classify(message)
+        got = result[0] if result else None
+        local += got is not None
+        if got != expected:
+            wrong.append({"message": message, "expected": expected, "got": got})
+
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        for message, _ in CORPUS:
+            classifier.classify(message)
+    per_message_us = (time.perf_counter() - started) / (ROUNDS * len(CORPUS)) * 1e6
+    bot.outbox.close()
+
+    for item in wrong:
+        print(f"MISMATCH {item['message']!r}: expected {item['expected']}, got {item['got']}")
+    summary = {
+        "messages": len(CORPUS),
+        "accuracy": round(1 - len(wrong) / len(CORPUS), 4),
+        "hit_rate": round(local / len(CORPUS), 4),
+        "classify_us": round(per_message_us, 2),
+    }
+    print("  ".join(f"{k} {v}" for k, v in summary.items()))
+    return {"summary": summary, "mismatches": wrong}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default="bench_intents.json")
+    args = parser.parse_args()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    result = main(args)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Wrote {args.out}")
+    sys.exit(1 if result["mismatches"] else 0)
@@ -0,0 +1,128 @@
+"""Location matcher micro-benchmark over 10,000 localities.
+
+Times matching.Matcher against the linear substring scan validate_location
+used before it, on a synthetic list of --localities place names plus the
+real ones, for several kinds of input (exact names, names inside a sentence,
+prefixes, one-typo misspellings, unknown places). Also checks what
+validate_location answers for a few inputs that must not be "corrected"
+into a different city, and exits non-zero if any is wrong:
+
+    python bench_matching.py --localities 10000 --out bench_matching.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+from loadtest import offline_environment
+
+SYLLABLES = ["an", "ba", "bha", "cha", "da", "ga", "ha", "ja", "ka", "kho", "la", "ma", "na",
+             "pa", "ra", "sa", "sha", "ta", "va", "ya", "ri", "li", "ni", "ko", "pu", "ve"]
+SUFFIXES = ["", "", " nagar", "pur", "wadi", "abad", "gaon", " colony", " east", " west"]
+
+# validate_location input -> expected location
+LOCATION_CASES = [
+    ("Mahad", "Mahad"),  # not Malad
+    ("Patan", "Patan"),  # not Patna
+    ("Thanjavur", "Thanjavur"),
+    ("andheri", "Andheri"),
+    ("Navi Mumbai", "Navi Mumbai"),
+    ("I live in Bandra", "Bandra"),
+    ("navi mum", "Navi Mumbai"),
+    ("Mumabi 400001", "Mumbai"),
+]
+
+
+def localities(count, seed=0):
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < count:
+        stem = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        names.add((stem + rng.choice(SUFFIXES)).title())
+    return sorted(names)
+
+
+def legacy_match(names, text):
+    """The scan validate_location did before Matcher"""
+    lower = text.lower()
+    for name in names:
+        if name.lower() in lower or lower in name.lower():
+            return name
+    return None
+
+
+def typo(word, rng):
+    i = rng.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def queries(names, count, seed=1):
+    rng = random.Random(seed)
+    sample = rng.sample(names, count)
+    return {
+        "exact": sample,
+        "in_sentence": [f"I stay near {name} station" for name in sample],
+        "prefix": [name.split()[0][:max(4, len(name.split()[0]) - 2)] for name in sample],
+        "typo": [typo(name.split()[0], rng) for name in sample if len(name.split()[0]) >= 5],
+        "unknown": ["Zq" + name.split()[0].lower() + "xq" for name in sample],
+    }
+
+
+def per_call_us(fn, inputs):
+    started = time.perf_counter()
+    for text in inputs:
+        fn(text)
+    return round((time.perf_counter() - started) / len(inputs) * 1e6, 2)
+
+
+def main(args):
+    os.environ.setdefault("RETRIEVER", "numpy")
+    offline_environment()
+    from final import RAGChatbot
+    from matching import Matcher
+
+    bot = RAGChatbot()
+    names = bot.valid_locations + localities(args.localities)
+
+    started = time.perf_counter()
+    matcher = Matcher(names)
+    build_s = time.perf_counter() - started
+
+    results = {"localities": len(names), "build_s": round(build_s, 3), "lookup_us": {}}
+    for kind, inputs in queries(names, args.queries).items():
+        results["lookup_us"][kind] = {
+            "linear": per_call_us(lambda text: legacy_match(names, text), inputs),
+            "matcher": per_call_us(lambda text: matcher.match(text, limit=1), inputs),
+            "matcher_no_typos": per_call_us(lambda text: matcher.match(text, limit=1, typos=False), inputs),
+        }
+        print(f"{kind:12}", "  ".join(f"{k} {v} us" for k, v in results["lookup_us"][kind].items()))
+    print(f"build {results['build_s']} s for {len(names)} localities")
+
+    wrong = []
+    for text, expected in LOCATION_CASES:
+        valid, got = bot.validate_location(text)
+        if not valid or got != expected:
+            wrong.append({"input": text, "expected": expected, "got": got})
+            print(f"MISMATCH {text!r}: expected {expected}, got {got}")
+    bot.close()
+    results["location_mismatches"] = wrong
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--localities", type=int, default=10000, help="synthetic place names added to the real list")
+    parser.add_argument("--queries", type=int, default=500, help="inputs per kind")
+    parser.add_argument("--out", default="bench_matching.json")
+    args = parser.parse_args()
+    args.out = os.path.abspath(args.out)
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+
+    result = main(args)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Wrote {args.out}")
+    sys.exit(1 if result["location_mismatches"] else 0)
@@ -0,0 +1,157 @@
+"""Overhead of the latency instrumentation, as a share of request time.
+
+Sends --requests /chat requests of each kind (fast-path answer, booking step,
+LLM answer) through final2.app in-process with the fake backend, and counts
+how many stage timings, request timings, other histogram observations and
+counter increments each kind records. Each of those operations is then timed
+on its own in a tight loop, giving the instrumentation cost per request,
+which is compared with the measured mean request time. Exits non-zero if
+any kind exceeds --max-overhead (1% by default). The cost of a sampled trace
+(TRACE_SAMPLE_RATE) and of rendering /metrics are reported alongside:
+
+    FAKE_GENERATE_LATENCY=50,150 python bench_metrics.py --out bench_metrics.json
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+
+from loadtest import asgi_request, offline_environment, Lifespan, wait_ready
+
+KINDS = {
+    "fast_path": lambda n: "what are your timings",
+    "booking": lambda n: "i want to book a service",
+    "llm": lambda n: f"my geyser in flat {n} makes a loud noise, what could it be",
+}
+# Sent (untimed) before an LLM question so its conversation has history and the answer cache stays out
+WARM_UP = {"llm": "what are your timings"}
+ROUNDS = 100_000
+
+
+def observations(metric):
+    """Total observations (histograms) or increments (counters) recorded so far"""
+    total = 0
+    for value in metric.values().values():
+        total += sum(value[0]) if isinstance(value, list) else abs(value)
+    return total
+
+
+def per_op_us(fn, rounds=ROUNDS, repeat=5):
+    """Best of `repeat` runs, as timeit recommends: slower runs measure other load on the host"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(rounds // repeat):
+            fn()
+        best = min(best, (time.perf_counter() - started) / (rounds // repeat))
+    return best * 1e6
+
+
+def operation_costs(metrics):
+    def stage():
+        with metrics.stage("bench"):
+            pass
+
+    def request():
+        with metrics.track_request("bench"):
+            pass
+
+    def observe():
+        metrics.PROMPT_TOKENS.observe(300)
+
+    def count():
+        metrics.BOOKING_STEPS.inc("bench")
+
+    costs = {"stage": per_op_us(stage), "request": per_op_us(request),
+             "observe": per_op_us(observe), "counter": per_op_us(count)}
+
+    # A sampled request also appends its trace to TRACE_PATH
+    sample_rate, trace_path = metrics.TRACE_SAMPLE_RATE, metrics.TRACE_PATH
+    metrics.TRACE_SAMPLE_RATE = 1
+    metrics.TRACE_PATH = os.path.join(tempfile.mkdtemp(), "traces.jsonl")
+
+    def traced():
+        with metrics.track_request("bench"):
+            for _ in range(5):
+                with metrics.stage("bench"):
+                    pass
+
+    costs["traced_request_5_stages"] = per_op_us(traced, ROUNDS // 10)
+    metrics.TRACE_SAMPLE_RATE, metrics.TRACE_PATH = sample_rate, trace_path
+    costs["render_metrics"] = per_op_us(metrics.REGISTRY.render, 1000)
+    return {k: round(v, 3) for k, v in costs.items()}
+
+
+async def measure_kind(app, metrics, kind, requests):
+    other_histograms = [m for m in metrics.REGISTRY.metrics
+                        if m.kind == "histogram" and m not in (metrics.STAGE_SECONDS, metrics.REQUEST_SECONDS)]
+    counters = [m for m in metrics.REGISTRY.metrics if m.kind == "counter"]
+    # New conversation each time, from its own address, so no limit or booking state carries over
+    def client(n):
+        return (("x-forwarded-for", f"10.1.{n // 256 % 256}.{n % 256}"),)
+
+    if kind in WARM_UP:
+        for n in range(requests):
+            await asgi_request(app, "POST", "/chat", {"message": WARM_UP[kind], "conversation_id": f"metrics-{kind}-{n}"},
+                               headers=client(n))
+    before = (observations(metrics.STAGE_SECONDS), observations(metrics.REQUEST_SECONDS),
+              sum(map(observations, other_histograms)), sum(map(observations, counters)))
+    elapsed = 0.0
+    for n in range(requests):
+        headers = client(n)
+        payload = {"message": KINDS[kind](n), "conversation_id": f"metrics-{kind}-{n}"}
+        started = time.perf_counter()
+        status, _, _ = await asgi_request(app, "POST", "/chat", payload, headers=headers)
+        elapsed += time.perf_counter() - started
+        if status != 200:
+            raise RuntimeError(f"/chat returned {status} for {kind}")
+    after = (observations(metrics.STAGE_SECONDS), observations(metrics.REQUEST_SECONDS),
+             sum(map(observations, other_histograms)), sum(map(observations, counters)))
+    per_request = [(b - a) / requests for a, b in zip(before, after)]
+    return elapsed / requests * 1e6, dict(zip(("stage", "request", "observe", "counter"), per_request))
+
+
+async def main(args):
+    os.environ.setdefault("RETRIEVER", "numpy")
+    os.environ.setdefault("TRACE_SAMPLE_RATE", "0")
+    offline_environment()
+    import final2
+    import metrics
+
+    costs = operation_costs(metrics)
+    results = {"operation_us": costs, "kinds": {}}
+    async with Lifespan(final2.app):
+        await wait_ready(final2.app)
+        for kind in KINDS:
+            request_us, ops = await measure_kind(final2.app, metrics, kind, args.requests)
+            overhead_us = sum(ops[op] * costs[op] for op in ops)
+            results["kinds"][kind] = {
+                "request_us": round(request_us, 1),
+                "ops_per_request": {k: round(v, 2) for k, v in ops.items()},
+                "overhead_us": round(overhead_us, 2),
+                "overhead_pct": round(overhead_us / request_us * 100, 3),
+            }
+            print(f"{kind:10} request {request_us:10.1f} us  instrumentation {overhead_us:6.2f} us "
+                  f"({results['kinds'][kind]['overhead_pct']}%)  ops {results['kinds'][kind]['ops_per_request']}")
+    print("operation costs (us):", "  ".join(f"{k} {v}" for k, v in costs.items()))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="requests per kind")
+    parser.add_argument("--max-overhead", type=float, default=1.0, help="percent of request time")
+    parser.add_argument("--out", default="bench_metrics.json")
+    args = parser.parse_args()
+    args.out = os.path.abspath(args.out)
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+
+    result = asyncio.run(main(args))
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Wrote {args.out}")
+    sys.exit(1 if any(kind["overhead_pct"] > args.max_overhead for kind in result["kinds"].values()) else 0)
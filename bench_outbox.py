@@ -0,0 +1,234 @@
+"""Lead outbox benchmark: submit latency under load and zero loss across crashes.
+
+Leads go to an HTTP stub sink (a local webhook that records every delivered
+key and can fail a share of batches with 503), through the real WebhookSink:
+
+- throughput: --threads threads submit --leads leads in total; reports
+  submits/sec, submit p50/p99 and leads per fsync (group commit)
+- crash: --workers processes submit leads, printing each key once submit()
+  has returned (i.e. the lead is durable), and are SIGKILLed after --kill-after
+  seconds. A fresh outbox on the same journal path then recovers their
+  journals. Every printed key must reach the sink; duplicates are allowed
+  (at-least-once) and counted.
+
+    python bench_outbox.py --fail-rate 0.2 --out bench_outbox.json
+    python bench_outbox.py --sink-only --port 8765   # just run the stub sink
+"""
+import os
+import sys
+import json
+import time
+import random
+import signal
+import argparse
+import tempfile
+import threading
+import subprocess
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+class StubSink(ThreadingHTTPServer):
+    """Webhook stand-in: POST {"leads": [...]} -> 200, or 503 for a share of batches"""
+    daemon_threads = True
+
+    def __init__(self, port=0, fail_rate=0.0, delay=0.0):
+        super().__init__(("127.0.0.1", port), StubSinkHandler)
+        self.fail_rate = fail_rate
+        self.delay = delay
+        self.deliveries = Counter()
+        self.batches = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/leads"
+
+    def received(self):
+        with self.lock:
+            return set(self.deliveries)
+
+    def stats(self):
+        with self.lock:
+            return {"batches": self.batches, "rejected_batches": self.rejected,
+                    "unique_leads": len(self.deliveries),
+                    "duplicate_deliveries": sum(n - 1 for n in self.deliveries.values())}
+
+
+class StubSinkHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        sink = self.server
+        if sink.delay:
+            time.sleep(sink.delay)
+        if random.random() < sink.fail_rate:
+            with sink.lock:
+                sink.rejected += 1
+            self.send_response(503)
+            self.end_headers()
+            return
+        keys = [entry["key"] for entry in json.loads(body)["leads"]]
+        with sink.lock:
+            sink.batches += 1
+            sink.deliveries.update(keys)
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def lead(i):
+    return {"name": f"Load Test {i}", "phone": "9876543210", "service": "Plumbing", "location": "Andheri"}
+
+
+def wait_delivered(sink, keys, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline and not keys <= sink.received():
+        time.sleep(0.05)
+    return keys - sink.received()
+
+
+def throughput(args, workdir, sink):
+    from outbox import LeadOutbox, WebhookSink
+
+    outbox = LeadOutbox(sink=WebhookSink(sink.url), path=os.path.join(workdir, "throughput.journal"))
+    latencies = []
+    keys = set()
+    lock = threading.Lock()
+    per_thread = args.leads // args.threads
+
+    def submitter(t):
+        for i in range(per_thread):
+            started = time.perf_counter()
+            key = outbox.submit(lead(t * per_thread + i))
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                keys.add(key)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=submitter, args=(t,)) for t in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    lost = wait_delivered(sink, keys, args.drain_timeout)
+    stats = outbox.stats()
+    outbox.close()
+    ms = np.array(latencies) * 1000
+    return {
+        "leads": len(keys),
+        "submits_per_sec": round(len(keys) / elapsed, 1),
+        "submit_p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "submit_p99_ms": round(float(np.percentile(ms, 99)), 2),
+        "leads_per_fsync": round(stats["journaled"] / max(1, stats["commits"]), 1),
+        "undelivered": len(lost),
+    }
+
+
+def child(args):
+    """Crash-test worker: submit forever, print each durable key"""
+    from outbox import LeadOutbox, WebhookSink
+
+    outbox = LeadOutbox(sink=WebhookSink(args.sink_url), path=args.journal)
+    lock = threading.Lock()
+
+    def submitter(t):
+        i = 0
+        while True:
+            key = outbox.submit(lead(i))
+            with lock:
+                sys.stdout.write(key + "\n")
+                sys.stdout.flush()
+            i += 1
+
+    for t in range(args.threads):
+        threading.Thread(target=submitter, args=(t,), daemon=True).start()
+    threading.Event().wait()
+
+
+def crash(args, workdir, sink):
+    from outbox import LeadOutbox, WebhookSink
+
+    journal = os.path.join(workdir, "crash.journal")
+    command = [sys.executable, os.path.abspath(__file__), "--child", "--journal", journal,
+               "--sink-url", sink.url, "--threads", str(args.threads)]
+    workers = [subprocess.Popen(command, stdout=subprocess.PIPE, text=True) for _ in range(args.workers)]
+    time.sleep(args.kill_after)
+    for worker in workers:
+        worker.send_signal(signal.SIGKILL)
+    durable = set()
+    for worker in workers:
+        out, _ = worker.communicate()
+        durable.update(line.strip() for line in out.splitlines() if len(line.strip()) == 32)
+    delivered_before = len(durable & sink.received())
+
+    started = time.perf_counter()
+    outbox = LeadOutbox(sink=WebhookSink(sink.url), path=journal)
+    lost = wait_delivered(sink, durable, args.drain_timeout)
+    recovery_s = time.perf_counter() - started
+    outbox.close()
+    return {
+        "workers_killed": len(workers),
+        "durable_leads": len(durable),
+        "delivered_before_kill": delivered_before,
+        "recovered_and_delivered": len(durable) - delivered_before - len(lost),
+        "recovery_s": round(recovery_s, 2),
+        "lost": len(lost),
+    }
+
+
+def main(args):
+    sink = StubSink(fail_rate=args.fail_rate, delay=args.sink_delay)
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+    with tempfile.TemporaryDirectory() as workdir:
+        results = {"throughput": throughput(args, workdir, sink)}
+        print("throughput", "  ".join(f"{k} {v}" for k, v in results["throughput"].items()))
+        results["crash"] = crash(args, workdir, sink)
+        print("crash", "  ".join(f"{k} {v}" for k, v in results["crash"].items()))
+    results["sink"] = sink.stats()
+    print("sink", "  ".join(f"{k} {v}" for k, v in results["sink"].items()))
+    sink.shutdown()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--leads", type=int, default=2000, help="leads in the throughput run")
+    parser.add_argument("--threads", type=int, default=16, help="submitting threads per process")
+    parser.add_argument("--workers", type=int, default=4, help="processes killed in the crash run")
+    parser.add_argument("--kill-after", type=float, default=2, help="seconds before SIGKILL")
+    parser.add_argument("--fail-rate", type=float, default=0.2, help="share of batches the sink rejects")
+    parser.add_argument("--sink-delay", type=float, default=0.005, help="seconds per sink request")
+    parser.add_argument("--drain-timeout", type=float, default=60)
+    parser.add_argument("--out", default="bench_outbox.json")
+    parser.add_argument("--sink-only", action="store_true", help="serve the stub sink until interrupted")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--journal", help=argparse.SUPPRESS)
+    parser.add_argument("--sink-url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.out = os.path.abspath(args.out)
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+
+    if args.child:
+        child(args)
+    elif args.sink_only:
+        sink = StubSink(args.port, args.fail_rate, args.sink_delay)
+        print(f"Stub lead sink on {sink.url} (LEAD_WEBHOOK_URL), rejecting {args.fail_rate:.0%} of batches")
+        try:
+            sink.serve_forever()
+        except KeyboardInterrupt:
+            print(json.dumps(sink.stats()))
+    else:
+        result = main(args)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"Wrote {args.out}")
+        sys.exit(1 if result["crash"]["lost"] or result["throughput"]["undelivered"] else 0)
@@ -0,0 +1,123 @@
+"""Compare prompt size and generation latency for a recorded multi-turn chat.
+
+Replays SCRIPT through RAGChatbot with the fake backend and, at every turn,
+builds both the previous prompt (rules, full 6-turn history, catalog,
+context) and the current PromptBuilder prompt from the same session state.
+The fake backend charges --prefill-ms per 1000 prompt tokens on top of its
+normal latency, so the latency column reflects input size:
+
+    python bench_prompt.py --prefill-ms 150 --out bench_prompt.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+from loadtest import offline_environment
+
+# A recorded conversation: follow-ups that miss the fast path and need Gemini
+SCRIPT = [
+    "my kitchen tap is leaking, can someone fix it today",
+    "do you also repair bathroom pipes and fittings",
+    "the geyser in the same bathroom trips the switch, is that electrical work",
+    "can the same visit also check the water purifier",
+    "my parents live alone, do you have someone to look after them in the day",
+    "would that person also cook simple meals for them",
+    "and for the weekend we need a driver to take them to the temple",
+    "can you arrange a puja at home for my mother's birthday too",
+    "is a massage at home possible for my father after his knee surgery",
+    "what should I do first to get all of this started",
+]
+# Long, realistic assistant answers are what made the old history block grow
+ANSWER_WORDS = 110
+
+
+def legacy_prompt(bot, question, turns, context):
+    """The prompt as chat_with_rag built it before PromptBuilder"""
+    history = "\n".join(f"User: {t.user}\nAssistant: {t.bot}" for t in turns)
+    rules = bot.prompts.prefix.split("\n\nGHARFIX SERVICES:")[0]
+    return f"""{rules}
+
+CONVERSATION HISTORY:
+{history}
+
+GHARFIX SERVICES:
+{bot.service_catalog}
+
+RETRIEVED CONTEXT:
+{context}
+
+Question: {question}
+Answer:"""
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def main(args):
+    os.environ.setdefault("RETRIEVER", "numpy")
+    offline_environment(args.seed)
+    from backends import FakeBackend
+    from final import RAGChatbot
+
+    backend = FakeBackend(answer_words=ANSWER_WORDS, prefill_ms_per_ktok=args.prefill_ms,
+                          generate_latency="300,300", seed=args.seed)
+    bot = RAGChatbot(backend=backend)
+    config = bot.generation_config()
+    cid = "bench-prompt"
+
+    rows = []
+    for turn, question in enumerate(SCRIPT, 1):
+        turns = bot.sessions.get_history(cid)
+        context = "\n".join(bot.search_knowledge(question))
+        old, old_build = timed(legacy_prompt, bot, question, turns, context)
+        new, new_build = timed(bot.build_prompt, question, turns, context)
+        _, old_gen = timed(backend.model.generate_content, old, config)
+        answer, new_gen = timed(backend.model.generate_content, new, config)
+        bot.add_to_memory(cid, question, answer.text)
+        row = {
+            "turn": turn,
+            "legacy_tokens": bot.estimate_tokens(old),
+            "tokens": bot.estimate_tokens(new),
+            "suffix_tokens": bot.estimate_tokens(new) - bot.prompts.prefix_tokens,
+            "legacy_ms": round((old_build + old_gen) * 1000, 1),
+            "ms": round((new_build + new_gen) * 1000, 1),
+        }
+        print("  ".join(f"{k} {v}" for k, v in row.items()))
+        rows.append(row)
+
+    def total(key):
+        return int(np.sum([row[key] for row in rows]))
+
+    summary = {
+        "legacy_tokens": total("legacy_tokens"),
+        "tokens": total("tokens"),
+        "token_reduction": round(1 - total("tokens") / total("legacy_tokens"), 3),
+        "legacy_ms_mean": round(float(np.mean([row["legacy_ms"] for row in rows])), 1),
+        "ms_mean": round(float(np.mean([row["ms"] for row in rows])), 1),
+        "prefix_tokens": bot.prompts.prefix_tokens,
+        "prefix_hash": bot.prompts.prefix_hash,
+    }
+    print("  ".join(f"{k} {v}" for k, v in summary.items()))
+    bot.outbox.close()
+    return {"prefill_ms_per_ktok": args.prefill_ms, "turns": rows, "summary": summary}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prefill-ms", type=float, default=150, help="fake input cost, ms per 1000 prompt tokens")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench_prompt.json")
+    args = parser.parse_args()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    result = main(args)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Wrote {args.out}")
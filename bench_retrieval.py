@@ -0,0 +1,127 @@
+"""Benchmark the vector index implementations in retrieval.py.
+
+For each corpus size, builds a ChromaRetriever and a NumpyRetriever over the
+same random unit vectors, then reopens each in a fresh process and measures
+start-up (import + open), RSS, single-query latency, batched query
+throughput and recall@k against exact search:
+
+    python bench_retrieval.py --sizes 1000,10000,100000 --out bench_retrieval.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DIM = 768  # text-embedding-004
+K = 4
+QUERIES = 200
+BATCH = 32
+
+
+def corpus(n, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    # Clustered vectors, closer to real embeddings than uniform noise
+    centers = rng.standard_normal((max(1, n // 50), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), n)] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    queries = centers[rng.integers(0, len(centers), QUERIES)] + 0.5 * rng.standard_normal((QUERIES, dim)).astype(np.float32)
+    return vectors, queries
+
+
+def exact_top_k(vectors, queries, k):
+    v = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    q = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    return np.argsort(-(q @ v.T), axis=1)[:, :k]
+
+
+def build(kind, path, vectors):
+    from retrieval import ChromaRetriever, NumpyRetriever
+
+    started = time.perf_counter()
+    retriever = ChromaRetriever(path) if kind == "chroma" else NumpyRetriever(path)
+    ids = [f"doc_{i}" for i in range(len(vectors))]
+    for start in range(0, len(vectors), 5000):
+        end = start + 5000
+        retriever.upsert(ids[start:end], vectors[start:end].tolist() if kind == "chroma" else vectors[start:end],
+                         ids[start:end])
+    return time.perf_counter() - started
+
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def child(kind, path, queries_path):
+    """Runs in a fresh interpreter: start-up, memory and query timings as JSON on stdout"""
+    started = time.perf_counter()
+    from retrieval import ChromaRetriever, NumpyRetriever
+    retriever = ChromaRetriever(path) if kind == "chroma" else NumpyRetriever(path)
+    data = np.load(queries_path)
+    queries, truth = data["queries"], data["truth"]
+    retriever.query(queries[:1].tolist(), K)  # first query pays any lazy loading
+    startup = time.perf_counter() - started
+
+    latencies = []
+    hits = 0
+    for query, expected in zip(queries, truth):
+        t = time.perf_counter()
+        result = retriever.query([query.tolist()], K)[0]
+        latencies.append(time.perf_counter() - t)
+        hits += len({doc for doc, _ in result} & {f"doc_{i}" for i in expected})
+
+    t = time.perf_counter()
+    for start in range(0, len(queries), BATCH):
+        retriever.query(queries[start:start + BATCH].tolist(), K)
+    batched = time.perf_counter() - t
+
+    ms = np.array(latencies) * 1000
+    print(json.dumps({
+        "startup_ms": round(startup * 1000, 1),
+        "rss_mb": round(rss_mb(), 1),
+        "query_p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "query_p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "batched_qps": round(len(queries) / batched, 1),
+        f"recall_at_{K}": round(hits / (len(queries) * K), 4),
+    }))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        sys.path.insert(0, ROOT)
+        child(*sys.argv[2:5])
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")], default=[1000, 10000, 100000])
+    parser.add_argument("--kinds", type=lambda s: s.split(","), default=["chroma", "numpy"])
+    parser.add_argument("--out", default="bench_retrieval.json")
+    args = parser.parse_args()
+    sys.path.insert(0, ROOT)
+
+    results = []
+    for n in args.sizes:
+        vectors, queries = corpus(n, DIM)
+        workdir = tempfile.mkdtemp(prefix="gharfix-bench-")
+        queries_path = os.path.join(workdir, "queries.npz")
+        np.savez(queries_path, queries=queries, truth=exact_top_k(vectors, queries, K))
+        for kind in args.kinds:
+            path = os.path.join(workdir, kind)
+            build_s = build(kind, path, vectors)
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", kind, path, queries_path],
+                                 capture_output=True, text=True, check=True)
+            row = {"chunks": n, "retriever": kind, "build_s": round(build_s, 2), **json.loads(out.stdout.strip().splitlines()[-1])}
+            print("  ".join(f"{k} {v}" for k, v in row.items()))
+            results.append(row)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump({"dim": DIM, "k": K, "queries": QUERIES, "results": results}, f, indent=2)
+    print(f"Wrote {args.out}")
@@ -0,0 +1,186 @@
+"""Multi-process booking test on the shared SQLite session backend.
+
+Starts --workers processes, each with its own RAGChatbot on one SQLite
+session file (SESSION_BACKEND=sqlite), as uvicorn workers would run. Every
+conversation walks the booking script and then asks a question, with each
+message sent to the next worker in turn, so no two consecutive steps are
+handled by the same process. Checks that every step gets the right reply,
+and that each confirmed booking is journaled exactly once. Each worker also reports how far its event loop
+fell behind a 10 ms ticker while serving. Meanwhile another connection
+holds the database's write lock for --hold-lock-ms every 200 ms, as a busy
+neighbour process would, so session calls that run on the event loop show
+up as lag:
+
+    python booking_roundrobin.py --workers 4 --conversations 200 --out booking_roundrobin.json
+"""
+import os
+import sys
+import glob
+import json
+import time
+import queue
+import asyncio
+import sqlite3
+import argparse
+import threading
+import multiprocessing
+
+import numpy as np
+
+from loadtest import BOOKING_SCRIPT, offline_environment, summarize
+
+# The booking, then a question for the LLM (which reads and appends history)
+SCRIPT = BOOKING_SCRIPT + ["do you also repair bathroom pipes"]
+# Text every reply to the matching SCRIPT step must contain
+EXPECTED = ["What's your name", "mobile number", "Which service", "city or area", "Booking Summary",
+            "WHATSAPP_REDIRECT:", ""]
+TICK = 0.01
+
+
+def worker(index, inbox, outbox):
+    """Answer (cid, step, message) from inbox on this process's bot, concurrently"""
+    os.environ["SESSION_BACKEND"] = "sqlite"
+    from final import RAGChatbot
+
+    bot = RAGChatbot()
+    loop = asyncio.new_event_loop()
+    lag = []
+
+    async def ticker():
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(TICK)
+            lag.append(time.perf_counter() - started - TICK)
+
+    async def answer(cid, step, message):
+        started = time.perf_counter()
+        try:
+            reply = await bot.achat_with_rag(message, cid)
+        except Exception as e:
+            reply = f"exception: {e}"
+        outbox.put((cid, step, index, reply, time.perf_counter() - started))
+
+    def feed():
+        while True:
+            item = inbox.get()
+            if item is None:
+                break
+            loop.call_soon_threadsafe(loop.create_task, answer(*item))
+        loop.call_soon_threadsafe(loop.stop)
+
+    outbox.put(("ready", index))
+    threading.Thread(target=feed, daemon=True).start()
+    tick = loop.create_task(ticker())
+    loop.run_forever()
+    tick.cancel()
+    loop.run_until_complete(asyncio.gather(tick, return_exceptions=True))
+    bot.close()
+    outbox.put(("lag", index, lag))
+
+
+def hold_write_lock(path, hold, stop):
+    """Keep taking SQLite's write lock for `hold` seconds, like another process's long write"""
+    conn = sqlite3.connect(path, timeout=10, isolation_level=None)
+    while not stop.wait(0.2):
+        conn.execute("BEGIN IMMEDIATE")
+        time.sleep(hold)
+        conn.execute("COMMIT")
+    conn.close()
+
+
+def main(args):
+    workdir = offline_environment()
+    os.environ["SESSION_BACKEND"] = "sqlite"
+    context = multiprocessing.get_context("spawn")
+    inboxes = [context.Queue() for _ in range(args.workers)]
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(i, inboxes[i], results)) for i in range(args.workers)]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        results.get()  # ready
+
+    def send(n, step):
+        cid = f"rr-{n}"
+        # Step k of conversation n goes to worker (n + k) % workers: a new process every step
+        inboxes[(n + step) % args.workers].put((cid, step, SCRIPT[step]))
+
+    stop = threading.Event()
+    holder = threading.Thread(target=hold_write_lock, args=(os.environ["SESSION_DB_PATH"], args.hold_lock_ms / 1000, stop))
+    if args.hold_lock_ms:
+        holder.start()
+
+    started = time.perf_counter()
+    for n in range(args.conversations):
+        send(n, 0)
+    latencies = []
+    wrong = []
+    done = 0
+    while done < args.conversations:
+        try:
+            cid, step, index, reply, seconds = results.get(timeout=args.timeout)
+        except queue.Empty:
+            break
+        latencies.append(seconds)
+        if EXPECTED[step] not in reply or "Sorry, I encountered an error" in reply:
+            wrong.append({"conversation": cid, "step": step, "worker": index, "reply": reply[:120]})
+            done += 1
+        elif step + 1 < len(SCRIPT):
+            send(int(cid.split("-")[1]), step + 1)
+        else:
+            done += 1
+    elapsed = time.perf_counter() - started
+    stop.set()
+    if args.hold_lock_ms:
+        holder.join()
+
+    for inbox in inboxes:
+        inbox.put(None)
+    lag = []
+    for _ in processes:
+        item = results.get(timeout=args.timeout)
+        lag.extend(item[2])
+    for process in processes:
+        process.join()
+
+    journaled = []
+    for journal in glob.glob(os.path.join(workdir, "leads.journal.*")):
+        if journal[-1].isdigit():
+            with open(journal, encoding="utf-8") as f:
+                journaled.extend(json.loads(line)["lead"]["request_id"] for line in f if line.strip())
+    lag_ms = np.array(lag or [0]) * 1000
+    summary = {
+        "workers": args.workers,
+        "conversations": args.conversations,
+        "completed": done - len(wrong),
+        "wrong_replies": len(wrong),
+        "leads_journaled": len(journaled),
+        "duplicate_leads": len(journaled) - len(set(journaled)),
+        "steps_per_sec": round(len(latencies) / elapsed, 1),
+        "step_latency_ms": summarize(latencies),
+        "loop_lag_ms": {"p99": round(float(np.percentile(lag_ms, 99)), 2), "max": round(float(lag_ms.max()), 2)},
+    }
+    print("  ".join(f"{k} {v}" for k, v in summary.items()))
+    for item in wrong[:10]:
+        print(f"WRONG {item['conversation']} step {item['step']} on worker {item['worker']}: {item['reply']!r}")
+    return {"summary": summary, "wrong": wrong}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--conversations", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for any reply")
+    parser.add_argument("--hold-lock-ms", type=float, default=150, help="0 to leave the database alone")
+    parser.add_argument("--out", default="booking_roundrobin.json")
+    args = parser.parse_args()
+    args.out = os.path.abspath(args.out)
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+
+    result = main(args)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Wrote {args.out}")
+    s = result["summary"]
+    sys.exit(0 if s["completed"] == s["conversations"] == s["leads_journaled"] and not s["duplicate_leads"] else 1)
@@ -0,0 +1,142 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Answer cache for repeated FAQ questions
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))  # seconds
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.92"))  # cosine
+
+
+def normalize_question(text):
+    """Lowercase, drop punctuation and collapse whitespace: "List all services!" -> "list all services" """
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+class _CachedAnswer:
+    __slots__ = ("answer", "slot", "stored")
+
+    def __init__(self, answer, slot, stored):
+        self.answer = answer
+        self.slot = slot
+        self.stored = stored
+
+
+class ResponseCache:
+    """Two-tier cache of LLM answers for first-turn questions.
+
+    Exact tier: normalized question text. Semantic tier: cosine similarity of
+    the query embedding against every cached question, held in one float32
+    matrix so a lookup is a single matrix-vector product. Entries expire after
+    ttl seconds, the least recently used one is evicted when full, and the
+    whole cache is dropped when the knowledge base version changes.
+    """
+
+    def __init__(self, max_entries=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL,
+                 threshold=ANSWER_CACHE_SIMILARITY, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.clock = clock
+        self.version = None
+        self._lock = threading.Lock()
+        self._reset()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def _reset(self):
+        self._entries = OrderedDict()  # normalized question -> _CachedAnswer
+        self._vectors = None  # (max_entries, dim) float32, allocated on first put
+        self._slot_keys = [None] * self.max_entries
+        self._free_slots = list(range(self.max_entries - 1, -1, -1))
+
+    def set_version(self, version):
+        """Invalidate everything cached against a different knowledge base"""
+        with self._lock:
+            if version != self.version:
+                self._reset()
+                self.version = version
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        if entry.slot is not None:
+            self._vectors[entry.slot] = 0.0
+            self._slot_keys[entry.slot] = None
+            self._free_slots.append(entry.slot)
+
+    def _fresh(self, key, entry):
+        if self.clock() - entry.stored >= self.ttl:
+            self._drop(key)
+            return False
+        return True
+
+    def get_exact(self, question):
+        key = normalize_question(question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not self._fresh(key, entry):
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry.answer
+
+    def get_semantic(self, vector):
+        """Answer for the most similar cached question, if above the threshold.
+        Call after get_exact; a miss here counts as a cache miss."""
+        with self._lock:
+            if vector is not None and self._vectors is not None and self._entries:
+                query = self._unit(vector)
+                if query.shape[0] == self._vectors.shape[1]:
+                    scores = self._vectors @ query  # empty slots are zero vectors
+                    slot = int(np.argmax(scores))
+                    key = self._slot_keys[slot]
+                    if key is not None and scores[slot] >= self.threshold:
+                        entry = self._entries[key]
+                        if self._fresh(key, entry):
+                            self._entries.move_to_end(key)
+                            self.semantic_hits += 1
+                            return entry.answer
+            self.misses += 1
+            return None
+
+    def put(self, question, vector, answer):
+        if self.max_entries <= 0:
+            return  # ANSWER_CACHE_SIZE=0: cache disabled
+        key = normalize_question(question)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            while len(self._entries) >= self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+            slot = None
+            if vector is not None:
+                unit = self._unit(vector)
+                if self._vectors is None:
+                    self._vectors = np.zeros((self.max_entries, unit.shape[0]), dtype=np.float32)
+                if unit.shape[0] == self._vectors.shape[1]:
+                    slot = self._free_slots.pop()
+                    self._vectors[slot] = unit
+                    self._slot_keys[slot] = key
+            self._entries[key] = _CachedAnswer(answer, slot, self.clock())
+
+    @staticmethod
+    def _unit(vector):
+        vec = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def stats(self):
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.exact_hits + self.semantic_hits) / lookups, 4) if lookups else 0.0,
+        }
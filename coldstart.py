@@ -0,0 +1,111 @@
+"""Cold-start measurement for the FastAPI app in final2.py.
+
+Each run starts from a fresh interpreter and records:
+  import_ms        time to `import final2`
+  import_final_ms  time to `import final` (chromadb + Gemini SDK), now done during warm-up
+  first_byte_ms    uvicorn spawn -> first response from /health
+  ready_ms         uvicorn spawn -> /ready returns 200
+  first_chat_ms    latency of the first /chat request once ready
+
+    python coldstart.py --runs 5 --out coldstart.json
+
+Uses the fake backend and throwaway state, like loadtest.py.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.error
+import urllib.request
+
+from loadtest import offline_environment, git_commit
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def import_ms(module):
+    code = f"import time; t = time.perf_counter(); import {module}; print((time.perf_counter() - t) * 1000)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def request(url, payload=None, timeout=5):
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def poll(url, started, until_status=None, timeout=120):
+    """Milliseconds from `started` until url answers (with until_status, if given)"""
+    while time.perf_counter() - started < timeout:
+        try:
+            status, _ = request(url, timeout=1)
+            if until_status is None or status == until_status:
+                return (time.perf_counter() - started) * 1000
+        except OSError:
+            pass
+        time.sleep(0.005)
+    raise TimeoutError(f"{url} did not answer within {timeout}s")
+
+
+def serve_once():
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "final2:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        first_byte = poll(f"{base}/health", started)
+        ready = poll(f"{base}/ready", started, until_status=200)
+        chat_started = time.perf_counter()
+        status, _ = request(f"{base}/chat", {"message": "what services do you offer", "conversation_id": "coldstart"})
+        first_chat = (time.perf_counter() - chat_started) * 1000
+        if status != 200:
+            raise RuntimeError(f"/chat returned HTTP {status}")
+        return {"first_byte_ms": first_byte, "ready_ms": ready, "first_chat_ms": first_chat}
+    finally:
+        server.terminate()
+        server.wait(10)
+
+
+def summarize(values):
+    return {"median": round(statistics.median(values), 1), "min": round(min(values), 1), "max": round(max(values), 1)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--out", default="coldstart.json")
+    args = parser.parse_args()
+
+    offline_environment()
+    runs = []
+    for i in range(args.runs):
+        run = {"import_ms": import_ms("final2"), "import_final_ms": import_ms("final"), **serve_once()}
+        print(f"run {i + 1}: " + "  ".join(f"{k} {v:.0f}" for k, v in run.items()))
+        runs.append(run)
+
+    result = {
+        "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "commit": git_commit(), "runs": args.runs},
+        "summary": {key: summarize([run[key] for run in runs]) for key in runs[0]},
+        "runs": runs,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Wrote {args.out}")
@@ -0,0 +1,247 @@
+import os
+import time
+import atexit
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, the cache file is used as is
+    fcntl = None
+
+# Query embedding memo; set EMBED_CACHE_PATH to persist it as a float32 memory-mapped file.
+# The file belongs to one process at a time: other workers keep an in-memory memo
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "4096"))
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "")
+# Concurrent query embeddings arriving within this window share one API call
+EMBED_BATCH_WINDOW = float(os.getenv("EMBED_BATCH_WINDOW", "0.005"))  # seconds
+# Texts per embedding request (the Gemini batch endpoint accepts up to 100)
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+EMBED_RETRIES = int(os.getenv("EMBED_RETRIES", "3"))
+
+
+def embed_documents(embed_fn, texts, batch_size=EMBED_BATCH_SIZE, retries=EMBED_RETRIES):
+    """Embed texts in size-limited batches, retrying each batch with backoff"""
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        for attempt in range(retries + 1):
+            try:
+                vectors.extend(embed_fn(batch, "retrieval_document"))
+                break
+            except Exception as e:
+                if attempt == retries:
+                    raise
+                delay = 0.5 * (2 ** attempt)
+                logging.warning(f"Embedding batch {start // batch_size} failed ({str(e)}), retrying in {delay}s")
+                time.sleep(delay)
+    return vectors
+
+
+class QueryEmbedder:
+    """Query embeddings behind a bounded LRU memo.
+
+    Vectors live in one (max_entries, dim) float32 array, memory-mapped from
+    path + ".npy" when a path is given so the memo survives restarts. Each
+    row's key digest is kept beside it in path + ".keys.npy" and checked on
+    every read, and the index is rebuilt from those digests on start-up, so
+    a process that dies mid-run can never leave a key pointing at another
+    text's vector. The files are locked by the first process to open them;
+    other processes (uvicorn workers) fall back to an in-memory memo. Async
+    lookups that miss are queued for batch_window seconds and sent to the API
+    as one batched call.
+    """
+
+    def __init__(self, embed_fn, runner=None, max_entries=EMBED_CACHE_SIZE, path=EMBED_CACHE_PATH,
+                 batch_window=EMBED_BATCH_WINDOW, max_batch=EMBED_BATCH_SIZE, model=""):
+        self.embed_fn = embed_fn  # embed_fn(texts, task_type) -> list of vectors
+        self.runner = runner  # async runner(fn, *args) for the blocking embed_fn
+        self.max_entries = max_entries
+        self.path = path
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.model = model
+        self._lock = threading.Lock()
+        self._slots = OrderedDict()  # key -> row in self._vectors, in LRU order
+        self._vectors = None
+        self._keys = None  # row -> hex key digest, b"" for an empty row
+        self._lock_file = None
+        self._pending = []
+        self._inflight = {}
+        self._timer = None
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+        if self.path and self._claim():
+            self._load()
+            atexit.register(self.save)
+        elif self.path:
+            logging.info(f"Embedding cache {self.path} is in use by another process, keeping this one in memory")
+            self.path = ""
+
+    def _claim(self):
+        """Exclusive lock on the cache files for this process's lifetime"""
+        if not fcntl:
+            return True
+        handle = open(self.path + ".lock", "a")
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self._lock_file = handle
+        return True
+
+    def _key(self, text):
+        return hashlib.sha1(f"{self.model}\n{text}".encode("utf-8")).hexdigest().encode("ascii")
+
+    # Memo
+
+    def get(self, text):
+        key = self._key(text)
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is None:
+                return None
+            if self._keys[slot] != key:
+                # Row no longer holds this text's vector
+                del self._slots[key]
+                return None
+            self._slots.move_to_end(key)
+            return self._vectors[slot].tolist()
+
+    def put(self, text, vector):
+        key = self._key(text)
+        vec = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            if self._vectors is None or vec.shape[0] != self._vectors.shape[1]:
+                # First vector, or the embedding size changed: start an empty memo
+                self._allocate(vec.shape[0])
+            slot = self._slots.pop(key, None)
+            if slot is None:
+                if len(self._slots) < self.max_entries:
+                    slot = self._free.pop()
+                else:
+                    _, slot = self._slots.popitem(last=False)
+            # Clear the key first: an interrupted write leaves an empty row, never a wrong one
+            self._keys[slot] = b""
+            self._vectors[slot] = vec
+            self._keys[slot] = key
+            self._slots[key] = slot
+
+    def _allocate(self, dim):
+        if self.path:
+            self._keys = np.lib.format.open_memmap(
+                self.path + ".keys.npy", mode="w+", dtype="S40", shape=(self.max_entries,)
+            )
+            self._vectors = np.lib.format.open_memmap(
+                self.path + ".npy", mode="w+", dtype=np.float32, shape=(self.max_entries, dim)
+            )
+        else:
+            self._keys = np.zeros(self.max_entries, dtype="S40")
+            self._vectors = np.zeros((self.max_entries, dim), dtype=np.float32)
+        self._slots = OrderedDict()
+        self._free = list(range(self.max_entries - 1, -1, -1))
+
+    def _load(self):
+        try:
+            keys = np.load(self.path + ".keys.npy", mmap_mode="r+")
+            vectors = np.load(self.path + ".npy", mmap_mode="r+")
+            if keys.shape != (self.max_entries,) or vectors.shape[0] != self.max_entries:
+                return
+            self._keys, self._vectors = keys, vectors
+            # The index is whatever the rows say they hold (LRU order is not kept across restarts)
+            self._slots = OrderedDict((bytes(key), row) for row, key in enumerate(keys) if key)
+            self._free = [row for row in range(self.max_entries - 1, -1, -1) if not keys[row]]
+            logging.info(f"Loaded {len(self._slots)} cached query embeddings from {self.path}")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable embedding cache {self.path}: {str(e)}")
+
+    def save(self):
+        if not self.path or self._vectors is None:
+            return
+        with self._lock:
+            self._vectors.flush()
+            self._keys.flush()
+
+    def close(self):
+        """Flush the memo and give up the cache files for another process"""
+        self.save()
+        atexit.unregister(self.save)
+        if self._lock_file is not None:
+            self._lock_file.close()  # releases the flock
+            self._lock_file = None
+
+    # Lookups
+
+    def embed(self, text):
+        """Blocking lookup: memo, else a single-text API call"""
+        vec = self.get(text)
+        if vec is not None:
+            self.hits += 1
+            return vec
+        self.misses += 1
+        vec = self.embed_fn([text], "retrieval_query")[0]
+        self.put(text, vec)
+        return vec
+
+    async def aembed(self, text):
+        """Async lookup: memo, else join the next batched API call"""
+        vec = self.get(text)
+        if vec is not None:
+            self.hits += 1
+            return vec
+        self.misses += 1
+
+        # Identical texts already waiting share one future
+        future = self._inflight.get(text)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._inflight[text] = future
+            self._pending.append(text)
+            if len(self._pending) >= self.max_batch:
+                self._flush(loop)
+            elif self._timer is None:
+                self._timer = loop.call_later(self.batch_window, self._flush, loop)
+        return await asyncio.shield(future)
+
+    def _flush(self, loop):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            loop.create_task(self._run_batch(batch))
+
+    async def _run_batch(self, batch):
+        try:
+            vectors = await self.runner(self.embed_fn, batch, "retrieval_query")
+            if len(vectors) != len(batch):
+                raise ValueError(f"Expected {len(batch)} embeddings, got {len(vectors)}")
+            self.batches += 1
+            for text, vec in zip(batch, vectors):
+                self.put(text, vec)
+                future = self._inflight.pop(text)
+                if not future.done():
+                    future.set_result(vec)
+        except Exception as e:
+            for text in batch:
+                future = self._inflight.pop(text, None)
+                if future is not None and not future.done():
+                    future.set_exception(e)
+
+    def stats(self):
+        return {
+            "entries": len(self._slots),
+            "hits": self.hits,
+            "misses": self.misses,
+            "batches": self.batches,
+        }
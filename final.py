@@ -1,40 +1,122 @@
 import os
 from dotenv import load_dotenv
-import chromadb
-import google.generativeai as genai
 import logging
 from datetime import datetime, timezone, timedelta
 import urllib.parse
 import re
+import asyncio
+import functools
+import hashlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from sessions import create_session_backend
+from caching import ResponseCache
+from embeddings import QueryEmbedder, embed_documents
+from intents import IntentClassifier
+from matching import Matcher
+from outbox import LeadOutbox
+from request_ids import generate_request_id
+from backends import create_backend
+from generation import GenerationClient, GENERATE_TIMEOUT
+from retrieval import create_retriever
+from prompts import PromptBuilder, estimate_tokens
+import metrics
 
 load_dotenv()
 
+# Upper bounds for the blocking Gemini/vector-index calls made from the async path
+EMBED_TIMEOUT = float(os.getenv("EMBED_TIMEOUT", "10"))
+IO_WORKERS = int(os.getenv("IO_WORKERS", "32"))
+
+# Retrieval: chunks returned per query, and the largest cosine distance still
+# considered relevant (0 = identical, 2 = opposite)
+TOP_K = int(os.getenv("RAG_TOP_K", "4"))
+MAX_DISTANCE = float(os.getenv("RAG_MAX_DISTANCE", "0.55"))
+
+ERROR_REPLY = "Sorry, I encountered an error. Please contact +91 75068 55407."
+
+# Precompiled per-turn checks
+BOOKING_KEYWORDS = ["book", "booking", "book now", "schedule", "appointment", "service booking", "i want to book"]
+BOOKING_RE = re.compile("|".join(re.escape(k) for k in BOOKING_KEYWORDS))
+NAME_INVALID_RE = re.compile("list|show|service|help|what|how|price|rate|cost")
+NAME_RE = re.compile(r'^[A-Za-z][A-Za-z\s.\']+$')
+LOCATION_INVALID_RE = re.compile("i don't know|idk|not sure|help|what|where|list|show")
+LOCATION_RE = re.compile(r'^[A-Za-z\s,.-]+$')
+HAS_LETTER_RE = re.compile(r'[A-Za-z]')
+
+# Everyday words customers use for our services
+SERVICE_ALIASES = {
+    "plumber": "Plumbing",
+    "electrician": "Electrical",
+    "cook": "Chef",
+    "driver service": "Driver",
+    "maid service": "Maid",
+    "makeup": "Bridal Makeup",
+    "deep cleaning": "Cleaning",
+    "water filter": "Water Purifier",
+    "ro": "RO Service",
+    "tank cleaning": "Water Tank Cleaning",
+}
+
+class ChatTurn:
+    """One question on its way past the booking flow to an answer.
+    
+    chat_with_rag, achat_with_rag and astream_chat only run the I/O each step
+    needs (history, embedding, retrieval, generation), each their own way;
+    what is answered locally, served from or put in the answer cache and
+    reported to metrics is decided here, once for all three.
+    """
+    
+    def __init__(self, bot, question):
+        self.bot = bot
+        self.question = question
+        self.history = None
+        self.qvec = None
+        # Needs neither history nor an embedding, so it goes first
+        self.answer = bot.fast_reply(question)
+    
+    @property
+    def cacheable(self):
+        # Only first-turn answers are cached: history can change the answer
+        return not self.history
+    
+    def got_history(self, history):
+        self.history = history
+        if self.cacheable:
+            self.answer = self.bot.answer_cache.get_exact(self.question)
+    
+    def got_embedding(self, qvec):
+        self.qvec = qvec
+        if self.cacheable:
+            self.answer = self.bot.answer_cache.get_semantic(qvec)
+    
+    def prompt(self, docs):
+        prompt = self.bot.build_prompt(self.question, self.history, "\n".join(docs))
+        self.bot.report_prompt_size(prompt, docs)
+        return prompt
+    
+    def generated(self, answer):
+        self.answer = answer
+        self.bot.report_response_size(answer)
+        if self.cacheable and answer:
+            self.bot.answer_cache.put(self.question, self.qvec, answer)
+
 class RAGChatbot:
-    def __init__(self):
+    def __init__(self, backend=None):
         try:
-            self.api_key = os.getenv("GEMINI_API_KEY")
-            if not self.api_key:
-                raise ValueError("GEMINI_API_KEY not set")
+            # Embeddings and generation: Gemini, or the offline fake (LLM_BACKEND)
+            self.backend = backend or create_backend()
+            self.model = self.backend.model
+            # Per-call deadlines, circuit breakers, fallback and optional hedging across models
+            self.generator = GenerationClient(self.backend.models)
+            self.embedding_model = self.backend.embedding_model
             
-            genai.configure(api_key=self.api_key)
+            # Vector index (ChromaDB or in-process NumPy, RETRIEVER) - persists across
+            # restarts and is synced by content hash instead of being rebuilt on every boot
+            self.retriever = create_retriever()
             
-            # Use Gemini 2.0 Flash (or 1.5-flash if 2.0 not available yet)
-            try:
-                self.model = genai.GenerativeModel("gemini-2.0-flash")  # Stable version
-            except:
-                self.model = genai.GenerativeModel("gemini-2.5-flash")  # Latest fallback
-            
-            # ChromaDB setup
-            self.client = chromadb.PersistentClient(path="./chroma_db")
-            try:
-                self.client.delete_collection("gharfix_kb_1")
-            except:
-                pass
-            self.collection = self.client.create_collection("gharfix_kb_1")
-            
-            # Lead collection system
-            self.conversation_memory = {}
-            self.lead_collection = {}
+            # Cache of first-turn answers, invalidated whenever the knowledge base changes
+            self.answer_cache = ResponseCache()
             
             # GharFix WhatsApp number
             self.whatsapp_number = "917506855407"
@@ -58,6 +140,10 @@ class RAGChatbot:
                 "Bandra", "Dadar", "Worli", "Powai", "Malad", "Borivali"
             ]
             
+            # Indexed, typo-tolerant lookups over the lists above
+            self.service_matcher = Matcher(self.valid_services, SERVICE_ALIASES)
+            self.location_matcher = Matcher(self.valid_locations)
+            
             self.knowledge_base = """
 GharFix Services Overview - Complete Details:
 1. Tailoring Services - Custom stitching, alterations, and repairs for men's, women's, and children's clothing.
@@ -84,83 +170,194 @@ AVAILABILITY: Services available 24/7
 CONTACT: For booking or queries, WhatsApp or call +91 75068 55407
 """
             
-            self.add_documents([self.knowledge_base])
+            self.sync_documents([self.knowledge_base])
+            self.service_catalog = ", ".join(self.service_names(self.knowledge_base))
+            
+            # Prompts are a stable prefix (rules + catalog) plus a token-budgeted per-turn suffix
+            self.prompts = PromptBuilder(self.service_catalog)
+            
+            # Templated answers for common intents, no Gemini call
+            self.intents = IntentClassifier(self.knowledge_base)
+            
+            # Threads, files and locks are only taken once the index sync (the step
+            # most likely to fail) has succeeded; close() releases them otherwise
+            
+            # Bounded pool for blocking calls (embeddings, vector index) used by the async path
+            self.executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="gharfix-io")
+            
+            # Conversation memory and lead collection - in-process or shared (SESSION_BACKEND)
+            self.sessions = create_session_backend()
+            
+            # Memoized, batched query embeddings
+            self.query_embedder = QueryEmbedder(self.embed_texts, runner=self.run_blocking, model=self.embedding_model)
+            
+            # Confirmed leads are journaled, then dispatched in the background
+            self.outbox = LeadOutbox()
+            
+            # Cache, fast-path and outbox counters are read at scrape time
+            metrics.REGISTRY.add_callback(self.metrics_samples)
             
         except Exception as e:
             logging.error(f"Failed to initialize RAGChatbot: {str(e)}")
+            self.close()  # a failed warm-up attempt is retried: leave nothing running behind
             raise
     
-    def add_documents(self, texts):
-        """Add docs using Google embeddings API"""
-        try:
-            resp = genai.embed_content(
-                model="models/text-embedding-004",
-                content=texts,
-                task_type="retrieval_document"
-            )
-            
-            raw_embedding = resp.get('embedding', [])
-            
-            if isinstance(raw_embedding, list):
-                if len(raw_embedding) > 0 and isinstance(raw_embedding[0], (int, float)):
-                    embeddings = [raw_embedding]
+    def close(self):
+        """Stop the lead outbox and session writer, release the embedding memo and the thread pools"""
+        for name in ("outbox", "sessions", "query_embedder", "generator"):
+            resource = getattr(self, name, None)
+            if resource is None:
+                continue
+            try:
+                resource.close()
+            except Exception as e:
+                logging.error(f"Failed to close {name}: {str(e)}")
+        executor = getattr(self, "executor", None)
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def document_id(self, text):
+        """Content-addressed id: changes whenever the text or the embedding model changes"""
+        digest = hashlib.sha256(f"{self.embedding_model}\n{text}".encode("utf-8")).hexdigest()
+        return f"doc_{digest[:32]}"
+    
+    def chunk_documents(self, texts):
+        """Split docs into one chunk per numbered service and one per policy section"""
+        chunks = []
+        for text in texts:
+            title = ""
+            for line in text.strip().splitlines():
+                line = line.strip()
+                if not line:
+                    continue
+                if re.match(r'^\d+\.\s', line):
+                    # "5. Plumbing Services - ..." -> "GharFix service: Plumbing Services - ..."
+                    service = re.sub(r'^\d+\.\s*', '', line)
+                    chunks.append(f"GharFix service: {service}")
+                elif ":" in line and line.split(":", 1)[1].strip():
+                    # Policy sections such as "AVAILABILITY: Services available 24/7"
+                    chunks.append(f"GharFix {line}")
                 else:
-                    embeddings = raw_embedding
-            else:
-                raise ValueError(f"Unexpected embedding format: {type(raw_embedding)}")
+                    title = line
+            if not chunks and title:
+                chunks.append(title)
+        return chunks
+    
+    def service_names(self, text):
+        """Short service names from the numbered list, used for the compact catalog in the prompt"""
+        return [
+            re.sub(r'^\d+\.\s*', '', line.strip()).split(" - ", 1)[0]
+            for line in text.splitlines()
+            if re.match(r'^\d+\.\s', line.strip())
+        ]
+    
+    def sync_documents(self, texts):
+        """Chunk the docs, reuse the persisted index when unchanged, embed only new or changed chunks"""
+        wanted = {self.document_id(chunk): chunk for chunk in self.chunk_documents(texts)}
+        existing = set(self.retriever.ids())
+        
+        missing = [doc_id for doc_id in wanted if doc_id not in existing]
+        stale = [doc_id for doc_id in existing if doc_id not in wanted]
+        
+        if missing:
+            self.add_documents([wanted[doc_id] for doc_id in missing], ids=missing)
+        if stale:
+            self.retriever.delete(stale)
+        
+        self.doc_count = len(wanted)
+        self.kb_version = hashlib.sha256("\n".join(sorted(wanted)).encode("utf-8")).hexdigest()[:16]
+        self.answer_cache.set_version(self.kb_version)
+        logging.info(
+            f"Knowledge index {self.kb_version}: {len(wanted) - len(missing)} reused, "
+            f"{len(missing)} embedded, {len(stale)} removed"
+        )
+    
+    def embed_texts(self, texts, task_type):
+        """Embed a list of texts in one embeddings API call"""
+        return self.backend.embed(texts, task_type)
+    
+    def add_documents(self, texts, ids=None):
+        """Add docs using the embeddings backend, in size-limited batches"""
+        try:
+            embeddings = embed_documents(self.embed_texts, texts)
             
-            logging.info(f"Adding {len(embeddings)} embeddings to ChromaDB")
+            logging.info(f"Adding {len(embeddings)} embeddings to the vector index")
             
-            self.collection.add(
-                embeddings=embeddings,
-                documents=texts,
-                ids=[f"doc_{i}" for i in range(len(texts))]
+            # upsert keeps concurrent workers syncing the same ids idempotent
+            self.retriever.upsert(
+                ids or [self.document_id(text) for text in texts],
+                embeddings,
+                texts
             )
         except Exception as e:
             logging.error(f"Error adding documents: {str(e)}")
             raise
     
     def add_to_memory(self, cid, user, bot):
-        mem = self.conversation_memory.setdefault(cid, [])
-        mem.append({"user": user, "bot": bot})
-        if len(mem) > 6:
-            self.conversation_memory[cid] = mem[-6:]
+        self.sessions.append_turn(cid, user, bot)
+    
+    async def asession(self, method, *args):
+        """Call a session-backend method without blocking the event loop on SQLite"""
+        fn = getattr(self.sessions, method)
+        if not self.sessions.blocking:
+            return fn(*args)
+        return await self.run_blocking(fn, *args, timeout=None)
     
     def get_conversation_context(self, cid):
-        mem = self.conversation_memory.get(cid, [])
-        return "\n".join(f"User: {e['user']}\nAssistant: {e['bot']}" for e in mem)
+        """History as it goes into the prompt: recent turns within budget, older ones summarized"""
+        return self.prompts.history(self.sessions.get_history(cid))
+    
+    def session_stats(self):
+        return self.sessions.stats()
     
-    def search_knowledge(self, query, n_results=1):
-        """Retrieve relevant docs via embeddings & ChromaDB"""
+    def metrics_samples(self):
+        """Component counters for /metrics as (name, help, labelnames, {labels: value})"""
+        cache = self.answer_cache.stats()
+        embedder = self.query_embedder.stats()
+        outbox = self.outbox.stats()
+        return [
+            ("gharfix_answer_cache_lookups", "Answer cache lookups by result", ["result"],
+             {("exact",): cache["exact_hits"], ("semantic",): cache["semantic_hits"], ("miss",): cache["misses"]}),
+            ("gharfix_fast_path_answers", "Messages answered without Gemini, by intent", ["intent"],
+             {**{(k,): v for k, v in self.intents.hits.items()}, ("fallback",): self.intents.fallbacks}),
+            ("gharfix_query_embeddings", "Query embedding lookups by result", ["result"],
+             {("hit",): embedder["hits"], ("miss",): embedder["misses"]}),
+            ("gharfix_lead_outbox", "Lead outbox counters", ["state"],
+             {(k,): v for k, v in outbox.items()}),
+        ]
+    
+    @metrics.timed("embed")
+    def embed_query(self, query):
+        """Query embedding, memoized (None on failure)"""
         try:
-            resp = genai.embed_content(
-                model="models/text-embedding-004",
-                content=[query],
-                task_type="retrieval_query"
-            )
-            
-            qvec = resp.get('embedding', [])
-            
-            if isinstance(qvec, list) and len(qvec) > 0:
-                if not isinstance(qvec[0], (int, float)):
-                    qvec = qvec[0]
+            return self.query_embedder.embed(query)
+        except Exception as e:
+            logging.error(f"Error embedding query: {str(e)}")
+            return None
+    
+    def query_index(self, qvec, n_results=TOP_K, max_distance=MAX_DISTANCE):
+        """Top-k chunks from the vector index for an already embedded query"""
+        if qvec is None:
+            return []
+        try:
+            hits = self.retriever.query([qvec], n_results)[0]
             
-            results = self.collection.query(
-                query_embeddings=[qvec],
-                n_results=n_results
-            )
-            return results["documents"][0] if results["documents"] else []
+            # Drop chunks too far from the query to be useful context
+            return [doc for doc, distance in hits if distance <= max_distance]
         except Exception as e:
             logging.error(f"Error searching knowledge: {str(e)}")
             return []
     
+    def search_knowledge(self, query, n_results=TOP_K, max_distance=MAX_DISTANCE):
+        """Retrieve the top-k relevant chunks via embeddings & the vector index"""
+        return self.query_index(self.embed_query(query), n_results, max_distance)
+    
     def validate_name(self, name_input):
         """Validate name - must be 2-50 characters, only letters and spaces"""
         name_clean = name_input.strip()
         
         # Check for commands or invalid patterns
-        invalid_patterns = ['list', 'show', 'service', 'help', 'what', 'how', 'price', 'rate', 'cost']
-        if any(pattern in name_clean.lower() for pattern in invalid_patterns):
+        if NAME_INVALID_RE.search(name_clean.lower()):
             return False, "That doesn't look like a name"
         
         # Check length and characters
@@ -168,7 +365,7 @@ CONTACT: For booking or queries, WhatsApp or call +91 75068 55407
             return False, "Name must be between 2-50 characters"
         
         # Allow only letters, spaces, and common name characters
-        if not re.match(r'^[A-Za-z][A-Za-z\s.\']+$', name_clean):
+        if not NAME_RE.match(name_clean):
             return False, "Name can only contain letters and spaces"
         
         return True, name_clean.title()
@@ -192,8 +389,7 @@ CONTACT: For booking or queries, WhatsApp or call +91 75068 55407
         location_clean = location_input.strip()
         
         # Check for invalid patterns
-        invalid_patterns = ['i don\'t know', 'idk', 'not sure', 'help', 'what', 'where', 'list', 'show']
-        if any(pattern in location_clean.lower() for pattern in invalid_patterns):
+        if LOCATION_INVALID_RE.search(location_clean.lower()):
             return False, "Please provide a valid city or area name"
         
         # Check if too short
@@ -201,38 +397,38 @@ CONTACT: For booking or queries, WhatsApp or call +91 75068 55407
             return False, "Location name is too short"
         
         # Check if location contains at least some letters
-        if not re.search(r'[A-Za-z]', location_clean):
+        if not HAS_LETTER_RE.search(location_clean):
             return False, "Please enter a valid location name"
         
-        # Check against known cities (fuzzy match)
-        location_lower = location_clean.lower()
-        for valid_loc in self.valid_locations:
-            if valid_loc.lower() in location_lower or location_lower in valid_loc.lower():
-                return True, valid_loc
+        # Check against known cities (whole words or prefixes, no typo correction)
+        candidates = self.location_matcher.match(location_clean, limit=1, typos=False)
+        if candidates:
+            return True, candidates[0][0]
         
-        # If not in list but looks valid, accept it
-        if re.match(r'^[A-Za-z\s,.-]+$', location_clean):
+        # If not in list but looks valid, accept it as typed: a place one letter
+        # away from a known city is often another real place (Mahad, Patan)
+        if LOCATION_RE.match(location_clean):
             return True, location_clean.title()
         
+        # Otherwise read it as a misspelled known city ("Mumabi 400001")
+        candidates = self.location_matcher.match(location_clean, limit=1)
+        if candidates:
+            return True, candidates[0][0]
+        
         return False, "Please enter a valid city or area name"
     
     def validate_service(self, service_input):
         """Check if service is valid, suggest alternatives if not"""
-        service_lower = service_input.lower().strip()
-        
-        # Check for exact or partial matches
-        for valid_service in self.valid_services:
-            if service_lower in valid_service.lower() or valid_service.lower() in service_lower:
-                return True, valid_service
+        # Check for exact, partial or misspelled matches
+        candidates = self.service_matcher.match(service_input, limit=1)
+        if candidates:
+            return True, candidates[0][0]
         
         return False, None
     
     def generate_request_id(self):
-        """Generate unique request ID with IST timezone"""
-        ist = timezone(timedelta(hours=5, minutes=30))
-        now = datetime.now(ist)
-        timestamp = now.strftime("%Y%m%d%H%M%S")
-        return f"CHAT-{timestamp}"
+        """Generate unique, time-ordered request ID (IST timestamp + worker node + sequence)"""
+        return generate_request_id()
     
     def send_to_whatsapp(self, lead_data):
         """Return WhatsApp link - browser will auto-open it"""
@@ -261,20 +457,30 @@ Automated by GharFix chatbot"""
         
         return whatsapp_link
     
+    def advance_lead(self, cid, lead, next_step, **fields):
+        """Move the booking to next_step unless another request already moved it"""
+        updated = {"step": next_step, "data": {**lead["data"], **fields}}
+        if not self.sessions.update_lead(cid, lead["step"], updated):
+            return False
+        metrics.BOOKING_STEPS.inc(lead["step"])  # funnel counts completed steps
+        return True
+    
     def collect_lead_info(self, question, cid):
         """Handle step-by-step lead collection with validation"""
-        lead = self.lead_collection.get(cid, {})
+        lead = self.sessions.get_lead(cid)
+        already_recorded = "⏳ Got it, that detail was already recorded. Please continue with the next question."
         
         # Check if user wants to exit booking flow
         exit_keywords = ['cancel', 'exit', 'stop', 'quit', 'nevermind', 'back']
         if question.strip().lower() in exit_keywords:
-            if cid in self.lead_collection:
-                del self.lead_collection[cid]
+            self.sessions.delete_lead(cid)
+            metrics.BOOKING_STEPS.inc("cancelled")
             return "Booking cancelled. How else can I help you today?"
         
         # Initialize lead collection
         if not lead:
-            self.lead_collection[cid] = {"step": "name", "data": {}}
+            self.sessions.start_lead(cid, {"step": "name", "data": {}})
+            metrics.BOOKING_STEPS.inc("started")
             return "Great! I'd love to help you book a service. Let me collect some details.\n\n👤 What's your name?\n\n(Type 'cancel' anytime to exit)"
         
         # Step 1: Collect and validate Name
@@ -282,9 +488,8 @@ Automated by GharFix chatbot"""
             is_valid, result = self.validate_name(question)
             
             if is_valid:
-                lead["data"]["name"] = result
-                lead["step"] = "phone"
-                self.lead_collection[cid] = lead
+                if not self.advance_lead(cid, lead, "phone", name=result):
+                    return already_recorded
                 return f"Nice to meet you, {result}! 📱\n\nWhat's your 10-digit mobile number?"
             else:
                 return f"❌ {result}. Please enter your full name:"
@@ -294,9 +499,8 @@ Automated by GharFix chatbot"""
             is_valid, result = self.validate_phone(question)
             
             if is_valid:
-                lead["data"]["phone"] = result
-                lead["step"] = "service"
-                self.lead_collection[cid] = lead
+                if not self.advance_lead(cid, lead, "service", phone=result):
+                    return already_recorded
                 return "Perfect! 🔧\n\nWhich service do you need?\n\nAvailable services:\n• Plumbing\n• Electrical\n• Cleaning\n• Massage\n• Chef\n• Tailoring\n• Elderly Care\n• Water Tank Cleaning\n• Maid Service\n• Driver Service\n\nPlease type the service name:"
             else:
                 return f"❌ {result}. Please enter a valid 10-digit mobile number:"
@@ -306,9 +510,8 @@ Automated by GharFix chatbot"""
             is_valid, matched_service = self.validate_service(question.strip())
             
             if is_valid:
-                lead["data"]["service"] = matched_service
-                lead["step"] = "location"
-                self.lead_collection[cid] = lead
+                if not self.advance_lead(cid, lead, "location", service=matched_service):
+                    return already_recorded
                 return "Excellent choice! 📍\n\nWhat's your city or area?\n\n(Example: Mumbai, Navi Mumbai, Andheri, etc.)"
             else:
                 return f"❌ Sorry, '{question.strip()}' is not available.\n\nPlease choose from:\n• Plumbing • Electrical • Cleaning\n• Massage • Chef • Tailoring\n• Elderly Care • MacBook Repair\n• Water Tank Cleaning • Maid Service\n• Driver Service • NRI Services"
@@ -320,8 +523,8 @@ Automated by GharFix chatbot"""
             if is_valid:
                 lead["data"]["location"] = result
                 lead["data"]["request_id"] = self.generate_request_id()
-                lead["step"] = "confirm"
-                self.lead_collection[cid] = lead
+                if not self.advance_lead(cid, lead, "confirm"):
+                    return already_recorded
                 
                 return f"""📋 Booking Summary:
 
@@ -343,71 +546,198 @@ Type "No" to start over."""
             response = question.strip().lower()
             
             if response in ["yes", "y", "yeah", "yep", "confirm", "correct", "ok", "okay"]:
+                # Only the request that removes the confirm step submits the lead
+                if not self.sessions.delete_lead(cid, expected_step="confirm"):
+                    return already_recorded
+                metrics.BOOKING_STEPS.inc("confirmed")
+                try:
+                    with metrics.stage("lead_journal"):
+                        self.outbox.submit(lead["data"])
+                except Exception as e:
+                    logging.error(f"Failed to journal lead {lead['data']['request_id']}: {str(e)}")
                 whatsapp_link = self.send_to_whatsapp(lead["data"])
                 logging.info(f"✅ Lead submitted: {lead['data']}")
-                del self.lead_collection[cid]
                 return f"WHATSAPP_REDIRECT:{whatsapp_link}"
             
             elif response in ["no", "n", "nope"]:
-                del self.lead_collection[cid]
+                if self.sessions.delete_lead(cid, expected_step="confirm"):
+                    metrics.BOOKING_STEPS.inc("restarted")
                 return "No problem! Let's start over. Type 'book now' when you're ready."
             
             else:
                 return "Please type 'Yes' to confirm or 'No' to restart."
     
+    def booking_reply(self, question, cid):
+        """Return the booking-flow reply for this message, or None if it is a normal question"""
+        # Check if user is in booking flow
+        if self.sessions.get_lead(cid) is not None:
+            return self.collect_lead_info(question, cid)
+        
+        # Check if user wants to book a service
+        if BOOKING_RE.search(question.lower()):
+            return self.collect_lead_info(question, cid)
+        
+        return None
+    
+    def fast_reply(self, question):
+        """Templated answer for common intents (services, coverage, pricing, contact), or None"""
+        result = self.intents.classify(question)
+        return result[1] if result else None
+    
+    @metrics.timed("prompt")
+    def build_prompt(self, question, turns, context):
+        """Stable rules/catalog prefix + budgeted history, context and question"""
+        return self.prompts.build(question, turns, context)
+    
+    def estimate_tokens(self, text):
+        """Cheap local token estimate (~4 characters per token) for prompt size reporting"""
+        return estimate_tokens(text)
+    
+    def report_prompt_size(self, prompt, docs):
+        tokens = self.estimate_tokens(prompt)
+        metrics.PROMPT_TOKENS.observe(tokens)
+        logging.info(f"Prompt size: ~{tokens} tokens, ~{tokens - self.prompts.prefix_tokens} "
+                     f"past the shared prefix ({len(docs)} retrieved chunks)")
+    
+    def report_response_size(self, answer):
+        metrics.RESPONSE_TOKENS.observe(self.estimate_tokens(answer))
+    
+    def generation_config(self):
+        return self.backend.generation_config(
+            temperature=0.4,
+            max_output_tokens=500
+        )
+    
     def chat_with_rag(self, question, cid="default"):
         try:
-            # Check if user is in booking flow
-            if cid in self.lead_collection:
-                return self.collect_lead_info(question, cid)
+            booking = self.booking_reply(question, cid)
+            if booking is not None:
+                return booking
             
-            # Check if user wants to book a service
-            booking_keywords = ["book", "booking", "book now", "schedule", "appointment", "service booking", "i want to book"]
-            if any(keyword in question.lower() for keyword in booking_keywords):
-                return self.collect_lead_info(question, cid)
+            turn = ChatTurn(self, question)
+            if turn.answer is None:
+                turn.got_history(self.sessions.get_history(cid))
+            if turn.answer is None:
+                turn.got_embedding(self.embed_query(question))
+            if turn.answer is None:
+                with metrics.stage("retrieve"):
+                    docs = self.query_index(turn.qvec)
+                prompt = turn.prompt(docs)
+                with metrics.stage("generate"):
+                    turn.generated(self.generator.generate(prompt, self.generation_config()))
+            answer = turn.answer
             
-            history = self.get_conversation_context(cid)
-            docs = self.search_knowledge(question)
-            context = "\n".join(docs)
+        except Exception as e:
+            answer = self.chat_error("chat_with_rag", e)
+        
+        self.add_to_memory(cid, question, answer)
+        return answer
+    
+    def chat_error(self, where, e):
+        """Log a failed chat turn; returns the reply the user gets instead"""
+        if isinstance(e, asyncio.TimeoutError):
+            logging.error(f"Timed out in {where} after {GENERATE_TIMEOUT}s")
+        else:
+            logging.error(f"Error in {where}: {str(e)}")
+        return ERROR_REPLY
+    
+    async def run_blocking(self, fn, *args, timeout=EMBED_TIMEOUT):
+        """Run a blocking call on the bounded I/O pool with a deadline (None: no deadline)"""
+        loop = asyncio.get_running_loop()
+        # Copy the request's context so stages timed in the worker land in its trace
+        context = contextvars.copy_context()
+        return await asyncio.wait_for(
+            loop.run_in_executor(self.executor, functools.partial(context.run, fn, *args)),
+            timeout=timeout
+        )
+    
+    async def abooking_reply(self, question, cid):
+        """booking_reply off the event loop: a confirmed lead waits for the journal's fsync.
+        No deadline, so a booking step is never left half-applied behind a timeout."""
+        return await self.run_blocking(self.booking_reply, question, cid, timeout=None)
+    
+    @metrics.timed("embed")
+    async def aembed_query(self, query):
+        """Memoized query embedding; concurrent misses are batched into one API call"""
+        try:
+            return await self.query_embedder.aembed(query)
+        except asyncio.TimeoutError:
+            logging.error(f"Query embedding timed out after {EMBED_TIMEOUT}s")
+            return None
+        except Exception as e:
+            logging.error(f"Error embedding query: {str(e)}")
+            return None
+    
+    @metrics.timed("retrieve")
+    async def aquery_index(self, qvec, n_results=TOP_K):
+        try:
+            return await self.run_blocking(self.query_index, qvec, n_results)
+        except asyncio.TimeoutError:
+            logging.error(f"Knowledge search timed out after {EMBED_TIMEOUT}s")
+            return []
+    
+    async def asearch_knowledge(self, query, n_results=TOP_K):
+        """Non-blocking search_knowledge: runs on the bounded I/O pool with a deadline"""
+        return await self.aquery_index(await self.aembed_query(query), n_results)
+    
+    async def achat_with_rag(self, question, cid="default"):
+        """Async chat_with_rag: never blocks the event loop on Gemini or ChromaDB"""
+        try:
+            booking = await self.abooking_reply(question, cid)
+            if booking is not None:
+                return booking
             
-            prompt = f"""You are GharFix's official customer assistant. Answer clearly and concisely WITHOUT using markdown formatting.
-
-Rules:
-- Use the information in the context below.
-- DO NOT use markdown formatting (no **, __, etc.)
-- If the context is not helpful, answer generally in 2–3 sentences.
-- Tone: professional, supportive, and helpful.
-- Keep answers under 5 sentences unless asked for all services
-- If the user asks for ALL services → list every service in numbered format
-- If the user asks about pricing/rates → say: "Our pricing varies by service and location. Please call +91 75068 55407 or type 'book now' to get a customized quote."
-- If service not available → say: "I don't think we provide that service, but please call/message at +91 75068 55407 for confirmation."
-- If the user wants to book → say: "I can help you book a service! Just type 'book now' and I'll collect your details."
-
-CONVERSATION HISTORY:
-{history}
-
-GHARFIX KNOWLEDGE BASE:
-{self.knowledge_base}
-
-RETRIEVED CONTEXT:
-{context}
-
-Question: {question}
-Answer:"""
-            
-            resp = self.model.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.4,
-                    max_output_tokens=500
-                )
-            )
-            answer = resp.text
+            turn = ChatTurn(self, question)
+            if turn.answer is None:
+                turn.got_history(await self.asession("get_history", cid))
+            if turn.answer is None:
+                turn.got_embedding(await self.aembed_query(question))
+            if turn.answer is None:
+                prompt = turn.prompt(await self.aquery_index(turn.qvec))
+                with metrics.stage("generate"):
+                    turn.generated(await self.generator.agenerate(prompt, self.generation_config()))
+            answer = turn.answer
             
         except Exception as e:
-            logging.error(f"Error in chat_with_rag: {str(e)}")
-            answer = "Sorry, I encountered an error. Please contact +91 75068 55407."
+            answer = self.chat_error("achat_with_rag", e)
         
-        self.add_to_memory(cid, question, answer)
+        await self.asession("append_turn", cid, question, answer)
         return answer
-
+    
+    async def astream_chat(self, question, cid="default"):
+        """Streaming achat_with_rag: yields answer text as Gemini generates it.
+        Booking-flow replies and cached answers are yielded in one piece.
+        If generation fails after text has gone out, the error is raised, so the
+        client is told, and the partial answer is neither cached nor saved."""
+        parts = []
+        try:
+            booking = await self.abooking_reply(question, cid)
+            if booking is not None:
+                yield booking
+                return
+            
+            turn = ChatTurn(self, question)
+            if turn.answer is None:
+                turn.got_history(await self.asession("get_history", cid))
+            if turn.answer is None:
+                turn.got_embedding(await self.aembed_query(question))
+            if turn.answer is None:
+                prompt = turn.prompt(await self.aquery_index(turn.qvec))
+                # Includes time the client takes to read each chunk
+                with metrics.stage("generate"):
+                    async for text in self.generator.astream(prompt, self.generation_config()):
+                        parts.append(text)
+                        yield text
+                turn.generated("".join(parts))
+            else:
+                yield turn.answer
+            answer = turn.answer
+            
+        except Exception as e:
+            if parts:
+                self.chat_error("astream_chat", e)
+                raise
+            answer = self.chat_error("astream_chat", e)
+            yield answer
+        
+        await self.asession("append_turn", cid, question, answer)
@@ -1,20 +1,84 @@
-from fastapi import FastAPI, HTTPException
+import time
+IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import Response, StreamingResponse, PlainTextResponse, JSONResponse
+from starlette.background import BackgroundTask
+from contextlib import asynccontextmanager
 from pydantic import BaseModel
-import uvicorn
 import logging
+import json
 import os
+import asyncio
+import metrics
+from assets import AssetStore
+from admission import AdmissionControl, Rejected, client_ip
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="GharFix Chatbot API")
+# Warm-up retries: seconds between attempts double up to WARMUP_MAX_BACKOFF; 0 attempts = keep trying
+WARMUP_MAX_ATTEMPTS = int(os.getenv("WARMUP_MAX_ATTEMPTS", "0"))
+WARMUP_MAX_BACKOFF = float(os.getenv("WARMUP_MAX_BACKOFF", "60"))
+
+# Chatbot instance, built by the warm-up task once the server is accepting connections
+bot = None
+warmup = {"state": "pending", "attempts": 0, "last_error": None, "seconds": None}
+
+def build_bot():
+    # Imported here so chromadb and the Gemini SDK load off the startup path
+    from final import RAGChatbot
+    return RAGChatbot()
+
+async def warm_up():
+    global bot
+    started = time.perf_counter()
+    backoff = 1.0
+    while True:
+        warmup["attempts"] += 1
+        warmup["state"] = "warming"
+        try:
+            bot = await asyncio.to_thread(build_bot)
+        except Exception as e:
+            warmup["last_error"] = str(e)
+            if WARMUP_MAX_ATTEMPTS and warmup["attempts"] >= WARMUP_MAX_ATTEMPTS:
+                warmup["state"] = "failed"
+                logger.error(f"❌ Failed to initialize chatbot after {warmup['attempts']} attempts: {e}")
+                return
+            logger.error(f"❌ Failed to initialize chatbot (attempt {warmup['attempts']}), retrying in {backoff:.0f}s: {e}")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, WARMUP_MAX_BACKOFF)
+            continue
+        warmup["state"] = "ready"
+        warmup["seconds"] = round(time.perf_counter() - started, 3)
+        logger.info(f"✅ GharFix Chatbot initialized successfully with memory (warm-up {warmup['seconds']}s)")
+        return
+
+@asynccontextmanager
+async def lifespan(app):
+    # Bind first, warm up in the background; /ready turns 200 when the bot is built
+    task = asyncio.create_task(warm_up())
+    yield
+    task.cancel()
+    if bot is not None:
+        # Drain journaled leads and close the session store and thread pools before exit
+        await asyncio.to_thread(bot.close)
+
+app = FastAPI(title="GharFix Chatbot API", lifespan=lifespan)
 
-# Serve static files (CSS, JS) at /static
-app.mount("/static", StaticFiles(directory="forntend"), name="static")
+# Frontend files (CSS, JS, index.html): minified, content-hashed and pre-compressed in memory
+assets = AssetStore("forntend")
+
+# Per-conversation/per-IP rate limits, bounded in-flight work and duplicate-submit coalescing
+admission = AdmissionControl()
+
+@app.exception_handler(Rejected)
+async def rejected_handler(request, exc):
+    """Fast 429/503 with Retry-After instead of queueing without bound"""
+    return JSONResponse({"detail": exc.reason}, status_code=exc.status,
+                        headers={"Retry-After": str(exc.retry_after)})
 
 # Enable CORS
 app.add_middleware(
@@ -30,19 +94,11 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["POST", "GET", "OPTIONS"],
     allow_headers=["Content-Type", "Authorization"],
+    expose_headers=["Retry-After"],
     max_age=3600,
 )
 
 
-# Initialize chatbot instance
-bot = None
-try:
-    from final import RAGChatbot
-    bot = RAGChatbot()
-    logger.info("✅ GharFix Chatbot initialized successfully with memory")
-except Exception as e:
-    logger.error(f"❌ Failed to initialize chatbot: {e}")
-
 class ChatRequest(BaseModel):
     message: str
     conversation_id: str = "default"
@@ -51,40 +107,176 @@ class ChatResponse(BaseModel):
     response: str
     conversation_id: str
 
-@app.post("/chat")
-async def chat_endpoint(request: ChatRequest):
+def require_bot():
     if not bot:
         logger.error("Chatbot not initialized")
-        raise HTTPException(status_code=500, detail="Chatbot not initialized")
+        raise HTTPException(status_code=503, detail="Chatbot is starting up", headers={"Retry-After": "5"})
+
+def check_rate(request, http):
+    """Rate-limit by conversation and client IP; returns the coalescing key"""
+    ip = client_ip(http.headers, http.client.host if http.client else None)
+    admission.check_rate(request.conversation_id, ip)
+    # The client is part of the key: "default" and the full-page demo id are shared by everyone
+    return (ip, request.conversation_id, request.message)
+
+async def admitted_chat(request):
+    ticket = await admission.admit()
+    try:
+        return await bot.achat_with_rag(request.message, request.conversation_id)
+    finally:
+        ticket.release()
+
+@app.post("/chat")
+async def chat_endpoint(request: ChatRequest, http: Request):
+    require_bot()
+    key = check_rate(request, http)
     
     try:
         logger.info(f"Processing chat request: {request.message[:50]}...")
-        response = bot.chat_with_rag(request.message, request.conversation_id)
+        with metrics.track_request("chat"):
+            # A double-submitted message waits for the first one's answer
+            response = await admission.coalescer.run(key, lambda: admitted_chat(request))
         return ChatResponse(
             response=response,
             conversation_id=request.conversation_id,
         )
+    except Rejected:
+        raise
     except Exception as e:
         logger.error(f"Chat error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Chat error: {str(e)}")
 
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest, http: Request):
+    """Same as /chat, but the answer arrives as Server-Sent Events:
+    "data: {"delta": ...}" per chunk, then "event: done" (or "event: error" if the answer failed).
+    A duplicate of a message still being answered gets the whole answer as one chunk."""
+    require_bot()
+    key = check_rate(request, http)
+    
+    # Admission is decided before streaming starts, so a shed request is a plain 503.
+    # Lead first: a duplicate arriving while this one queues must wait for it, not run again.
+    pending = admission.coalescer.join(key)
+    ticket = None
+    if pending is None:
+        future = admission.coalescer.lead(key)
+        try:
+            ticket = await admission.admit()
+        except BaseException as e:
+            admission.coalescer.finish(key, future, error=e if isinstance(e, Exception) else RuntimeError("Request cancelled"))
+            raise
+    
+    logger.info(f"Processing streaming chat request: {request.message[:50]}...")
+    
+    def done():
+        # Also runs if the client went away before the stream started
+        if ticket is not None:
+            ticket.release()
+            admission.coalescer.finish(key, future, error=RuntimeError("Stream ended without an answer"))
+    
+    async def events():
+        started = time.perf_counter()
+        first_token = None
+        parts = []
+        try:
+            with metrics.track_request("chat_stream") as tracked:
+                if pending is not None:
+                    parts.append(await pending)
+                    first_token = time.perf_counter() - started
+                    tracked.first_token()
+                    yield f"data: {json.dumps({'delta': parts[0]})}\n\n"
+                else:
+                    async for delta in bot.astream_chat(request.message, request.conversation_id):
+                        if first_token is None:
+                            first_token = time.perf_counter() - started
+                            tracked.first_token()
+                        parts.append(delta)
+                        yield f"data: {json.dumps({'delta': delta})}\n\n"
+                    admission.coalescer.finish(key, future, "".join(parts))
+            yield f"event: done\ndata: {json.dumps({'conversation_id': request.conversation_id})}\n\n"
+        except Exception as e:
+            logger.error(f"Chat stream error: {str(e)}")
+            if pending is None:
+                # Duplicates waiting on this stream get the error too, not the partial answer
+                admission.coalescer.finish(key, future, error=e)
+            yield f"event: error\ndata: {json.dumps({'detail': 'Chat error'})}\n\n"
+        finally:
+            done()
+            total = time.perf_counter() - started
+            ttft = f"{first_token * 1000:.0f} ms" if first_token is not None else "n/a"
+            logger.info(f"Chat stream timing: first token {ttft}, total {total * 1000:.0f} ms")
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(done),
+    )
+
 @app.get("/health")
 async def health_check():
+    """Liveness: answers as soon as the server is up, never touches the bot"""
+    return {"status": "healthy", "chatbot_ready": bot is not None}
+
+@app.get("/ready")
+async def ready_check():
+    """Readiness: 200 once warm-up has built the bot, 503 before (or if it gave up)"""
+    return JSONResponse({"ready": bot is not None, **warmup}, status_code=200 if bot else 503)
+
+@app.get("/stats")
+async def stats():
     return {
-        "status": "healthy",
-        "chatbot_ready": bot is not None
+        "chatbot_ready": bot is not None,
+        "sessions": await bot.asession("stats") if bot else None,
+        "answer_cache": bot.answer_cache.stats() if bot else None,
+        "query_embeddings": bot.query_embedder.stats() if bot else None,
+        "fast_path": bot.intents.stats() if bot else None,
+        "lead_outbox": bot.outbox.stats() if bot else None,
+        "generation": bot.generator.stats() if bot else None,
+        "admission": admission.stats()
     }
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus text exposition: stage/request latency, in-flight requests, token sizes, booking funnel"""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+def asset_response(name, request):
+    """Pre-built asset variant for the client's Accept-Encoding, or 304 on a matching ETag"""
+    selected = assets.select(
+        name,
+        request.headers.get("accept-encoding"),
+        request.headers.get("if-none-match"),
+    )
+    if selected is None:
+        return None
+    status, body, headers = selected
+    return Response(content=body, status_code=status, headers=headers)
+
+@app.api_route("/static/manifest.json", methods=["GET", "HEAD"])
+async def static_manifest():
+    """Plain asset names -> content-hashed names, which can be cached for a year"""
+    return JSONResponse(assets.manifest(), headers={"Cache-Control": "no-cache"})
+
+@app.api_route("/static/{name:path}", methods=["GET", "HEAD"])
+async def static_asset(name: str, request: Request):
+    response = asset_response(name, request)
+    if response is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return response
+
 @app.get("/")
-async def root():
-    index_path = os.path.join("forntend", "index.html")
-    if os.path.exists(index_path):
-        return FileResponse(index_path)
-    else:
+async def root(request: Request):
+    response = asset_response("index.html", request)
+    if response is None:
         logger.error("Frontend index.html not found")
         return {"detail": "Frontend index.html not found"}
+    return response
+
+logger.info(f"App imported in {(time.perf_counter() - IMPORT_STARTED) * 1000:.0f} ms")
 
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
 
 
@@ -4,7 +4,7 @@
 
   const CONFIG = {
     API_BASE: "https://gharfix-chatbot-3sjy.onrender.com",
-    API_ENDPOINT: "/chat",
+    API_ENDPOINT: "/chat/stream",
     TITLE: "🏠 GharFix Assistant",
     SUBTITLE: "Always here to help",
     STORAGE_KEY: "gfc_conversation_id",
@@ -104,6 +104,41 @@ What service do you need today?`,
     const msg = createEl("div", { className: `gfc-msg gfc-${sender}` }, [bubble]);
     elements.messages.appendChild(msg);
     elements.messages.scrollTop = elements.messages.scrollHeight;
+    return bubble;
+  }
+
+  function updateBubble(bubble, text) {
+    bubble.innerHTML = text.replace(/\n/g, "<br>");
+    elements.messages.scrollTop = elements.messages.scrollHeight;
+  }
+
+  // Parse a text/event-stream body: "data: {...}" blocks separated by blank lines
+  async function readEvents(res, onDelta) {
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      let boundary;
+      while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+        const rawEvent = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+
+        let eventName = "message";
+        let data = "";
+        rawEvent.split("\n").forEach((line) => {
+          if (line.startsWith("event:")) eventName = line.slice(6).trim();
+          else if (line.startsWith("data:")) data += line.slice(5).trim();
+        });
+
+        if (eventName === "error") throw new Error("Stream error");
+        if (eventName === "message" && data) onDelta(JSON.parse(data).delta || "");
+      }
+    }
   }
 
   function showTyping() {
@@ -134,10 +169,29 @@ What service do you need today?`,
         body: JSON.stringify({ message: text, conversation_id: conversationId })
       });
 
-      hideTyping();
+      // Rate limited or server busy: say so instead of a generic network error
+      if (res.status === 429 || res.status === 503) {
+        hideTyping();
+        const wait = parseInt(res.headers.get("Retry-After") || "5", 10);
+        addMessage(`We're getting a lot of messages right now. Please try again in ${wait} seconds.`, "bot");
+        return;
+      }
       if (!res.ok) throw new Error(`HTTP ${res.status}`);
-      const data = await res.json();
-      const response = data.response || "";
+
+      // Render answer chunks as they stream in. Booking replies (including the
+      // WhatsApp redirect) arrive as a single chunk and are never rendered raw.
+      let response = "";
+      let bubble = null;
+      await readEvents(res, (delta) => {
+        response += delta;
+        if (response.includes("WHATSAPP_REDIRECT:")) return;
+        if (!bubble) {
+          hideTyping();
+          bubble = addMessage("", "bot");
+        }
+        updateBubble(bubble, response);
+      });
+      hideTyping();
 
       // ✅ INTERCEPT WHATSAPP REDIRECT BEFORE DISPLAYING
       if (response.includes("WHATSAPP_REDIRECT:")) {
@@ -155,9 +209,9 @@ What service do you need today?`,
             addMessage("💬 WhatsApp opened! Just hit Send to complete your booking. We'll reach out within 30 mins. 🏠", "bot");
           }, 800);
         }, 1500);
-      } else {
-        // Normal message response
-        addMessage(response, "bot");
+      } else if (!bubble) {
+        // Empty stream
+        addMessage("Sorry, I couldn't process your request. Please try again.", "bot");
       }
     } catch (err) {
       hideTyping();
@@ -1,6 +1,6 @@
 class GharFixChatbot {
     constructor() {
-        this.apiUrl = '/chat'; // Use relative URL for deployed version
+        this.apiUrl = '/chat/stream'; // Use relative URL for deployed version (Server-Sent Events)
         this.conversationId = 'conv_' + Date.now();
         this.isTyping = false;
         
@@ -68,6 +68,40 @@ class GharFixChatbot {
         return messageDiv;
     }
     
+    updateMessage(messageDiv, content) {
+        messageDiv.innerHTML = `<div class="message-content">${content.replace(/\n/g, '<br>')}</div>`;
+        this.messagesContainer.scrollTop = this.messagesContainer.scrollHeight;
+    }
+    
+    async readEvents(response, onDelta) {
+        // Parse the text/event-stream body: "data: {...}" blocks separated by blank lines
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                
+                let eventName = 'message';
+                let data = '';
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) eventName = line.slice(6).trim();
+                    else if (line.startsWith('data:')) data += line.slice(5).trim();
+                });
+                
+                if (eventName === 'error') throw new Error('Stream error');
+                if (eventName === 'message' && data) onDelta(JSON.parse(data).delta || '');
+            }
+        }
+    }
+    
     async sendMessage() {
         const message = this.messageInput.value.trim();
         if (!message || this.isTyping) return;
@@ -97,16 +131,15 @@ class GharFixChatbot {
                 throw new Error(`HTTP ${response.status}: ${response.statusText}`);
             }
             
-            const data = await response.json();
-            
-            // Remove typing indicator
-            typingIndicator.remove();
+            // Render the answer as chunks arrive; the typing indicator becomes the bot message
+            let reply = '';
+            await this.readEvents(response, (delta) => {
+                reply += delta;
+                this.updateMessage(typingIndicator, reply);
+            });
             
-            // Add bot response
-            if (data.response) {
-                this.addMessage(data.response, 'bot');
-            } else {
-                this.addMessage('Sorry, I couldn\'t process your request. Please try again.', 'bot');
+            if (!reply) {
+                this.updateMessage(typingIndicator, 'Sorry, I couldn\'t process your request. Please try again.');
             }
             
         } catch (error) {
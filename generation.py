@@ -0,0 +1,284 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import metrics
+
+# Per-call deadline for one model attempt (seconds); a stream gets it per chunk
+GENERATE_TIMEOUT = float(os.getenv("GENERATE_TIMEOUT", "30"))
+# Hedging: if the current model has not answered after its recent HEDGE_PERCENTILE
+# latency, also ask the next model and keep whichever answers first
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "0") == "1"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.25"))  # seconds
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "2"))  # until enough samples
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+# Circuit breaker: consecutive failures that open it, and seconds before a trial call
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET = float(os.getenv("BREAKER_RESET", "30"))
+
+
+class GenerationUnavailable(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    """Closed -> open after `failures` consecutive errors; after `reset_timeout`
+    one trial call is let through (half-open) and its outcome closes or re-opens it"""
+
+    def __init__(self, failures=BREAKER_FAILURES, reset_timeout=BREAKER_RESET):
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self.consecutive = 0
+        self.opened_at = None
+        self.trial = False
+        self.opens = 0
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            return not self.trial and time.monotonic() - self.opened_at >= self.reset_timeout
+
+    def begin(self):
+        """Called when a call is actually made; while half-open it becomes the trial call"""
+        with self._lock:
+            if self.opened_at is not None:
+                self.trial = True
+
+    def release(self):
+        """The call was abandoned (lost a hedge race) without an outcome"""
+        with self._lock:
+            self.trial = False
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive = 0
+            self.opened_at = None
+            self.trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive += 1
+            if self.trial or self.consecutive >= self.failures:
+                if self.opened_at is None or self.trial:
+                    self.opens += 1
+                self.opened_at = time.monotonic()
+                self.trial = False
+
+
+class LatencyTracker:
+    """Recent successful call latencies, for the hedge delay"""
+
+    def __init__(self, size=200):
+        self.samples = deque(maxlen=size)
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, pct, default):
+        if len(self.samples) < HEDGE_MIN_SAMPLES:
+            return default
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class GenerationClient:
+    """Gemini generation across an ordered list of models (primary first).
+
+    Every attempt has a deadline and feeds its model's circuit breaker; a model
+    with an open breaker is skipped. A failed attempt falls through to the next
+    model. With hedging on, a second attempt is also started at the next model
+    once the current one has run longer than its recent p95, and the first
+    answer wins. Streams are raced on their first chunk the same way.
+    """
+
+    def __init__(self, models, deadline=GENERATE_TIMEOUT, hedge=HEDGE_ENABLED,
+                 hedge_percentile=HEDGE_PERCENTILE):
+        self.models = list(models)  # [(name, model with the genai.GenerativeModel interface)]
+        self.deadline = deadline
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.breakers = {name: CircuitBreaker() for name, _ in self.models}
+        # Full answers and stream first chunks take very different times: one tracker each
+        self.latency = {name: LatencyTracker() for name, _ in self.models}
+        self.first_chunk_latency = {name: LatencyTracker() for name, _ in self.models}
+        self._pool = None
+        self.hedges = 0
+        self.fallbacks = 0
+
+    def available(self):
+        models = [(name, model) for name, model in self.models if self.breakers[name].allow()]
+        if not models:
+            raise GenerationUnavailable("All generation models are failing; circuit breakers open")
+        return models
+
+    def hedge_delay(self, name, stream=False):
+        tracker = (self.first_chunk_latency if stream else self.latency)[name]
+        delay = tracker.percentile(self.hedge_percentile, HEDGE_DEFAULT_DELAY)
+        return max(HEDGE_MIN_DELAY, delay)
+
+    def _start(self, name):
+        self.breakers[name].begin()
+        return time.perf_counter()
+
+    def _succeeded(self, name, started, stream=False):
+        self.breakers[name].record_success()
+        (self.first_chunk_latency if stream else self.latency)[name].record(time.perf_counter() - started)
+        metrics.GENERATIONS.inc(name, "ok")
+
+    def _failed(self, name, error):
+        self.breakers[name].record_failure()
+        outcome = "timeout" if isinstance(error, (asyncio.TimeoutError, FutureTimeout)) else "error"
+        metrics.GENERATIONS.inc(name, outcome)
+        logging.warning(f"Generation with {name} failed ({outcome}: {str(error) or type(error).__name__})")
+
+    def generate(self, prompt, generation_config):
+        """Blocking generation with per-call deadline and fallback (no hedging)"""
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="gharfix-generate")
+        last_error = None
+        for i, (name, model) in enumerate(self.available()):
+            if i:
+                self.fallbacks += 1
+            started = self._start(name)
+            future = self._pool.submit(model.generate_content, prompt, generation_config=generation_config)
+            try:
+                resp = future.result(timeout=self.deadline)
+                text = resp.text
+            except Exception as e:
+                self._failed(name, e)
+                last_error = e
+                continue
+            self._succeeded(name, started)
+            return text
+        raise last_error
+
+    async def _attempt(self, name, model, prompt, generation_config):
+        started = self._start(name)
+        try:
+            resp = await asyncio.wait_for(
+                model.generate_content_async(prompt, generation_config=generation_config),
+                timeout=self.deadline
+            )
+            text = resp.text
+        except asyncio.CancelledError:
+            self.breakers[name].release()  # lost a hedge race; not the model's fault
+            raise
+        except Exception as e:
+            self._failed(name, e)
+            raise
+        self._succeeded(name, started)
+        return text
+
+    async def _stream_attempt(self, name, model, prompt, generation_config):
+        """Open a stream and wait for its first non-empty chunk: (first text, chunk iterator)"""
+        started = self._start(name)
+        try:
+            stream = await asyncio.wait_for(
+                model.generate_content_async(prompt, generation_config=generation_config, stream=True),
+                timeout=self.deadline
+            )
+            chunks = stream.__aiter__()
+            while True:
+                chunk = await asyncio.wait_for(chunks.__anext__(), timeout=self.deadline)
+                if chunk.text:
+                    break
+        except asyncio.CancelledError:
+            self.breakers[name].release()
+            raise
+        except Exception as e:
+            self._failed(name, e)
+            raise
+        self._succeeded(name, started, stream=True)
+        return chunk.text, chunks
+
+    async def _race(self, attempt, prompt, generation_config, stream=False):
+        """Run attempt() on the available models in order, adding the next model on
+        failure or (when hedging) once the running one passes its hedge delay"""
+        candidates = self.available()
+        pending = {}
+        try:
+            return await self._race_loop(attempt, prompt, generation_config, candidates, pending, stream)
+        finally:
+            for task in pending:
+                task.cancel()  # a winner was found, or the caller gave up
+
+    async def _race_loop(self, attempt, prompt, generation_config, candidates, pending, stream):
+        last_error = None
+        launched = 0
+        while True:
+            if not pending:
+                if launched == len(candidates):
+                    raise last_error or GenerationUnavailable("No generation model answered")
+                if launched:
+                    self.fallbacks += 1
+                name, model = candidates[launched]
+                pending[asyncio.ensure_future(attempt(name, model, prompt, generation_config))] = name
+                launched += 1
+
+            timeout = None
+            if self.hedge and launched < len(candidates):
+                timeout = self.hedge_delay(candidates[launched - 1][0], stream)
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+            if not done:
+                # Hedge: keep the slow attempt running and race the next model against it
+                name, model = candidates[launched]
+                self.hedges += 1
+                metrics.GENERATIONS.inc(name, "hedge")
+                pending[asyncio.ensure_future(attempt(name, model, prompt, generation_config))] = name
+                launched += 1
+                continue
+
+            for task in done:
+                pending.pop(task)
+                if task.exception() is None:
+                    return task.result()
+                last_error = task.exception()
+
+    async def agenerate(self, prompt, generation_config):
+        return await self._race(self._attempt, prompt, generation_config)
+
+    async def astream(self, prompt, generation_config):
+        """Yield answer text chunks; fallback and hedging apply until the first chunk"""
+        first, chunks = await self._race(self._stream_attempt, prompt, generation_config, stream=True)
+        yield first
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), timeout=self.deadline)
+            except StopAsyncIteration:
+                break
+            if chunk.text:
+                yield chunk.text
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return {
+            "models": {
+                name: {
+                    "breaker": self.breakers[name].state,
+                    "breaker_opens": self.breakers[name].opens,
+                    "hedge_delay": round(self.hedge_delay(name), 3),
+                    "stream_hedge_delay": round(self.hedge_delay(name, stream=True), 3),
+                }
+                for name, _ in self.models
+            },
+            "hedging": self.hedge,
+            "hedges": self.hedges,
+            "fallbacks": self.fallbacks,
+        }
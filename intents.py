@@ -0,0 +1,166 @@
+import re
+
+from caching import normalize_question
+
+# Localities we know belong to a coverage city, so "do you serve Andheri" is answerable
+LOCATION_ALIASES = {
+    "bengaluru": "Bangalore",
+    "new delhi": "Delhi",
+    "bombay": "Mumbai",
+    "madras": "Chennai",
+    "andheri": "Mumbai",
+    "bandra": "Mumbai",
+    "dadar": "Mumbai",
+    "worli": "Mumbai",
+    "powai": "Mumbai",
+    "malad": "Mumbai",
+    "borivali": "Mumbai",
+}
+
+# Questions longer than this are left to the LLM
+MAX_FAST_PATH_WORDS = 12
+
+LIST_SERVICES_PATTERNS = [
+    r"^(please )?(list|show|tell)( me)?( all)?( of)?( the| your)? services( you (offer|provide|have))?( please)?$",
+    r"^what (all )?(services|service) (do|does|can) (you|gharfix) (offer|provide|have|do)$",
+    r"^what (are|r) (all )?(the |your )?services( you (offer|provide|have))?$",
+    r"^(all|your) services$",
+    r"^services( list)?$",
+]
+
+COVERAGE_PATTERNS = [
+    r"^(do|does|can) (you|gharfix) (serve|service|operate|work|cover|deliver|come)( services)? (in|at|to) (?P<loc>[a-z ]+)$",
+    r"^(do|does) (you|gharfix) (serve|cover) (?P<loc>[a-z ]+)$",
+    r"^(are|is) (you|gharfix|your services|gharfix services) (available|present|operating|there) (in|at) (?P<loc>[a-z ]+)$",
+    r"^(do you have|any) services? (in|at) (?P<loc>[a-z ]+)$",
+    r"^(services? )?available in (?P<loc>[a-z ]+)$",
+]
+
+AREAS_PATTERNS = [
+    r"^(which|what) (cities|city|areas|area|locations|location)( do| does)? (you|gharfix) (serve|cover|operate in|work in)$",
+    r"^where (do|does) (you|gharfix) (operate|serve|work|provide services)$",
+    r"^(service|coverage) areas?$",
+]
+
+PRICE_WORDS = r"(price|prices|pricing|rate|rates|cost|costs|charge|charges|fee|fees|tariff)"
+
+# Pricing, contact and hours are matched as whole questions about that topic, never by a
+# keyword anywhere in the message: "my whatsapp is not working" is not a contact question
+PRICING_PATTERNS = [
+    rf"^(what|whats|what s) (is|are|r) (the |your |ur )?(service )?{PRICE_WORDS}( like)?( for [a-z ]+)?$",
+    r"^how much (does|do|will|would|is|are) (it|you|gharfix|the service|a visit)( usually)? (cost|charge|be)( for [a-z ]+)?$",
+    r"^how much (for|is it for) [a-z ]+$",
+    rf"^(can|could|may) i (get|have|know|see) (a |the |your )?({PRICE_WORDS}|quote)( list)?( please)?$",
+    rf"^(your )?{PRICE_WORDS}( list| details| info)?( please)?$",
+]
+
+CONTACT_PATTERNS = [
+    r"^(what is|whats|what s|give me|share|send)( me)? (your|the|ur) (contact|phone|mobile|whatsapp|helpline)( number| no| details| info)?( please)?$",
+    r"^how (can|do) i (contact|reach|call|message) (you|gharfix|your team|the team)$",
+    r"^(can|could|may) i (get|have) (your|the) (contact|phone|mobile|whatsapp|helpline)( number| no| details)?( please)?$",
+    r"^(contact|phone|whatsapp|helpline)( number| no| details| info)?( please)?$",
+]
+
+HOURS_PATTERNS = [
+    r"^(what are|whats|what s|what is) (your|the|ur) (timing|timings|hours|working hours|opening hours|business hours)$",
+    r"^(when|what time) (are|do|does) (you|gharfix) (open|close)$",
+    r"^(are|is) (you|gharfix) (open|available) (24 7|24x7|today|now|on sunday|on sundays|on weekends|at night)$",
+    r"^(do|does) (you|gharfix) (work|operate) (24 7|24x7|on sunday|on sundays|on weekends|at night)$",
+    r"^(timing|timings|hours|working hours|opening hours)( please)?$",
+]
+
+
+class IntentClassifier:
+    """Answers common questions from the knowledge base without calling Gemini.
+
+    classify() returns (intent, answer) for a confident match and None for
+    anything else, which then goes through the normal RAG path.
+    """
+
+    def __init__(self, knowledge_base):
+        self.services = []
+        self.coverage = []
+        self.availability = ""
+        self.contact = ""
+        for line in knowledge_base.strip().splitlines():
+            line = line.strip()
+            if re.match(r"^\d+\.\s", line):
+                self.services.append(re.sub(r"^\d+\.\s*", "", line).split(" - ", 1)[0])
+            elif line.startswith("SERVICE COVERAGE AREAS:"):
+                self.coverage = [area.strip() for area in line.split(":", 1)[1].split(",") if area.strip()]
+            elif line.startswith("AVAILABILITY:"):
+                self.availability = line.split(":", 1)[1].strip()
+            elif line.startswith("CONTACT:"):
+                self.contact = line.split(":", 1)[1].strip()
+
+        # Keyword index: normalized location name -> coverage city
+        self.locations = {normalize_question(area): area for area in self.coverage}
+        for alias, city in LOCATION_ALIASES.items():
+            if city in self.coverage:
+                self.locations[alias] = city
+
+        self.list_services_patterns = [re.compile(p) for p in LIST_SERVICES_PATTERNS]
+        self.coverage_patterns = [re.compile(p) for p in COVERAGE_PATTERNS]
+        self.areas_patterns = [re.compile(p) for p in AREAS_PATTERNS]
+        self.pricing_patterns = [re.compile(p) for p in PRICING_PATTERNS]
+        self.contact_patterns = [re.compile(p) for p in CONTACT_PATTERNS]
+        self.hours_patterns = [re.compile(p) for p in HOURS_PATTERNS]
+        self.hits = {}
+        self.fallbacks = 0
+
+    def classify(self, question):
+        result = self._match(normalize_question(question))
+        if result is None:
+            self.fallbacks += 1
+        else:
+            self.hits[result[0]] = self.hits.get(result[0], 0) + 1
+        return result
+
+    def _match(self, text):
+        words = text.split()
+        if not words or len(words) > MAX_FAST_PATH_WORDS:
+            return None
+
+        if any(p.match(text) for p in self.list_services_patterns):
+            numbered = "\n".join(f"{i}. {name}" for i, name in enumerate(self.services, 1))
+            return "list_services", (
+                f"GharFix offers these services:\n{numbered}\n\n"
+                "Type 'book now' to book any of these services."
+            )
+
+        for pattern in self.coverage_patterns:
+            m = pattern.match(text)
+            if m:
+                city = self.locations.get(m.group("loc").strip())
+                if city is None:
+                    # Not a known coverage area - let the LLM phrase the "please confirm" answer
+                    return None
+                return "coverage", (
+                    f"Yes, GharFix serves {city}. Type 'book now' and I'll collect your details for a booking."
+                )
+
+        if any(p.match(text) for p in self.areas_patterns):
+            return "coverage_areas", (
+                f"GharFix currently serves {', '.join(self.coverage)}. For other cities, please "
+                "call/message at +91 75068 55407 for confirmation."
+            )
+
+        if any(p.match(text) for p in self.pricing_patterns):
+            return "pricing", (
+                "Our pricing varies by service and location. Please call +91 75068 55407 "
+                "or type 'book now' to get a customized quote."
+            )
+        if any(p.match(text) for p in self.contact_patterns):
+            return "contact", f"{self.contact}. You can also type 'book now' and I'll collect your details."
+        if any(p.match(text) for p in self.hours_patterns):
+            return "hours", f"{self.availability}. {self.contact}."
+        return None
+
+    def stats(self):
+        handled = sum(self.hits.values())
+        total = handled + self.fallbacks
+        return {
+            "hits": dict(self.hits),
+            "fallbacks": self.fallbacks,
+            "hit_rate": round(handled / total, 4) if total else 0.0,
+        }
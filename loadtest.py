@@ -0,0 +1,323 @@
+"""Offline load test for the FastAPI app in final2.py.
+
+Drives the ASGI app in-process with the fake Gemini backend, running mixed
+FAQ / booking / streaming conversation scripts at each concurrency level, and
+writes latency percentiles, throughput and memory to a JSON file:
+
+    python loadtest.py --levels 1,8,32,64 --duration 10 --out loadtest.json
+    python loadtest.py --out new.json --baseline loadtest.json --max-regression 0.2
+    FAKE_CAPACITY=16 MAX_IN_FLIGHT=16 python loadtest.py --levels 16,64,256 --out overload.json
+
+Requests shed by admission control (429/503) are counted separately and
+retried after their Retry-After; latency percentiles cover served requests.
+
+With --baseline, exits non-zero when p95 latency rises or RPS falls by more
+than --max-regression at any level both runs share.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+
+import numpy as np
+
+FAQ_SCRIPTS = [
+    ["what services do you offer", "do you serve andheri", "how much does it cost"],
+    ["my kitchen tap is leaking, can someone fix it today", "do you also repair bathroom pipes"],
+    ["is your massage service available at home", "what are your timings"],
+    ["can you clean the water tank on my building roof", "which cities do you cover"],
+    ["I need a cook for a family dinner this weekend", "contact number please"],
+]
+FAQ_VARIANTS = ["ac", "fan", "geyser", "sink", "washing machine", "inverter", "switchboard", "shower"]
+BOOKING_SCRIPT = ["i want to book a service", "Asha Rao", "9876543210", "plumber", "Andheri", "yes"]
+SCRIPT_MIX = (("faq", 0.6), ("booking", 0.25), ("stream", 0.15))
+
+
+def rss_mb():
+    """Current resident set size of this process"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    import resource
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+async def asgi_request(app, method, path, payload=None, headers=(), response_headers=None):
+    """Minimal in-process HTTP/1.1 request: (status, body, seconds to first body chunk).
+    `headers` are extra (name, value) request headers; response headers are
+    stored into the `response_headers` dict when one is given."""
+    body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": b"", "root_path": "", "server": ("loadtest", 80), "client": ("127.0.0.1", 0),
+        "headers": [(b"host", b"loadtest"), (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    *((k.lower().encode(), v.encode()) for k, v in headers)],
+    }
+    sent = False
+    status = None
+    chunks = []
+    first = None
+    started = time.perf_counter()
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await asyncio.sleep(3600)  # no disconnect while the response is being produced
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status, first
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            if response_headers is not None:
+                response_headers.update((k.decode().lower(), v.decode()) for k, v in message.get("headers", []))
+        elif message["type"] == "http.response.body" and message.get("body"):
+            if first is None:
+                first = time.perf_counter() - started
+            chunks.append(message["body"])
+
+    await app(scope, receive, send)
+    return status, b"".join(chunks), first
+
+
+class Lifespan:
+    """Runs the app's startup/shutdown events, as uvicorn would"""
+
+    def __init__(self, app):
+        self.app = app
+        self.events = asyncio.Queue()
+        self.done = asyncio.Queue()
+
+    async def _receive(self):
+        return await self.events.get()
+
+    async def _send(self, message):
+        await self.done.put(message)
+
+    async def __aenter__(self):
+        self.task = asyncio.create_task(self.app({"type": "lifespan", "asgi": {"version": "3.0"}}, self._receive, self._send))
+        await self.events.put({"type": "lifespan.startup"})
+        message = await self.done.get()
+        if message["type"] != "lifespan.startup.complete":
+            raise RuntimeError(f"App startup failed: {message}")
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.events.put({"type": "lifespan.shutdown"})
+        await self.done.get()
+        await self.task
+
+
+def offline_environment(seed=0):
+    """Fake backend and throwaway state, so runs never touch real data or the network"""
+    workdir = tempfile.mkdtemp(prefix="gharfix-loadtest-")
+    os.environ.setdefault("LLM_BACKEND", "fake")
+    os.environ.setdefault("FAKE_SEED", str(seed))
+    os.environ.setdefault("CHROMA_PATH", os.path.join(workdir, "chroma_db"))
+    os.environ.setdefault("NUMPY_INDEX_PATH", os.path.join(workdir, "vector_index"))
+    os.environ.setdefault("SESSION_DB_PATH", os.path.join(workdir, "sessions.db"))
+    os.environ.setdefault("LEAD_JOURNAL_PATH", os.path.join(workdir, "leads.journal"))
+    os.environ.setdefault("TRACE_PATH", os.path.join(workdir, "traces.jsonl"))
+    os.environ["EMBED_CACHE_PATH"] = ""
+    return workdir
+
+
+def summarize(samples):
+    if not samples:
+        return {"count": 0}
+    ms = np.array(samples) * 1000
+    return {
+        "count": len(samples),
+        "p50": round(float(np.percentile(ms, 50)), 2),
+        "p95": round(float(np.percentile(ms, 95)), 2),
+        "p99": round(float(np.percentile(ms, 99)), 2),
+        "max": round(float(ms.max()), 2),
+    }
+
+
+async def run_level(app, concurrency, duration, seed):
+    rng = random.Random(seed + concurrency)
+    deadline = time.perf_counter() + duration
+    latencies = {"faq": [], "booking": [], "stream": []}
+    first_chunk = []
+    errors = {"http": 0, "reply": 0}
+    # Requests turned away by admission control (429/503), and how fast that answer came
+    shed = {"429": 0, "503": 0}
+    shed_latencies = []
+    peak_rss = rss_mb()
+
+    async def user(uid):
+        nonlocal peak_rss
+        n = 0
+        # Each simulated user comes from its own address, as seen through the proxy
+        client = (("x-forwarded-for", f"10.{uid // 65536 % 256}.{uid // 256 % 256}.{uid % 256}"),)
+        while time.perf_counter() < deadline:
+            n += 1
+            kind = rng.choices([k for k, _ in SCRIPT_MIX], [w for _, w in SCRIPT_MIX])[0]
+            cid = f"lt-{concurrency}-{uid}-{n}"
+            if kind == "booking":
+                script = BOOKING_SCRIPT
+            else:
+                script = list(rng.choice(FAQ_SCRIPTS))
+                if rng.random() < 0.5:
+                    script.append(f"can you repair my {rng.choice(FAQ_VARIANTS)} in {rng.choice(['mumbai', 'pune', 'thane'])}")
+            path = "/chat/stream" if kind == "stream" else "/chat"
+            for message in script:
+                while True:
+                    started = time.perf_counter()
+                    headers = {}
+                    status, body, first = await asgi_request(app, "POST", path, {"message": message, "conversation_id": cid},
+                                                             headers=client, response_headers=headers)
+                    if status not in (429, 503):
+                        break
+                    # Shed: back off as told, then resend the same message
+                    shed[str(status)] += 1
+                    shed_latencies.append(time.perf_counter() - started)
+                    if time.perf_counter() >= deadline:
+                        break
+                    await asyncio.sleep(float(headers.get("retry-after", "1")))
+                if status in (429, 503):
+                    break
+                latencies[kind].append(time.perf_counter() - started)
+                if kind == "stream" and first is not None:
+                    first_chunk.append(first)
+                if status != 200:
+                    errors["http"] += 1
+                elif b"Sorry, I encountered an error" in body or b"event: error" in body:
+                    errors["reply"] += 1
+            peak_rss = max(peak_rss, rss_mb())
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    everything = [s for samples in latencies.values() for s in samples]
+    return {
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 2),
+        "requests": len(everything),
+        "rps": round(len(everything) / elapsed, 1),
+        "errors": errors,
+        "shed": shed,
+        "shed_latency_ms": summarize(shed_latencies),
+        "latency_ms": summarize(everything),
+        "by_script_ms": {kind: summarize(samples) for kind, samples in latencies.items()},
+        "stream_first_chunk_ms": summarize(first_chunk),
+        "rss_mb": rss_mb(),
+        "peak_rss_mb": peak_rss,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(result, baseline, max_regression):
+    """Regression messages for levels present in both runs"""
+    previous = {level["concurrency"]: level for level in baseline["levels"]}
+    problems = []
+    for level in result["levels"]:
+        base = previous.get(level["concurrency"])
+        if not base:
+            continue
+        c = level["concurrency"]
+        p95, base_p95 = level["latency_ms"]["p95"], base["latency_ms"]["p95"]
+        if base_p95 and p95 > base_p95 * (1 + max_regression):
+            problems.append(f"c={c}: p95 {base_p95} -> {p95} ms")
+        if base["rps"] and level["rps"] < base["rps"] * (1 - max_regression):
+            problems.append(f"c={c}: rps {base['rps']} -> {level['rps']}")
+    return problems
+
+
+async def wait_ready(app, timeout=120):
+    """Poll /ready until the warm-up task has built the bot"""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        status, body, _ = await asgi_request(app, "GET", "/ready")
+        if status == 200:
+            return
+        if json.loads(body).get("state") == "failed":
+            break
+        await asyncio.sleep(0.05)
+    raise SystemExit("Chatbot failed to initialize; see the log above")
+
+
+async def main(args):
+    import final2
+
+    levels = []
+    async with Lifespan(final2.app):
+        await wait_ready(final2.app)
+        logging.getLogger().setLevel(logging.WARNING)
+        for concurrency in args.levels:
+            level = await run_level(final2.app, concurrency, args.duration, args.seed)
+            lat = level["latency_ms"]
+            print(f"c={concurrency:<4} {level['requests']:>6} req  {level['rps']:>8} rps  "
+                  f"p50 {lat.get('p50')} ms  p95 {lat.get('p95')} ms  p99 {lat.get('p99')} ms  "
+                  f"rss {level['rss_mb']} MB  errors {level['errors']}  shed {level['shed']}")
+            levels.append(level)
+
+    backend = final2.bot.backend
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "duration_per_level": args.duration,
+            "seed": args.seed,
+            "backend": type(backend).__name__,
+            "backend_calls": getattr(backend, "calls", None),
+            "env": {k: v for k, v in os.environ.items()
+                    if k.startswith(("FAKE_", "RAG_", "SESSION_", "EMBED_", "MAX_", "QUEUE_", "CONVERSATION_", "IP_"))},
+        },
+        "levels": levels,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=lambda s: [int(x) for x in s.split(",")], default=[1, 8, 32, 64])
+    parser.add_argument("--duration", type=float, default=10, help="seconds per concurrency level")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="loadtest.json")
+    parser.add_argument("--baseline", help="earlier result file to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+    args.out = os.path.abspath(args.out)
+    args.baseline = args.baseline and os.path.abspath(args.baseline)
+
+    offline_environment(args.seed)
+    # final2 serves the frontend from a path relative to the repo root
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+
+    result = asyncio.run(main(args))
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Wrote {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            problems = compare(result, json.load(f), args.max_regression)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        sys.exit(1 if problems else 0)
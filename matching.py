@@ -0,0 +1,166 @@
+import re
+from collections import deque
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+# Shortest prefix of a word that counts as a match ("plumb" -> "Plumbing")
+MIN_PREFIX = 3
+# Words shorter than this never match fuzzily
+MIN_FUZZY = 4
+
+
+def normalize(text):
+    """Lowercase and reduce to single-space separated alphanumeric words"""
+    return " ".join(_NON_WORD.sub(" ", text.lower()).split())
+
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance (adjacent transpositions count as one), capped at limit + 1"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class AhoCorasick:
+    """Multi-pattern automaton: every pattern occurrence in one pass over the text"""
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for pattern, value in patterns.items():
+            node = 0
+            for ch in pattern:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                node = nxt
+            self.out[node].append((len(pattern), value))
+
+        # Breadth-first failure links
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                fail = self.fail[node]
+                while fail and ch not in self.goto[fail]:
+                    fail = self.fail[fail]
+                target = self.goto[fail].get(ch, 0)
+                self.fail[nxt] = target if target != nxt else 0
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def search(self, text):
+        """Yield (start, end, value) for every occurrence"""
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            for length, value in self.out[node]:
+                yield i - length + 1, i + 1, value
+
+
+class Matcher:
+    """Index over canonical names and their aliases, built once.
+
+    match() ranks candidates found in the input:
+    1. whole-word alias occurrences (Aho-Corasick), longer aliases first
+    2. inputs whose every word starts a word of the same alias
+       ("plumb" -> Plumbing, "water tank" -> Water Tank Cleaning)
+    3. one-typo matches of the input, its words or word pairs, found through
+       a deletion index and confirmed with edit distance (typos=False skips
+       this stage, for open-ended lists where a near miss is often another
+       real name)
+    Ties keep the order the names were given in.
+    """
+
+    def __init__(self, names, aliases=None):
+        self.order = {}
+        patterns = {}
+        for name in names:
+            self.order.setdefault(name, len(self.order))
+            patterns.setdefault(normalize(name), name)
+        for alias, name in (aliases or {}).items():
+            self.order.setdefault(name, len(self.order))
+            patterns.setdefault(normalize(alias), name)
+
+        self.automaton = AhoCorasick(patterns)
+
+        # Prefix index over alias words (a flattened trie)
+        self.prefixes = {}
+        for pattern, name in patterns.items():
+            for word in pattern.split():
+                for end in range(MIN_PREFIX, len(word) + 1):
+                    self.prefixes.setdefault(word[:end], {}).setdefault(name, len(word))
+
+        # Deletion index: every alias with one character removed -> aliases
+        self.deletions = {}
+        for pattern, name in patterns.items():
+            if len(pattern) < MIN_FUZZY:
+                continue
+            for variant in self._deletes(pattern):
+                self.deletions.setdefault(variant, []).append((pattern, name))
+
+    @staticmethod
+    def _deletes(word):
+        return {word} | {word[:i] + word[i + 1:] for i in range(len(word))}
+
+    def match(self, text, limit=5, typos=True):
+        """Ranked [(name, score)] for the input, best first; empty if nothing matches"""
+        query = normalize(text)
+        if not query:
+            return []
+        scores = {}
+
+        def offer(name, score):
+            if score > scores.get(name, 0):
+                scores[name] = score
+
+        # 1. Whole-word alias occurrences
+        for start, end, name in self.automaton.search(query):
+            if (start == 0 or query[start - 1] == " ") and (end == len(query) or query[end] == " "):
+                offer(name, 2.0 + (end - start) / 1000)
+
+        if not scores:
+            words = query.split()
+            # 2. Every input word is the start of a word of the same alias
+            common = None
+            for word in words:
+                hits = self.prefixes.get(word, {})
+                common = set(hits) if common is None else common & hits.keys()
+                if not common:
+                    break
+            for name in common or ():
+                covered = sum(len(word) / self.prefixes[word][name] for word in words)
+                offer(name, 1.0 + covered / 100)
+
+            # 3. One typo away from an alias
+            if typos and not scores:
+                candidates = {query, *words, *(" ".join(pair) for pair in zip(words, words[1:]))}
+                for candidate in candidates:
+                    if len(candidate) < MIN_FUZZY:
+                        continue
+                    for variant in self._deletes(candidate):
+                        for pattern, name in self.deletions.get(variant, ()):
+                            if edit_distance(candidate, pattern, 1) <= 1:
+                                offer(name, 0.5 + len(pattern) / 1000)
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], self.order[item[0]]))
+        return ranked[:limit]
@@ -0,0 +1,288 @@
+import os
+import json
+import time
+import random
+import bisect
+import inspect
+import logging
+import functools
+import threading
+import contextvars
+
+# Opt-in per-request timing traces: fraction of requests sampled, and where they are appended
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACE_PATH = os.getenv("TRACE_PATH", "./traces.jsonl")
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    """Base for metrics with per-thread shards.
+
+    Each thread updates its own {labels: value} dict, so recording takes no
+    lock; values() sums the shards at scrape time. Shards of threads that
+    have exited are kept, so nothing they recorded is lost.
+    """
+    kind = ""
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()  # guards the shard list only
+        self._local = threading.local()
+        self._shards = []
+
+    def _shard(self):
+        values = self._local.values = {}
+        with self._lock:
+            self._shards.append(values)
+        return values
+
+    def _snapshots(self):
+        with self._lock:
+            shards = list(self._shards)
+        # list() of a dict's items runs without releasing the GIL: a consistent copy
+        return [list(shard.items()) for shard in shards]
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self):
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, k)} {v}" for k, v in sorted(self.values().items())
+        ]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        try:
+            values = self._local.values
+        except AttributeError:
+            values = self._shard()
+        values[labels] = values.get(labels, 0) + amount
+
+    def values(self):
+        merged = {}
+        for items in self._snapshots():
+            for key, value in items:
+                merged[key] = merged.get(key, 0) + value
+        return merged
+
+
+class Gauge(Counter):
+    """Up/down count, such as requests in flight"""
+    kind = "gauge"
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class InFlight(_Metric):
+    """Requests being handled per endpoint, counted from the live track_request
+    objects at scrape time: entering and leaving are set operations, no lock"""
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames=("endpoint",)):
+        super().__init__(name, help_text, labelnames)
+        self.active = set()
+        self.endpoints = set()  # every endpoint tracked so far, shown as 0 when idle
+
+    def enter(self, tracker):
+        self.endpoints.add(tracker.endpoint)
+        self.active.add(tracker)
+
+    def leave(self, tracker):
+        self.active.discard(tracker)
+
+    def values(self):
+        counts = {(endpoint,): 0 for endpoint in list(self.endpoints)}
+        for tracker in list(self.active):
+            counts[(tracker.endpoint,)] += 1
+        return counts
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        try:
+            values = self._local.values
+        except AttributeError:
+            values = self._shard()
+        series = values.get(labels)
+        if series is None:
+            # per-bucket counts (last bucket is +Inf), then sum
+            series = values[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def values(self):
+        """{labels: [per-bucket counts, sum]} over all threads"""
+        merged = {}
+        for items in self._snapshots():
+            for key, series in items:
+                series = list(series)
+                total = merged.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0])
+                for i, count in enumerate(series[:-1]):
+                    total[0][i] += count
+                total[1] += series[-1]
+        return merged
+
+    def render(self):
+        lines = self.header()
+        for key, (counts, total) in sorted(self.values().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                names = self.labelnames + ("le",)
+                lines.append(f"{self.name}_bucket{_labels(names, key + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.callbacks = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_callback(self, fn):
+        """fn() -> [(name, help, {labels tuple: value})], exported as gauges at scrape time"""
+        self.callbacks.append(fn)
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for fn in self.callbacks:
+            try:
+                for name, help_text, labelnames, values in fn():
+                    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+                    lines += [f"{name}{_labels(labelnames, k)} {v}" for k, v in sorted(values.items())]
+            except Exception as e:
+                logging.error(f"Metrics callback failed: {str(e)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "gharfix_stage_seconds", "Time spent per chat pipeline stage", ["stage"]))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "gharfix_request_seconds", "End-to-end request latency", ["endpoint"]))
+FIRST_TOKEN_SECONDS = REGISTRY.register(Histogram(
+    "gharfix_first_token_seconds", "Time to first streamed chunk", ["endpoint"]))
+IN_FLIGHT = REGISTRY.register(InFlight(
+    "gharfix_requests_in_flight", "Requests currently being handled", ["endpoint"]))
+PROMPT_TOKENS = REGISTRY.register(Histogram(
+    "gharfix_prompt_tokens", "Estimated prompt tokens per LLM call", buckets=TOKEN_BUCKETS))
+RESPONSE_TOKENS = REGISTRY.register(Histogram(
+    "gharfix_response_tokens", "Estimated response tokens per LLM call", buckets=TOKEN_BUCKETS))
+BOOKING_STEPS = REGISTRY.register(Counter(
+    "gharfix_booking_steps_total", "Booking funnel transitions", ["step"]))
+GENERATIONS = REGISTRY.register(Counter(
+    "gharfix_generation_calls_total", "Generation attempts by model and outcome", ["model", "outcome"]))
+ADMISSIONS = REGISTRY.register(Counter(
+    "gharfix_admission_total", "Chat admission decisions: admitted, coalesced, rate limited or shed", ["outcome"]))
+
+_trace = contextvars.ContextVar("gharfix_trace", default=None)
+
+
+class stage:
+    """Time a block (with stage("embed"): ...) into gharfix_stage_seconds and the active trace"""
+    __slots__ = ("name", "started")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        STAGE_SECONDS.observe(elapsed, self.name)
+        trace = _trace.get()
+        if trace is not None:
+            trace["stages"].append((self.name, round((self.started - trace["t0"]) * 1000, 3), round(elapsed * 1000, 3)))
+        return False
+
+
+def timed(name):
+    """Decorator form of stage() for plain and async functions"""
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with stage(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class track_request:
+    """Request-level timing: in-flight gauge, latency histogram and sampled trace"""
+    __slots__ = ("endpoint", "started", "token", "trace")
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+
+    def __enter__(self):
+        IN_FLIGHT.enter(self)
+        self.started = time.perf_counter()
+        self.trace = self.token = None
+        if TRACE_SAMPLE_RATE and random.random() < TRACE_SAMPLE_RATE:
+            self.trace = {"endpoint": self.endpoint, "t0": self.started, "stages": []}
+            self.token = _trace.set(self.trace)
+        return self
+
+    def first_token(self):
+        FIRST_TOKEN_SECONDS.observe(time.perf_counter() - self.started, self.endpoint)
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        IN_FLIGHT.leave(self)
+        REQUEST_SECONDS.observe(elapsed, self.endpoint)
+        if self.trace is not None:
+            _trace.reset(self.token)
+            _dump_trace(self.trace, elapsed)
+        return False
+
+
+def _dump_trace(trace, elapsed):
+    record = {
+        "ts": time.time(),
+        "endpoint": trace["endpoint"],
+        "total_ms": round(elapsed * 1000, 3),
+        "stages": [{"stage": n, "start_ms": s, "ms": d} for n, s, d in trace["stages"]],
+    }
+    try:
+        with open(TRACE_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError as e:
+        logging.error(f"Failed to write trace: {str(e)}")
@@ -0,0 +1,292 @@
+import os
+import glob
+import json
+import time
+import uuid
+import queue
+import atexit
+import hashlib
+import logging
+import threading
+import urllib.request
+
+try:
+    import fcntl
+except ImportError:  # Windows: one journal per path, single-process only
+    fcntl = None
+
+# Confirmed leads are journaled here before dispatch; LEAD_WEBHOOK_URL enables HTTP delivery
+LEAD_JOURNAL_PATH = os.getenv("LEAD_JOURNAL_PATH", "./leads.journal")
+LEAD_WEBHOOK_URL = os.getenv("LEAD_WEBHOOK_URL", "")
+LEAD_WEBHOOK_TIMEOUT = float(os.getenv("LEAD_WEBHOOK_TIMEOUT", "10"))
+LEAD_COMMIT_WINDOW = float(os.getenv("LEAD_COMMIT_WINDOW", "0.002"))  # seconds per fsync group
+LEAD_BATCH_SIZE = int(os.getenv("LEAD_BATCH_SIZE", "50"))
+LEAD_DISPATCH_WINDOW = float(os.getenv("LEAD_DISPATCH_WINDOW", "0.05"))  # seconds
+LEAD_MAX_BACKOFF = float(os.getenv("LEAD_MAX_BACKOFF", "60"))
+LEAD_DURABLE_TIMEOUT = float(os.getenv("LEAD_DURABLE_TIMEOUT", "2"))
+
+
+class LeadSink:
+    """Destination for confirmed leads. send() gets a batch of journal entries
+    ({"key", "lead", "queued_at"}) and must treat "key" as an idempotency key:
+    a batch can be delivered again after a crash or a failed attempt."""
+
+    def send(self, entries):
+        raise NotImplementedError
+
+
+class LoggingSink(LeadSink):
+    def send(self, entries):
+        for entry in entries:
+            logging.info(f"✅ Lead dispatched: {entry['key']} {entry['lead']}")
+
+
+class WebhookSink(LeadSink):
+    """POSTs {"leads": [...]} as JSON; the Idempotency-Key header covers the whole batch"""
+
+    def __init__(self, url, timeout=LEAD_WEBHOOK_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, entries):
+        body = json.dumps({"leads": entries}).encode("utf-8")
+        batch_key = hashlib.sha256("\n".join(e["key"] for e in entries).encode("utf-8")).hexdigest()
+        request = urllib.request.Request(
+            self.url,
+            data=body,
+            method="POST",
+            headers={"Content-Type": "application/json", "Idempotency-Key": batch_key},
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as resp:
+            if resp.status >= 300:
+                raise RuntimeError(f"Lead webhook returned HTTP {resp.status}")
+
+
+class _Commit:
+    """A submitted entry waiting for the committer; error is set if the journal write failed"""
+    __slots__ = ("entry", "done", "error")
+
+    def __init__(self, entry):
+        self.entry = entry
+        self.done = threading.Event()
+        self.error = None
+
+
+def create_lead_sink():
+    if LEAD_WEBHOOK_URL:
+        return WebhookSink(LEAD_WEBHOOK_URL)
+    return LoggingSink()
+
+
+class LeadOutbox:
+    """Append-only lead journal with background, at-least-once dispatch.
+
+    submit() returns once the lead is fsynced to the journal, and raises if
+    the journal write failed; concurrent submits share one fsync (group
+    commit). It blocks, so async callers run it off the event loop. A dispatcher thread sends
+    journaled leads to the sink in batches, retrying with backoff until they
+    are accepted, and records delivered keys in a matching ".acked" file.
+
+    Each process writes its own journal (path + "." + pid) and holds an
+    exclusive lock on it. On start-up the outbox claims journals whose owner
+    has exited, and moves anything journaled but not acked into its own
+    journal for dispatch.
+    """
+
+    def __init__(self, sink=None, path=LEAD_JOURNAL_PATH, commit_window=LEAD_COMMIT_WINDOW,
+                 batch_size=LEAD_BATCH_SIZE, dispatch_window=LEAD_DISPATCH_WINDOW):
+        self.sink = sink or create_lead_sink()
+        self.base_path = path
+        self.path = f"{path}.{os.getpid()}" if fcntl else path
+        self.acked_path = self.path + ".acked"
+        self.commit_window = commit_window
+        self.batch_size = batch_size
+        self.dispatch_window = dispatch_window
+        self._commits = queue.Queue()
+        self._dispatch = queue.Queue()
+        self._closed = threading.Event()
+        self.journaled = 0
+        self.dispatched = 0
+        self.failures = 0
+        self.commits = 0
+
+        for entry in self._recover():
+            self._dispatch.put(entry)
+        self._acked = open(self.acked_path, "ab")
+
+        self._committer = threading.Thread(target=self._commit_loop, name="lead-journal", daemon=True)
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="lead-dispatch", daemon=True)
+        self._committer.start()
+        self._dispatcher.start()
+        atexit.register(self.close)
+
+    def _journal_files(self):
+        """Own journal plus journals left by processes that have exited (locked for us)"""
+        if not fcntl:
+            return {self.path: None}
+        claimed = {}
+        for candidate in glob.glob(glob.escape(self.base_path) + ".*"):
+            suffix = candidate[len(self.base_path) + 1:]
+            if not suffix.isdigit() or candidate == self.path:
+                continue
+            handle = open(candidate, "ab")
+            try:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                handle.close()  # owner is still running
+                continue
+            claimed[candidate] = handle
+        claimed[self.path] = None
+        return claimed
+
+    def _read_pending(self, journal):
+        acked = set()
+        if os.path.exists(journal + ".acked"):
+            with open(journal + ".acked", encoding="utf-8") as f:
+                acked = {line.strip() for line in f if line.strip()}
+        pending = []
+        if os.path.exists(journal):
+            with open(journal, encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn write from a crash; it was never reported durable
+                    if entry["key"] not in acked:
+                        pending.append(entry)
+        return pending
+
+    def _recover(self):
+        """Rewrite our journal with every undelivered entry we can claim and return them"""
+        claimed = self._journal_files()
+        pending = []
+        for journal in claimed:
+            pending.extend(self._read_pending(journal))
+
+        # Lock the merged journal before it appears under our name: a worker starting
+        # meanwhile must find it held, not take it for an orphan to replay and delete
+        tmp = self.path + ".tmp"
+        self._journal = open(tmp, "wb", buffering=0)  # no buffer to hold a failed write
+        if fcntl:
+            fcntl.flock(self._journal.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        # Make it durable before removing the orphans it came from
+        self._append(b"".join(json.dumps(entry).encode("utf-8") + b"\n" for entry in pending))
+        os.replace(tmp, self.path)  # the open handle and its lock move with the file
+        open(self.acked_path, "wb").close()
+
+        for journal, handle in claimed.items():
+            if handle is None:
+                continue
+            for stale in (journal, journal + ".acked"):
+                if os.path.exists(stale):
+                    os.remove(stale)
+            handle.close()
+
+        if pending:
+            logging.info(f"Lead outbox: re-dispatching {len(pending)} undelivered leads")
+        return pending
+
+    def submit(self, lead):
+        """Journal a confirmed lead durably and queue it for dispatch; returns its idempotency key.
+        Raises OSError if the lead could not be journaled (it is then not dispatched)."""
+        commit = _Commit({"key": uuid.uuid4().hex, "lead": lead, "queued_at": time.time()})
+        self._commits.put(commit)
+        if not commit.done.wait(LEAD_DURABLE_TIMEOUT):
+            logging.error(f"Lead {commit.entry['key']} not yet durable after {LEAD_DURABLE_TIMEOUT}s")
+        elif commit.error is not None:
+            raise commit.error
+        return commit.entry["key"]
+
+    def _commit_loop(self):
+        while not (self._closed.is_set() and self._commits.empty()):
+            try:
+                group = [self._commits.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+            # Everything that arrives within the window shares one fsync
+            deadline = time.time() + self.commit_window
+            while time.time() < deadline:
+                try:
+                    group.append(self._commits.get(timeout=max(0, deadline - time.time())))
+                except queue.Empty:
+                    break
+            try:
+                self._append(b"".join(json.dumps(c.entry).encode("utf-8") + b"\n" for c in group))
+                self.commits += 1
+                self.journaled += len(group)
+            except OSError as e:
+                # Not durable: fail the submits instead of dispatching leads a crash would lose
+                logging.error(f"Lead journal write failed: {str(e)}")
+                self.failures += 1
+                for commit in group:
+                    commit.error = e
+                    commit.done.set()
+                continue
+            for commit in group:
+                commit.done.set()
+                self._dispatch.put(commit.entry)
+
+    def _append(self, data):
+        """Write and fsync data at the end of the journal, or leave the journal as it was"""
+        offset = self._journal.seek(0, os.SEEK_END)
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[self._journal.write(view):]
+            os.fsync(self._journal.fileno())
+        except OSError:
+            try:
+                self._journal.truncate(offset)  # a torn tail would swallow the next group's first line
+            except OSError:
+                pass
+            raise
+
+    def _dispatch_loop(self):
+        backoff = 0.5
+        while not (self._closed.is_set() and self._dispatch.empty()):
+            try:
+                batch = [self._dispatch.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+            deadline = time.time() + self.dispatch_window
+            while len(batch) < self.batch_size and time.time() < deadline:
+                try:
+                    batch.append(self._dispatch.get(timeout=max(0, deadline - time.time())))
+                except queue.Empty:
+                    break
+
+            while True:
+                try:
+                    self.sink.send(batch)
+                    break
+                except Exception as e:
+                    self.failures += 1
+                    if self._closed.is_set():
+                        return  # still journaled; redelivered on next start
+                    logging.warning(f"Lead dispatch failed ({str(e)}), retrying in {backoff:.1f}s")
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, LEAD_MAX_BACKOFF)
+            backoff = 0.5
+
+            self._acked.write("".join(f"{e['key']}\n" for e in batch).encode("utf-8"))
+            self._acked.flush()
+            self.dispatched += len(batch)
+
+    def stats(self):
+        return {
+            "journaled": self.journaled,
+            "dispatched": self.dispatched,
+            "pending": self._dispatch.qsize(),
+            "failures": self.failures,
+            "commits": self.commits,
+        }
+
+    def close(self, timeout=5):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        atexit.unregister(self.close)
+        self._committer.join(timeout)
+        self._dispatcher.join(timeout)
+        self._journal.close()
+        self._acked.close()
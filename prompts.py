@@ -0,0 +1,101 @@
+import os
+import re
+import hashlib
+import functools
+
+# Token budgets for the per-turn part of the prompt (estimated, ~4 characters per token)
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "200"))
+HISTORY_ANSWER_TOKENS = int(os.getenv("HISTORY_ANSWER_TOKENS", "50"))  # per past answer
+SUMMARY_TOKENS = int(os.getenv("HISTORY_SUMMARY_TOKENS", "40"))
+
+RULES = """You are GharFix's official customer assistant. Answer clearly and concisely WITHOUT using markdown formatting.
+
+Rules:
+- Use the information in the retrieved context below.
+- DO NOT use markdown formatting (no **, __, etc.)
+- If the context is not helpful, answer generally in 2–3 sentences.
+- Tone: professional, supportive, and helpful.
+- Keep answers under 5 sentences unless asked for all services
+- If the user asks for ALL services → list every service in numbered format
+- If the user asks about pricing/rates → say: "Our pricing varies by service and location. Please call +91 75068 55407 or type 'book now' to get a customized quote."
+- If service not available → say: "I don't think we provide that service, but please call/message at +91 75068 55407 for confirmation."
+- If the user wants to book → say: "I can help you book a service! Just type 'book now' and I'll collect your details.\""""
+
+SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s')
+
+
+def estimate_tokens(text):
+    """Cheap local token estimate (~4 characters per token)"""
+    return (len(text) + 3) // 4
+
+
+def clip(text, max_tokens):
+    """Text cut to about max_tokens, at a sentence or word boundary"""
+    text = " ".join(text.split())
+    limit = max_tokens * 4
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    ends = [m.start() for m in SENTENCE_END_RE.finditer(cut)]
+    if ends and ends[-1] > limit // 2:
+        return cut[:ends[-1]]
+    return cut.rsplit(" ", 1)[0] + " ..."
+
+
+@functools.lru_cache(maxsize=4096)
+def compact_turn(user, bot):
+    """One past exchange as it appears in the prompt, with the answer clipped.
+    Memoized, so each turn is compacted once however many later prompts carry it."""
+    return f"User: {clip(user, HISTORY_ANSWER_TOKENS)}\nAssistant: {clip(bot, HISTORY_ANSWER_TOKENS)}"
+
+
+class PromptBuilder:
+    """Builds prompts as a stable prefix plus a small per-turn suffix.
+
+    The prefix (rules and the service catalog) is byte-identical for every
+    request while the knowledge base is unchanged, so Gemini can reuse it
+    across calls. The suffix carries the recent conversation, trimmed newest
+    first to `history_budget` tokens with older turns folded into a one-line
+    summary of what the user asked, then the retrieved context and question.
+    """
+
+    def __init__(self, catalog, history_budget=HISTORY_TOKEN_BUDGET, summary_tokens=SUMMARY_TOKENS):
+        self.prefix = f"{RULES}\n\nGHARFIX SERVICES:\n{catalog}\n\n"
+        self.prefix_tokens = estimate_tokens(self.prefix)
+        self.prefix_hash = hashlib.sha256(self.prefix.encode("utf-8")).hexdigest()[:16]
+        self.history_budget = history_budget
+        self.summary_tokens = summary_tokens
+
+    def history(self, turns):
+        """Recent turns within the token budget; older ones become a summary line"""
+        kept = []
+        used = 0
+        turns = list(turns)
+        for i in range(len(turns) - 1, -1, -1):
+            text = compact_turn(turns[i].user, turns[i].bot)
+            cost = estimate_tokens(text)
+            if kept and used + cost > self.history_budget:
+                break
+            kept.append(text)
+            used += cost
+        else:
+            i = -1
+        kept.reverse()
+        older = turns[:i + 1]
+        if older:
+            asked = "; ".join(" ".join(t.user.split()) for t in older)
+            kept.insert(0, f"Earlier the user asked about: {clip(asked, self.summary_tokens)}")
+        return "\n".join(kept)
+
+    def suffix(self, question, turns, context):
+        return f"""CONVERSATION HISTORY:
+{self.history(turns)}
+
+RETRIEVED CONTEXT:
+{context}
+
+Question: {question}
+Answer:"""
+
+    def build(self, question, turns, context):
+        return self.prefix + self.suffix(question, turns, context)
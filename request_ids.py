@@ -0,0 +1,59 @@
+import os
+import time
+import itertools
+import threading
+from datetime import datetime, timezone, timedelta
+
+IST = timezone(timedelta(hours=5, minutes=30))
+SEQ_OFFSET = 10 ** 12
+
+
+class RequestIdGenerator:
+    """Time-ordered, collision-free request IDs.
+
+    Format: CHAT-<IST yyyymmddHHMMSS><ms>-<node>-<seq>, for example
+    CHAT-20261016143012123-9F2C4A7B1E-000000000001
+
+    node is 40 random bits drawn per process (and again after fork), so
+    uvicorn workers and hosts never share one; seq is a 12-digit per-process
+    counter. The timestamp and seq are taken under one lock, so IDs from one
+    process sort in generation order, across threads too, and IDs from
+    different processes sort by millisecond.
+    """
+
+    def __init__(self, prefix="CHAT"):
+        self.prefix = prefix
+        self._reset_node()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_node)
+
+    def _reset_node(self):
+        self.node = os.urandom(5).hex().upper()
+        self._lock = threading.Lock()  # new after fork: another thread may have held it
+        # Offset so str(n)[1:] is a fixed-width, zero-padded sequence number
+        self._counter = itertools.count(SEQ_OFFSET + 1)
+        self._head = (0, "")  # (millisecond, "CHAT-<timestamp>-<node>-")
+
+    def _refresh_head(self, now_ms):
+        last_ms, head = self._head
+        if now_ms <= last_ms:
+            return head  # never step backwards within a process, even if the wall clock does
+        stamp = datetime.fromtimestamp(now_ms // 1000, IST).strftime("%Y%m%d%H%M%S")
+        head = f"{self.prefix}-{stamp}{now_ms % 1000:03d}-{self.node}-"
+        self._head = (now_ms, head)
+        return head
+
+    def next(self):
+        with self._lock:
+            now_ms = time.time_ns() // 1_000_000
+            last_ms, head = self._head
+            if now_ms != last_ms:
+                head = self._refresh_head(now_ms)
+            return head + str(next(self._counter))[1:]
+
+
+_generator = RequestIdGenerator()
+
+
+def generate_request_id():
+    return _generator.next()
@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import shutil
+import logging
+import threading
+
+import numpy as np
+
+# "chroma" (default) or "numpy" for the in-process index
+RETRIEVER = os.getenv("RETRIEVER", "chroma")
+CHROMA_PATH = os.getenv("CHROMA_PATH", "./chroma_db")
+NUMPY_INDEX_PATH = os.getenv("NUMPY_INDEX_PATH", "./vector_index")
+KB_COLLECTION = "gharfix_kb"
+
+
+def _fsync(f):
+    f.flush()
+    os.fsync(f.fileno())
+
+
+class Retriever:
+    """Vector index behind search_knowledge. Distances are cosine distances
+    (0 = identical, 2 = opposite), as ChromaDB reports them."""
+
+    def ids(self):
+        raise NotImplementedError
+
+    def count(self):
+        return len(self.ids())
+
+    def upsert(self, ids, embeddings, documents):
+        raise NotImplementedError
+
+    def delete(self, ids):
+        raise NotImplementedError
+
+    def query(self, embeddings, n_results):
+        """For each query vector, up to n_results [(document, distance)] nearest first"""
+        raise NotImplementedError
+
+
+class ChromaRetriever(Retriever):
+    """Persistent ChromaDB collection (SQLite + HNSW)"""
+
+    def __init__(self, path=CHROMA_PATH, collection=KB_COLLECTION):
+        import chromadb
+
+        self.client = chromadb.PersistentClient(path=path)
+        self.collection = self.client.get_or_create_collection(
+            collection,
+            metadata={"hnsw:space": "cosine"}
+        )
+
+    def ids(self):
+        return self.collection.get(include=[])["ids"]
+
+    def count(self):
+        return self.collection.count()
+
+    def upsert(self, ids, embeddings, documents):
+        self.collection.upsert(embeddings=embeddings, documents=documents, ids=ids)
+
+    def delete(self, ids):
+        self.collection.delete(ids=ids)
+
+    def query(self, embeddings, n_results):
+        n = max(1, min(n_results, self.count()))
+        results = self.collection.query(query_embeddings=embeddings, n_results=n)
+        if not results["documents"]:
+            return [[] for _ in embeddings]
+        distances = results.get("distances") or [[0.0] * len(docs) for docs in results["documents"]]
+        return [list(zip(docs, dists)) for docs, dists in zip(results["documents"], distances)]
+
+
+class NumpyRetriever(Retriever):
+    """Exact cosine search over one contiguous float32 matrix of unit vectors.
+
+    The matrix is saved as vectors.npy and memory-mapped on open, so
+    start-up does not copy it and worker processes share its pages; ids and
+    documents are kept alongside in index.json. Each save writes both into a
+    new version directory under path and then points path/CURRENT at it, so
+    a crash leaves the old index or the new one, never a mix. Top-k uses
+    argpartition, and a batch of queries is one matrix product.
+    """
+
+    def __init__(self, path=NUMPY_INDEX_PATH):
+        self.path = path
+        self.current_path = os.path.join(path, "CURRENT")
+        self.version = None
+        self._lock = threading.Lock()
+        self._ids = []
+        self._documents = []
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._positions = {}
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.current_path):
+            return
+        try:
+            with open(self.current_path, encoding="utf-8") as f:
+                version = f.read().strip()
+            with open(os.path.join(self.path, version, "index.json"), encoding="utf-8") as f:
+                index = json.load(f)
+            vectors = np.load(os.path.join(self.path, version, "vectors.npy"), mmap_mode="r")
+        except (OSError, ValueError) as e:
+            logging.warning(f"Vector index at {self.path} unreadable ({str(e)}), starting empty")
+            return
+        if vectors.shape[0] != len(index["ids"]):
+            logging.warning(f"Vector index at {self.path} is inconsistent, starting empty")
+            return
+        self._set(index["ids"], index["documents"], vectors)
+        self.version = version
+
+    def _set(self, ids, documents, vectors):
+        # Readers take one consistent snapshot; writers replace all three together
+        self._ids, self._documents, self._vectors = ids, documents, vectors
+        self._positions = {doc_id: i for i, doc_id in enumerate(ids)}
+
+    def _save(self):
+        # Both files go into a new version directory; switching CURRENT is the one atomic step
+        version = f"v{time.time_ns()}.{os.getpid()}"
+        directory = os.path.join(self.path, version)
+        os.makedirs(directory)
+        vectors_path = os.path.join(directory, "vectors.npy")
+        with open(vectors_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(self._vectors))
+            _fsync(f)
+        with open(os.path.join(directory, "index.json"), "w", encoding="utf-8") as f:
+            json.dump({"ids": self._ids, "documents": self._documents}, f)
+            _fsync(f)
+        tmp = f"{self.current_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(version)
+            _fsync(f)
+        os.replace(tmp, self.current_path)
+        previous, self.version = self.version, version
+        # Re-open memory-mapped so the written copy is not also held in memory
+        self._vectors = np.load(vectors_path, mmap_mode="r")
+        if previous:
+            # Processes still mapping it keep their pages until they reload
+            shutil.rmtree(os.path.join(self.path, previous), ignore_errors=True)
+
+    @staticmethod
+    def _normalize(embeddings):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def ids(self):
+        return list(self._ids)
+
+    def count(self):
+        return len(self._ids)
+
+    def upsert(self, ids, embeddings, documents):
+        new = self._normalize(embeddings)
+        with self._lock:
+            vectors = np.array(self._vectors)  # writable copy
+            if len(self._ids) and vectors.shape[1] != new.shape[1]:
+                logging.warning(f"Embedding size changed {vectors.shape[1]} -> {new.shape[1]}, clearing vector index")
+                self._set([], [], np.zeros((0, new.shape[1]), dtype=np.float32))
+                vectors = np.zeros((0, new.shape[1]), dtype=np.float32)
+            all_ids, all_docs = list(self._ids), list(self._documents)
+            appended = []
+            for doc_id, vector, document in zip(ids, new, documents):
+                row = self._positions.get(doc_id)
+                if row is None:
+                    appended.append(vector)
+                    all_ids.append(doc_id)
+                    all_docs.append(document)
+                else:
+                    vectors[row] = vector
+                    all_docs[row] = document
+            if appended:
+                vectors = np.vstack([vectors.reshape(-1, new.shape[1]), np.stack(appended)])
+            self._set(all_ids, all_docs, vectors)
+            self._save()
+
+    def delete(self, ids):
+        with self._lock:
+            drop = {self._positions[doc_id] for doc_id in ids if doc_id in self._positions}
+            if not drop:
+                return
+            keep = [i for i in range(len(self._ids)) if i not in drop]
+            self._set([self._ids[i] for i in keep], [self._documents[i] for i in keep],
+                      np.array(self._vectors[keep]))
+            self._save()
+
+    def query(self, embeddings, n_results):
+        ids, documents, vectors = self._ids, self._documents, self._vectors
+        if not ids:
+            return [[] for _ in embeddings]
+        queries = self._normalize(embeddings)
+        similarities = queries @ vectors.T  # (queries, chunks)
+        k = max(1, min(n_results, len(ids)))
+        if k < len(ids):
+            top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(len(ids)), (len(queries), 1))
+        results = []
+        for row, candidates in zip(similarities, top):
+            ordered = candidates[np.argsort(-row[candidates])]
+            results.append([(documents[i], float(1.0 - row[i])) for i in ordered])
+        return results
+
+
+def create_retriever():
+    if RETRIEVER == "numpy":
+        return NumpyRetriever()
+    if RETRIEVER != "chroma":
+        raise ValueError(f"Unknown RETRIEVER: {RETRIEVER}")
+    return ChromaRetriever()
@@ -0,0 +1,401 @@
+import os
+import json
+import atexit
+import time
+import queue
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict, Counter, deque
+
+# Session limits - conversation ids are per browser, so these bound worker memory
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "10000"))
+SESSION_TTL = float(os.getenv("SESSION_TTL", "3600"))  # seconds idle before expiry
+MEMORY_TURNS = 6
+
+# Backend selection - "sqlite" lets several uvicorn workers on one host share state
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "./sessions.db")
+SESSION_FLUSH_INTERVAL = float(os.getenv("SESSION_FLUSH_INTERVAL", "0.02"))  # seconds
+
+
+class Turn:
+    """One user/assistant exchange kept in conversation memory"""
+    __slots__ = ("user", "bot")
+
+    def __init__(self, user, bot):
+        self.user = user
+        self.bot = bot
+
+
+class _Entry:
+    __slots__ = ("value", "touched")
+
+    def __init__(self, value, touched):
+        self.value = value
+        self.touched = touched
+
+
+class SessionStore:
+    """Mapping of conversation_id -> value with an entry cap (LRU) and idle TTL"""
+
+    def __init__(self, max_entries=SESSION_MAX_ENTRIES, ttl=SESSION_TTL, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def _expire(self, now):
+        # Entries are kept in last-access order, so idle ones sit at the front
+        while self._entries:
+            cid, entry = next(iter(self._entries.items()))
+            if now - entry.touched < self.ttl:
+                break
+            del self._entries[cid]
+            self.expirations += 1
+
+    def get(self, cid, default=None):
+        with self._lock:
+            entry = self._entries.get(cid)
+            if entry is None:
+                return default
+            now = self.clock()
+            if now - entry.touched >= self.ttl:
+                del self._entries[cid]
+                self.expirations += 1
+                return default
+            entry.touched = now
+            self._entries.move_to_end(cid)
+            return entry.value
+
+    def __contains__(self, cid):
+        return self.get(cid, _MISSING) is not _MISSING
+
+    def __getitem__(self, cid):
+        value = self.get(cid, _MISSING)
+        if value is _MISSING:
+            raise KeyError(cid)
+        return value
+
+    def __setitem__(self, cid, value):
+        with self._lock:
+            now = self.clock()
+            entry = self._entries.get(cid)
+            if entry is None:
+                self._entries[cid] = _Entry(value, now)
+            else:
+                entry.value = value
+                entry.touched = now
+                self._entries.move_to_end(cid)
+
+            self._expire(now)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def __delitem__(self, cid):
+        with self._lock:
+            del self._entries[cid]
+
+    def pop(self, cid, default=None):
+        with self._lock:
+            entry = self._entries.pop(cid, None)
+            return default if entry is None else entry.value
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {
+            "sessions": len(self._entries),
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+_MISSING = object()
+
+
+class SessionBackend:
+    """Conversation history and booking state, keyed by conversation_id.
+
+    Booking steps move with compare-and-set (update_lead/delete_lead take the
+    step the caller saw), so two workers handling the same conversation can
+    never both apply a step.
+    """
+
+    def get_history(self, cid):
+        """Most recent turns, oldest first"""
+        raise NotImplementedError
+
+    def append_turn(self, cid, user, bot):
+        raise NotImplementedError
+
+    def get_lead(self, cid):
+        """Booking state {"step": ..., "data": {...}} or None"""
+        raise NotImplementedError
+
+    def start_lead(self, cid, lead):
+        """Create booking state unless one already exists; True if created"""
+        raise NotImplementedError
+
+    def update_lead(self, cid, expected_step, lead):
+        """Replace booking state only if it is still at expected_step; True if applied"""
+        raise NotImplementedError
+
+    def delete_lead(self, cid, expected_step=None):
+        """Remove booking state (only at expected_step, if given); True if removed"""
+        raise NotImplementedError
+
+    # Calls can wait on disk or on other processes' locks: async callers run them off the event loop
+    blocking = False
+
+    def stats(self):
+        return {}
+
+    def close(self):
+        pass
+
+
+class InMemorySessionBackend(SessionBackend):
+    """Per-process backend built on two bounded SessionStores"""
+
+    def __init__(self, max_entries=SESSION_MAX_ENTRIES, ttl=SESSION_TTL):
+        self.conversation_memory = SessionStore(max_entries, ttl)
+        self.lead_collection = SessionStore(max_entries, ttl)
+        self._lead_lock = threading.Lock()
+
+    def get_history(self, cid):
+        return self.conversation_memory.get(cid, ())
+
+    def append_turn(self, cid, user, bot):
+        mem = self.conversation_memory.get(cid)
+        if mem is None:
+            mem = deque(maxlen=MEMORY_TURNS)
+        mem.append(Turn(user, bot))
+        self.conversation_memory[cid] = mem
+
+    def get_lead(self, cid):
+        return self.lead_collection.get(cid)
+
+    def start_lead(self, cid, lead):
+        with self._lead_lock:
+            if cid in self.lead_collection:
+                return False
+            self.lead_collection[cid] = lead
+            return True
+
+    def update_lead(self, cid, expected_step, lead):
+        with self._lead_lock:
+            current = self.lead_collection.get(cid)
+            if current is None or current["step"] != expected_step:
+                return False
+            self.lead_collection[cid] = lead
+            return True
+
+    def delete_lead(self, cid, expected_step=None):
+        with self._lead_lock:
+            current = self.lead_collection.get(cid)
+            if current is None or (expected_step is not None and current["step"] != expected_step):
+                return False
+            self.lead_collection.pop(cid)
+            return True
+
+    def stats(self):
+        return {
+            "backend": "memory",
+            "conversation_memory": self.conversation_memory.stats(),
+            "lead_collection": self.lead_collection.stats(),
+        }
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """Backend in a WAL-mode SQLite file that several processes on one host can share.
+
+    History appends are queued and written in batches by a background thread;
+    booking steps are written synchronously as single conditional statements.
+    """
+
+    blocking = True
+
+    def __init__(self, path=SESSION_DB_PATH, ttl=SESSION_TTL, flush_interval=SESSION_FLUSH_INTERVAL):
+        self.path = path
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self._conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._pending = queue.Queue()
+        self._pending_cids = Counter()
+        self._flushed = threading.Condition(self._lock)
+        self.batches = 0
+        self.expirations = 0
+
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA busy_timeout=10000")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS history ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, cid TEXT NOT NULL, "
+                "user TEXT NOT NULL, bot TEXT NOT NULL, touched REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS history_cid ON history (cid, id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS history_touched ON history (touched)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS leads ("
+                "cid TEXT PRIMARY KEY, step TEXT NOT NULL, data TEXT NOT NULL, touched REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS leads_touched ON leads (touched)")
+
+        self._closed = threading.Event()
+        self._writer = threading.Thread(target=self._write_loop, name="session-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)  # flush queued history before the process exits
+
+    # History - batched writes
+
+    def append_turn(self, cid, user, bot):
+        with self._lock:
+            self._pending_cids[cid] += 1
+        self._pending.put((cid, user, bot, time.time()))
+
+    def get_history(self, cid):
+        # Read-your-writes within this process: wait for our own queued turns
+        with self._lock:
+            while cid in self._pending_cids and not self._closed.is_set():
+                self._flushed.wait(timeout=1)
+            rows = self._conn.execute(
+                "SELECT user, bot FROM history WHERE cid = ? AND touched > ? ORDER BY id DESC LIMIT ?",
+                (cid, time.time() - self.ttl, MEMORY_TURNS)
+            ).fetchall()
+        return [Turn(user, bot) for user, bot in reversed(rows)]
+
+    def _write_loop(self):
+        last_prune = time.time()
+        while not self._closed.is_set() or not self._pending.empty():
+            try:
+                batch = [self._pending.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                batch = []
+            # Coalesce everything that arrived within the flush window into one transaction
+            deadline = time.time() + self.flush_interval
+            while batch and time.time() < deadline:
+                try:
+                    batch.append(self._pending.get(timeout=max(0, deadline - time.time())))
+                except queue.Empty:
+                    break
+            if batch:
+                self._flush(batch)
+            if time.time() - last_prune > 60:
+                self._prune()
+                last_prune = time.time()
+
+    def _flush(self, batch):
+        cids = Counter(cid for cid, _, _, _ in batch)
+        try:
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                self._conn.executemany(
+                    "INSERT INTO history (cid, user, bot, touched) VALUES (?, ?, ?, ?)", batch
+                )
+                self._conn.executemany(
+                    "DELETE FROM history WHERE cid = ? AND id NOT IN "
+                    "(SELECT id FROM history WHERE cid = ? ORDER BY id DESC LIMIT ?)",
+                    [(cid, cid, MEMORY_TURNS) for cid in cids]
+                )
+                self._conn.execute("COMMIT")
+                self.batches += 1
+        except sqlite3.Error as e:
+            logging.error(f"Session history flush failed: {str(e)}")
+            with self._lock:
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+        finally:
+            with self._lock:
+                self._pending_cids -= cids  # drops cids whose count reaches zero
+                self._flushed.notify_all()
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        try:
+            with self._lock:
+                self._conn.execute("DELETE FROM history WHERE touched < ?", (cutoff,))
+                cur = self._conn.execute("DELETE FROM leads WHERE touched < ?", (cutoff,))
+                self.expirations += cur.rowcount
+        except sqlite3.Error as e:
+            logging.error(f"Session prune failed: {str(e)}")
+
+    # Booking state - atomic step transitions
+
+    def get_lead(self, cid):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT step, data FROM leads WHERE cid = ? AND touched > ?",
+                (cid, time.time() - self.ttl)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"step": row[0], "data": json.loads(row[1])}
+
+    def start_lead(self, cid, lead):
+        now = time.time()
+        with self._lock:
+            # Replace an expired row, never a live one
+            cur = self._conn.execute(
+                "INSERT INTO leads (cid, step, data, touched) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(cid) DO UPDATE SET step = excluded.step, data = excluded.data, "
+                "touched = excluded.touched WHERE leads.touched <= ?",
+                (cid, lead["step"], json.dumps(lead["data"]), now, now - self.ttl)
+            )
+        return cur.rowcount == 1
+
+    def update_lead(self, cid, expected_step, lead):
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE leads SET step = ?, data = ?, touched = ? WHERE cid = ? AND step = ?",
+                (lead["step"], json.dumps(lead["data"]), time.time(), cid, expected_step)
+            )
+        return cur.rowcount == 1
+
+    def delete_lead(self, cid, expected_step=None):
+        with self._lock:
+            if expected_step is None:
+                cur = self._conn.execute("DELETE FROM leads WHERE cid = ?", (cid,))
+            else:
+                cur = self._conn.execute(
+                    "DELETE FROM leads WHERE cid = ? AND step = ?", (cid, expected_step)
+                )
+        return cur.rowcount == 1
+
+    def stats(self):
+        with self._lock:
+            sessions = self._conn.execute("SELECT COUNT(DISTINCT cid) FROM history").fetchone()[0]
+            leads = self._conn.execute("SELECT COUNT(*) FROM leads").fetchone()[0]
+        return {
+            "backend": "sqlite",
+            "sessions": sessions,
+            "open_leads": leads,
+            "pending_writes": self._pending.qsize(),
+            "batches": self.batches,
+            "expirations": self.expirations,
+        }
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        atexit.unregister(self.close)
+        self._writer.join(timeout=5)
+        with self._lock:
+            self._conn.close()
+
+
+def create_session_backend(kind=SESSION_BACKEND):
+    if kind == "sqlite":
+        return SQLiteSessionBackend()
+    if kind == "memory":
+        return InMemorySessionBackend()
+    raise ValueError(f"Unknown SESSION_BACKEND: {kind}")
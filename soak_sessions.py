@@ -0,0 +1,103 @@
+"""Session-store soak test: a million distinct conversation ids, flat memory.
+
+Feeds --ids new conversation ids into the session backend the way the chat
+pipeline does (one history turn each, and a booking started for every tenth)
+and samples resident memory as it goes. With the bounded store, memory stops
+growing once SESSION_MAX_ENTRIES sessions are resident; "dict" mode replays
+the same traffic into the plain dicts RAGChatbot used before, for reference.
+Exits non-zero if the bounded store grows by more than --max-growth-mb
+after warm-up:
+
+    python soak_sessions.py --ids 1000000 --out soak_sessions.json
+    python soak_sessions.py --mode dict --ids 200000
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+from loadtest import offline_environment, rss_mb
+
+QUESTION = "my kitchen tap is leaking, can someone fix it today"
+ANSWER = "GharFix can help with your kitchen tap. Our plumbers serve your area; type book now to schedule a visit."
+
+
+class DictSessions:
+    """The unbounded per-process dicts from before SessionStore"""
+
+    def __init__(self):
+        self.conversation_memory = {}
+        self.lead_collection = {}
+
+    def append_turn(self, cid, user, bot):
+        mem = self.conversation_memory.setdefault(cid, [])
+        mem.append({"user": user, "bot": bot})
+        self.conversation_memory[cid] = mem[-6:]
+
+    def start_lead(self, cid, lead):
+        self.lead_collection[cid] = lead
+        return True
+
+    def stats(self):
+        return {"sessions": len(self.conversation_memory), "leads": len(self.lead_collection)}
+
+
+def main(args):
+    offline_environment()
+    from sessions import create_session_backend, SESSION_MAX_ENTRIES
+
+    sessions = DictSessions() if args.mode == "dict" else create_session_backend()
+    warmup = min(args.ids // 2, 2 * SESSION_MAX_ENTRIES)
+    samples = []
+    baseline = None
+    started = time.perf_counter()
+    for i in range(args.ids):
+        cid = f"soak-{i}"
+        sessions.append_turn(cid, f"{QUESTION} #{i}", ANSWER)
+        if i % 10 == 0:
+            sessions.start_lead(cid, {"step": "name", "data": {}})
+        if i + 1 == warmup:
+            baseline = rss_mb()
+        if (i + 1) % args.sample == 0:
+            samples.append({"ids": i + 1, "rss_mb": rss_mb()})
+            print(f"{i + 1:>9} ids  rss {samples[-1]['rss_mb']} MB")
+    elapsed = time.perf_counter() - started
+
+    after = [s["rss_mb"] for s in samples if s["ids"] > warmup]
+    growth = round(max(after) - baseline, 1) if after and baseline is not None else None
+    summary = {
+        "mode": args.mode,
+        "ids": args.ids,
+        "ids_per_sec": round(args.ids / elapsed),
+        "rss_after_warmup_mb": baseline,
+        "rss_growth_after_warmup_mb": growth,
+        "final_rss_mb": rss_mb(),
+        "store": sessions.stats(),
+    }
+    sessions_close = getattr(sessions, "close", None)
+    if sessions_close:
+        sessions_close()
+    print("  ".join(f"{k} {v}" for k, v in summary.items()))
+    return {"summary": summary, "samples": samples}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ids", type=int, default=1_000_000, help="distinct conversation ids to send")
+    parser.add_argument("--mode", choices=["store", "dict"], default="store",
+                        help="store: SESSION_BACKEND as configured; dict: the old unbounded dicts")
+    parser.add_argument("--sample", type=int, default=50_000, help="ids between memory samples")
+    parser.add_argument("--max-growth-mb", type=float, default=16)
+    parser.add_argument("--out", default="soak_sessions.json")
+    args = parser.parse_args()
+    args.out = os.path.abspath(args.out)
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+
+    result = main(args)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Wrote {args.out}")
+    growth = result["summary"]["rss_growth_after_warmup_mb"]
+    sys.exit(1 if args.mode == "store" and growth is not None and growth > args.max_growth_mb else 0)
@@ -0,0 +1,102 @@
+"""Request ID uniqueness stress test across processes and threads.
+
+The parent generates a few IDs, then forks --processes workers (as uvicorn
+does), each running --threads threads that call generate_request_id() as
+fast as they can, --ids times in total per process. Every thread checks that
+its own IDs strictly increase; the parent then checks that all IDs from all
+processes are distinct (via 64-bit digests) and reports the generation rate:
+
+    python stress_request_ids.py --processes 8 --ids 500000 --out stress_request_ids.json
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import tempfile
+import threading
+import multiprocessing
+
+import numpy as np
+
+
+def digest(request_id):
+    return int.from_bytes(hashlib.blake2b(request_id.encode("ascii"), digest_size=8).digest(), "big")
+
+
+def worker(index, count, threads, workdir, results):
+    from request_ids import generate_request_id, _generator
+
+    per_thread = count // threads
+    batches = [None] * threads
+    disorder = [0] * threads
+
+    def run(t):
+        ids = [generate_request_id() for _ in range(per_thread)]
+        disorder[t] = sum(1 for a, b in zip(ids, ids[1:]) if not a < b)
+        batches[t] = ids
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    ids = [request_id for batch in batches for request_id in batch]
+    np.save(os.path.join(workdir, f"{index}.npy"), np.fromiter((digest(i) for i in ids), dtype=np.uint64, count=len(ids)))
+    results.put({"process": index, "node": _generator.node, "ids": len(ids),
+                 "ids_per_sec": round(len(ids) / elapsed), "out_of_order": sum(disorder), "sample": ids[0]})
+
+
+def main(args):
+    from request_ids import generate_request_id, _generator
+
+    parent_ids = [generate_request_id() for _ in range(1000)]  # state the children inherit
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    with tempfile.TemporaryDirectory() as workdir:
+        processes = [context.Process(target=worker, args=(i, args.ids, args.threads, workdir, results))
+                     for i in range(args.processes)]
+        for process in processes:
+            process.start()
+        reports = sorted((results.get() for _ in processes), key=lambda r: r["process"])
+        for process in processes:
+            process.join()
+        digests = np.concatenate([np.load(os.path.join(workdir, f"{i}.npy")) for i in range(args.processes)]
+                                 + [np.fromiter((digest(i) for i in parent_ids), dtype=np.uint64)])
+
+    nodes = {r["node"] for r in reports} | {_generator.node}
+    summary = {
+        "processes": args.processes,
+        "threads_per_process": args.threads,
+        "ids": int(digests.size),
+        "duplicates": int(digests.size - np.unique(digests).size),
+        "distinct_nodes": len(nodes),
+        "out_of_order": sum(r["out_of_order"] for r in reports),
+        "ids_per_sec_per_process": round(sum(r["ids_per_sec"] for r in reports) / len(reports)),
+        "sample": reports[0]["sample"],
+    }
+    print("  ".join(f"{k} {v}" for k, v in summary.items()))
+    return {"summary": summary, "processes": reports}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--threads", type=int, default=4, help="threads per process")
+    parser.add_argument("--ids", type=int, default=500_000, help="IDs per process")
+    parser.add_argument("--out", default="stress_request_ids.json")
+    args = parser.parse_args()
+    args.out = os.path.abspath(args.out)
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+
+    result = main(args)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Wrote {args.out}")
+    s = result["summary"]
+    sys.exit(1 if s["duplicates"] or s["out_of_order"] or s["distinct_nodes"] != args.processes + 1 else 0)